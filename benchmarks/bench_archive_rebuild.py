@@ -0,0 +1,83 @@
+# Time to rebuild a collection from the embedding archive against a full re-ingest (embed every chunk again).
+# Both paths write into a fresh embedded index, so the difference is the embedding cost. Text chunks only: image
+# re-ingest would also re-run BLIP captioning, so the real gap for image-heavy users is larger.
+#
+# uv run python benchmarks/bench_archive_rebuild.py --num-docs 20000
+
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import tempfile
+
+import numpy as np
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from indexing_and_embedding.ann_index import LocalANNIndex
+from indexing_and_embedding.embedding_archive import EmbeddingArchive
+from indexing_and_embedding.embeddings import build_embedding_model
+from benchmarks.bench_embedding_backends import load_texts
+
+MODEL_NAME = "sentence-transformers/all-MiniLM-L6-v2"
+
+
+def run(num_docs, embedding_backend, batch_size):
+    texts = load_texts(num_docs)
+    ids = [f"chunk_{i}" for i in range(num_docs)]
+    metadatas = [{"user_id": f"user_{i % 8}", "file_path": f"bench/{i // 50}.txt"} for i in range(num_docs)]
+    embedder = build_embedding_model(MODEL_NAME, backend=embedding_backend)
+    embedder.embed_documents(texts[:32])  # warm-up
+
+    root = tempfile.mkdtemp(prefix="bench_archive_")
+    try:
+        # Full re-ingest: embed + insert, archiving the vectors on the way (as the consumer does)
+        archive = EmbeddingArchive(os.path.join(root, "archive", "worker-0"), model_name=MODEL_NAME)
+        index = LocalANNIndex(os.path.join(root, "reingest"))
+        start = time.perf_counter()
+        for i in range(0, num_docs, batch_size):
+            vectors = np.asarray(embedder.embed_documents(texts[i:i + batch_size]), dtype=np.float32)
+            index.add(ids[i:i + batch_size], vectors, texts[i:i + batch_size], metadatas[i:i + batch_size])
+            archive.append(ids[i:i + batch_size], texts[i:i + batch_size], metadatas[i:i + batch_size], vectors)
+        index.flush()
+        reingest_s = time.perf_counter() - start
+
+        # Restore: stream the archive into a fresh index
+        archive = EmbeddingArchive(os.path.join(root, "archive", "worker-0"), read_only=True)
+        index = LocalANNIndex(os.path.join(root, "restored"))
+        start = time.perf_counter()
+        for batch_ids, batch_texts, batch_metadatas, vectors in archive.iter_batches(batch_size):
+            index.add(batch_ids, vectors, batch_texts, batch_metadatas)
+        index.flush()
+        restore_s = time.perf_counter() - start
+        assert len(index) == num_docs
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
+
+    results = {
+        "num_docs": num_docs,
+        "reingest_s": reingest_s,
+        "restore_s": restore_s,
+        "reingest_docs_per_sec": num_docs / reingest_s,
+        "restore_docs_per_sec": num_docs / restore_s,
+        "speedup": reingest_s / restore_s,
+    }
+    print(f"re-ingest {reingest_s:8.1f}s ({results['reingest_docs_per_sec']:8.0f} docs/s)")
+    print(f"restore   {restore_s:8.1f}s ({results['restore_docs_per_sec']:8.0f} docs/s)  {results['speedup']:.1f}x faster")
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark collection rebuild from the embedding archive vs re-ingest.")
+    parser.add_argument("--num-docs", type=int, default=20000)
+    parser.add_argument("--embedding-backend", default="torch")
+    parser.add_argument("--batch-size", type=int, default=2000)
+    parser.add_argument("--output", help="Optional path to write the results as JSON.")
+    args = parser.parse_args()
+
+    results = run(args.num_docs, args.embedding_backend, args.batch_size)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
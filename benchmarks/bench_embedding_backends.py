@@ -0,0 +1,79 @@
+# Docs/sec and cosine agreement with the fp32 torch model for each embedding backend.
+# Uses chunks of the downloaded books when available (make download_books), otherwise synthetic sentences.
+#
+# uv run python benchmarks/bench_embedding_backends.py --num-docs 2000 --threads 4
+
+import os
+import sys
+import json
+import time
+import random
+import argparse
+
+import numpy as np
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from indexing_and_embedding.embeddings import COSINE_TOLERANCE, EMBEDDING_BACKENDS, build_embedding_model
+
+MODEL_NAME = "sentence-transformers/all-MiniLM-L6-v2"
+BOOKS_DIR = "data/books"
+
+
+def load_texts(num_docs, chunk_chars=256, seed=0):
+    texts = []
+    if os.path.isdir(BOOKS_DIR):
+        for name in sorted(os.listdir(BOOKS_DIR)):
+            with open(os.path.join(BOOKS_DIR, name), errors="ignore") as f:
+                content = f.read()
+            texts.extend(content[i:i + chunk_chars] for i in range(0, len(content), chunk_chars))
+            if len(texts) >= num_docs:
+                break
+    if len(texts) < num_docs:
+        rng = random.Random(seed)
+        words = "the quick brown fox jumps over lazy dog while elizabeth bennet reads letters from mr darcy".split()
+        texts.extend(" ".join(rng.choices(words, k=rng.randint(10, 50))) for _ in range(num_docs - len(texts)))
+    return texts[:num_docs]
+
+
+def run(backends, num_docs, threads):
+    texts = load_texts(num_docs)
+    reference = None
+    results = []
+    for backend in backends:
+        model = build_embedding_model(MODEL_NAME, backend=backend, num_threads=threads)
+        model.embed_documents(texts[:32])  # warm-up
+        start = time.perf_counter()
+        vectors = np.asarray(model.embed_documents(texts), dtype=np.float32)
+        elapsed = time.perf_counter() - start
+        vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+        if reference is None:
+            reference = vectors
+        cosine = (vectors * reference).sum(axis=1)
+        result = {
+            "backend": backend,
+            "docs_per_sec": len(texts) / elapsed,
+            "mean_cosine": float(cosine.mean()),
+            "min_cosine": float(cosine.min()),
+            "within_tolerance": bool(cosine.mean() >= COSINE_TOLERANCE[backend] - 1e-6),
+        }
+        results.append(result)
+        print(f"{backend:>10} | {result['docs_per_sec']:8.1f} docs/s | mean cos {result['mean_cosine']:.5f}"
+              f" | min cos {result['min_cosine']:.5f} | {'OK' if result['within_tolerance'] else 'OUT OF TOLERANCE'}")
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark CPU embedding backends against the fp32 torch model.")
+    parser.add_argument("--backends", nargs="+", default=list(EMBEDDING_BACKENDS), choices=EMBEDDING_BACKENDS)
+    parser.add_argument("--num-docs", type=int, default=1000)
+    parser.add_argument("--threads", type=int, default=None)
+    parser.add_argument("--output", help="Optional path to write the results as JSON.")
+    args = parser.parse_args()
+
+    # The fp32 torch vectors are the reference, so they are always computed first
+    backends = ["torch"] + [b for b in args.backends if b != "torch"]
+    results = run(backends, args.num_docs, args.threads)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
@@ -0,0 +1,102 @@
+# Recall of exact-term queries (IDs, names) against top_k for dense-only, BM25-only and hybrid (RRF) retrieval.
+# Distractor chunks come from the downloaded books when available; each "needle" chunk carries a unique id and
+# the query asks for that id in natural language. Runs fully in-process (embedded vector index, no servers).
+#
+# uv run python benchmarks/bench_hybrid_retrieval.py --num-needles 200 --embedding-backend onnx
+
+import os
+import sys
+import json
+import time
+import random
+import shutil
+import argparse
+import tempfile
+
+import numpy as np
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from langchain_core.documents import Document
+from indexing_and_embedding.ann_index import LocalANNIndex
+from indexing_and_embedding.bm25_index import BM25Index, document_key
+from indexing_and_embedding.embeddings import build_embedding_model
+from lookup.hybrid_search import HybridSearcher
+from benchmarks.bench_embedding_backends import load_texts
+
+MODEL_NAME = "sentence-transformers/all-MiniLM-L6-v2"
+TOP_KS = [1, 3, 5, 10, 20]
+
+
+def build_corpus(num_distractors, num_needles, seed=0):
+    rng = random.Random(seed)
+    names = ["okafor", "lindqvist", "takahashi", "moreau", "castellano", "novak", "adeyemi", "kowalski"]
+    texts = [t.lower() for t in load_texts(num_distractors)]
+    needles = []
+    for i in range(num_needles):
+        invoice = f"inv{rng.randint(10000, 99999)}{i}"
+        text = f"invoice {invoice} issued {rng.choice(names)} payment received march"
+        needles.append((invoice, text))
+    texts.extend(text for _, text in needles)
+    return texts, needles
+
+
+def run(num_distractors, num_needles, embedding_backend, budget_ms):
+    texts, needles = build_corpus(num_distractors, num_needles)
+    metadatas = [{"file_path": f"bench/{i}.txt", "user_id": "bench_user"} for i in range(len(texts))]
+    keys = [document_key(t, m) for t, m in zip(texts, metadatas)]
+    embedder = build_embedding_model(MODEL_NAME, backend=embedding_backend)
+
+    root = tempfile.mkdtemp(prefix="bench_hybrid_")
+    try:
+        dense = LocalANNIndex(os.path.join(root, "dense"))
+        dense.add(keys, np.asarray(embedder.embed_documents(texts), dtype=np.float32), texts, metadatas)
+        lexical = BM25Index(os.path.join(root, "bm25"))
+        lexical.add(keys, texts, metadatas)
+        max_k = max(TOP_KS)
+
+        def dense_search(query):
+            return [Document(page_content=t, metadata=m) for _, t, m, _ in dense.search(embedder.embed_query(query), k=max_k)]
+
+        def lexical_search(query):
+            return [Document(page_content=t, metadata=m) for _, t, m, _ in lexical.search(query, k=max_k)]
+
+        hybrid = HybridSearcher(dense_search, lexical_search, top_k=max_k, budget_ms=budget_ms)
+        modes = {"dense": dense_search, "bm25": lexical_search, "hybrid": hybrid.search}
+        results = {}
+        for mode, search in modes.items():
+            hits = {k: 0 for k in TOP_KS}
+            latencies = []
+            for invoice, text in needles:
+                start = time.perf_counter()
+                docs = search(f"what is the payment status of {invoice}?")
+                latencies.append((time.perf_counter() - start) * 1000)
+                ranked = [d.page_content for d in docs]
+                for k in TOP_KS:
+                    hits[k] += text in ranked[:k]
+            latencies.sort()
+            results[mode] = {
+                "recall": {k: hits[k] / len(needles) for k in TOP_KS},
+                "p50_ms": latencies[len(latencies) // 2],
+                "p95_ms": latencies[int(len(latencies) * 0.95) - 1],
+            }
+            recall_line = " ".join(f"@{k}={results[mode]['recall'][k]:.2f}" for k in TOP_KS)
+            print(f"{mode:>6} | recall {recall_line} | p50 {results[mode]['p50_ms']:.1f} ms p95 {results[mode]['p95_ms']:.1f} ms")
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark dense vs BM25 vs hybrid recall for exact-term queries.")
+    parser.add_argument("--num-distractors", type=int, default=5000)
+    parser.add_argument("--num-needles", type=int, default=200)
+    parser.add_argument("--embedding-backend", default="torch")
+    parser.add_argument("--budget-ms", type=float, default=150.0)
+    parser.add_argument("--output", help="Optional path to write the results as JSON.")
+    args = parser.parse_args()
+
+    results = run(args.num_distractors, args.num_needles, args.embedding_backend, args.budget_ms)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
@@ -0,0 +1,104 @@
+# Query latency of one small user against total corpus size: shared collection + user_id filter vs
+# a per-user collection. Needs a running `chroma run` server. Vectors are random unit vectors, so no
+# embedding model is loaded.
+#
+# uv run python benchmarks/bench_partitioned_query.py --sizes 10000 50000 200000
+
+import os
+import sys
+import json
+import time
+import argparse
+
+import numpy as np
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from chromadb import HttpClient
+from indexing_and_embedding.partitioning import CollectionPartitioner
+
+DIM = 384
+SMALL_USER = "user_small"
+SMALL_USER_DOCS = 200
+
+
+def random_unit_vectors(rng, n):
+    vectors = rng.standard_normal((n, DIM)).astype(np.float32)
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors
+
+
+def load(collection, rng, n, user_ids, id_prefix, batch_size=5000):
+    for start in range(0, n, batch_size):
+        count = min(batch_size, n - start)
+        collection.add(
+            ids=[f"{id_prefix}-{start + i}" for i in range(count)],
+            embeddings=random_unit_vectors(rng, count).tolist(),
+            metadatas=[{"user_id": user_ids[(start + i) % len(user_ids)]} for i in range(count)],
+        )
+
+
+def time_queries(collection, queries, top_k, where=None):
+    latencies = []
+    for query in queries:
+        start = time.perf_counter()
+        collection.query(query_embeddings=[query.tolist()], n_results=top_k, where=where)
+        latencies.append((time.perf_counter() - start) * 1000)
+    latencies.sort()
+    return {
+        "p50_ms": latencies[len(latencies) // 2],
+        "p95_ms": latencies[int(len(latencies) * 0.95) - 1],
+        "mean_ms": sum(latencies) / len(latencies),
+    }
+
+
+def run(client, sizes, num_queries, top_k, num_bulk_users, seed=0):
+    rng = np.random.default_rng(seed)
+    partitioner = CollectionPartitioner("bench_docs", mode="per_user")
+    bulk_users = [f"user_bulk_{i}" for i in range(num_bulk_users)]
+    queries = random_unit_vectors(rng, num_queries)
+    results = []
+
+    for name in ["bench_docs", partitioner.collection_for_user(SMALL_USER)]:
+        try:
+            client.delete_collection(name)
+        except Exception:
+            pass
+    shared = client.get_or_create_collection("bench_docs")
+    small = client.get_or_create_collection(partitioner.collection_for_user(SMALL_USER))
+
+    # The small user's documents are identical in both layouts, only the other users' corpus grows.
+    load(shared, rng, SMALL_USER_DOCS, [SMALL_USER], "small")
+    load(small, rng, SMALL_USER_DOCS, [SMALL_USER], "small")
+    loaded = SMALL_USER_DOCS
+
+    for size in sorted(sizes):
+        if size > loaded:
+            load(shared, rng, size - loaded, bulk_users, f"bulk-{loaded}")
+            loaded = size
+        shared_stats = time_queries(shared, queries, top_k, where={"user_id": SMALL_USER})
+        partitioned_stats = time_queries(small, queries, top_k)
+        results.append({"corpus_size": size, "shared": shared_stats, "per_user": partitioned_stats})
+        print(f"{size:>10} | shared p50 {shared_stats['p50_ms']:8.2f} ms p95 {shared_stats['p95_ms']:8.2f} ms"
+              f" | per_user p50 {partitioned_stats['p50_ms']:8.2f} ms p95 {partitioned_stats['p95_ms']:8.2f} ms")
+
+    client.delete_collection("bench_docs")
+    client.delete_collection(partitioner.collection_for_user(SMALL_USER))
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark query latency of shared vs per-user collections.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 50000, 100000])
+    parser.add_argument("--queries", type=int, default=100)
+    parser.add_argument("--top-k", type=int, default=5)
+    parser.add_argument("--bulk-users", type=int, default=20)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--output", help="Optional path to write the results as JSON.")
+    args = parser.parse_args()
+
+    results = run(HttpClient(host=args.host, port=args.port), args.sizes, args.queries, args.top_k, args.bulk_users)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
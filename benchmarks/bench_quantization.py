@@ -0,0 +1,97 @@
+# Memory and disk per million vectors and recall@k of float16 / int8 segments against the float32 baseline.
+# The corpus is clustered synthetic 384-d unit vectors (closer to sentence embeddings than pure noise).
+#
+# uv run python benchmarks/bench_quantization.py --num-vectors 100000 --top-k 10
+
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import tempfile
+
+import numpy as np
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from indexing_and_embedding.ann_index import LocalANNIndex, normalize
+
+DIM = 384
+
+
+def clustered_vectors(rng, n, num_clusters=200, spread=0.35):
+    centers = normalize(rng.standard_normal((num_clusters, DIM)))
+    labels = rng.integers(0, num_clusters, n)
+    return normalize(centers[labels] + spread * rng.standard_normal((n, DIM)) / np.sqrt(DIM) * 4)
+
+
+def build(path, vectors, quantization, rescore_factor, segment_size):
+    index = LocalANNIndex(path, segment_size=segment_size, quantization=quantization, rescore_factor=rescore_factor)
+    ids = [str(i) for i in range(len(vectors))]
+    for start in range(0, len(vectors), 10000):
+        end = start + 10000
+        index.add(ids[start:end], vectors[start:end], [""] * len(ids[start:end]), [{}] * len(ids[start:end]))
+    index.flush()
+    return index
+
+
+def evaluate(index, queries, ground_truth, k):
+    hits = 0
+    start = time.perf_counter()
+    for query, expected in zip(queries, ground_truth):
+        hits += len(expected & {int(r[0]) for r in index.search(query, k=k)})
+    elapsed = time.perf_counter() - start
+    return hits / (k * len(queries)), len(queries) / elapsed
+
+
+def run(num_vectors, num_queries, k, segment_size, seed=0):
+    rng = np.random.default_rng(seed)
+    vectors = clustered_vectors(rng, num_vectors)
+    queries = clustered_vectors(rng, num_queries)
+    ground_truth = [set(np.argsort(-(vectors @ q))[:k].tolist()) for q in queries]
+
+    configs = [("none", 0), ("float16", 0), ("float16", 4), ("int8", 0), ("int8", 4)]
+    results = []
+    root = tempfile.mkdtemp(prefix="bench_quantization_")
+    try:
+        for quantization, rescore_factor in configs:
+            index = build(os.path.join(root, f"{quantization}-{rescore_factor}"), vectors, quantization, rescore_factor, segment_size)
+            recall, qps = evaluate(index, queries, ground_truth, k)
+            # A flat scan over every code isolates the precision loss from the IVF probing loss
+            index.exact_threshold = num_vectors
+            flat_recall, flat_qps = evaluate(index, queries, ground_truth, k)
+            mb_per_million = index.memory_bytes() / num_vectors * 1_000_000 / 2**20
+            # The float32 rescoring copy is on disk only, but makes a rescored segment larger than an unquantized one
+            disk_mb_per_million = index.disk_bytes() / num_vectors * 1_000_000 / 2**20
+            results.append({
+                "quantization": quantization,
+                "rescore_factor": rescore_factor,
+                "memory_mb_per_million": mb_per_million,
+                "disk_mb_per_million": disk_mb_per_million,
+                f"ivf_recall@{k}": recall,
+                "ivf_queries_per_sec": qps,
+                f"flat_recall@{k}": flat_recall,
+                "flat_queries_per_sec": flat_qps,
+            })
+            print(f"{quantization:>8} rescore x{rescore_factor} | {mb_per_million:8.1f} MB / 1M vectors in memory"
+                  f" | {disk_mb_per_million:8.1f} MB on disk"
+                  f" | ivf recall@{k} {recall:.3f} {qps:8.1f} q/s | flat recall@{k} {flat_recall:.3f} {flat_qps:8.1f} q/s")
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark quantized vector storage of the embedded index.")
+    parser.add_argument("--num-vectors", type=int, default=50000)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--top-k", type=int, default=10)
+    parser.add_argument("--segment-size", type=int, default=20000)
+    parser.add_argument("--output", help="Optional path to write the results as JSON.")
+    args = parser.parse_args()
+
+    results = run(args.num_vectors, args.queries, args.top_k, args.segment_size)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
@@ -0,0 +1,165 @@
+# Consumer throughput against stream shard count and consumer count, on local Redis instances started by the
+# benchmark (needs `redis-server` on PATH). Consumers run the real IngestionConsumer loop (sharding, leases,
+# chunk counting, acks) with the vector store replaced by a sink that spends --work-us per chunk, standing in
+# for embedding cost.
+#
+# uv run python benchmarks/bench_sharded_stream.py --shards 1 2 4 8 --consumers 1 2 4 --nodes 2
+
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import subprocess
+import multiprocessing
+
+import redis
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from ingestion.stream_sharding import ShardRouter
+
+
+class SimulatedSink:
+    """Stands in for ChromaClient: burns work_us of CPU per document."""
+
+    def __init__(self, work_us):
+        self.work_us = work_us
+
+    def add_documents(self, docs):
+        deadline = time.perf_counter() + len(docs) * self.work_us / 1e6
+        while time.perf_counter() < deadline:
+            pass
+
+
+def start_redis_nodes(num_nodes, base_port):
+    if shutil.which("redis-server") is None:
+        raise SystemExit("redis-server is not on PATH.")
+    processes, nodes = [], []
+    for i in range(num_nodes):
+        port = base_port + i
+        processes.append(subprocess.Popen(
+            ["redis-server", "--port", str(port), "--save", "", "--appendonly", "no"],
+            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+        ))
+        nodes.append(("127.0.0.1", port))
+    for host, port in nodes:
+        client = redis.Redis(host=host, port=port)
+        for _ in range(100):
+            try:
+                client.ping()
+                break
+            except redis.exceptions.ConnectionError:
+                time.sleep(0.05)
+    return processes, nodes
+
+
+def publish(nodes, num_shards, num_messages, num_users, chunks_per_file=50):
+    router = ShardRouter(nodes, num_shards, "bench_stream")
+    pipelines = {}
+    for i in range(num_messages):
+        user_id = f"user_{i % num_users}"
+        client, key = router.route_user(user_id)
+        pipeline = pipelines.setdefault(key, client.pipeline(transaction=False))
+        file_index = (i // num_users) // chunks_per_file
+        metadata = {"user_id": user_id, "file_path": f"data/{user_id}/text/{file_index}.txt", "total_chunks": chunks_per_file}
+        pipeline.xadd(key, {"page_content": f"chunk {i} " * 20, "metadata": json.dumps(metadata), "timestamp": "0"})
+        if len(pipeline) >= 1000:
+            pipeline.execute()
+    for pipeline in pipelines.values():
+        pipeline.execute()
+
+
+def consumer_process(name, nodes, num_shards, work_us, ready, start, stop):
+    import ingestion.consumer as consumer_module
+
+    consumer_module.REDIS_HOST, consumer_module.REDIS_PORT = nodes[0]
+    consumer_module.REDIS_SHARD_NODES = nodes
+    consumer_module.NUM_STREAM_SHARDS = num_shards
+    consumer_module.STREAM_KEY = "bench_stream"
+    consumer_module.ENABLE_BM25_INDEX = False
+    consumer_module.ENABLE_EMBEDDING_ARCHIVE = False
+    consumer_module.BATCH_SIZE = 500
+    consumer_module.CONSUMER_TTL_MS = 5000
+    consumer = consumer_module.IngestionConsumer(consumer_name=name, chroma_db_client=SimulatedSink(work_us))
+    ready.release()
+    start.wait()
+    loop_count = 1  # skip the pending claim on the first loop, nothing is pending yet
+    try:
+        while not stop.is_set():
+            consumer.run_once(loop_count)
+            loop_count += 1
+    finally:
+        consumer.assigner.leave()
+
+
+def fully_consumed(nodes, num_shards):
+    router = ShardRouter(nodes, num_shards, "bench_stream")
+    for shard in range(num_shards):
+        client, key = router.client_for_shard(shard), router.stream_key(shard)
+        if client.xlen(key) == 0:
+            continue
+        group = client.xinfo_groups(key)[0]
+        last_id = client.xinfo_stream(key)["last-generated-id"]
+        if group["pending"] or group["last-delivered-id"] != last_id:
+            return False
+    return True
+
+
+def run_case(nodes, num_shards, num_consumers, num_messages, num_users, work_us):
+    for host, port in nodes:
+        redis.Redis(host=host, port=port).flushall()
+    publish(nodes, num_shards, num_messages, num_users)
+
+    ctx = multiprocessing.get_context("spawn")
+    ready, start, stop = ctx.Semaphore(0), ctx.Event(), ctx.Event()
+    processes = [
+        ctx.Process(target=consumer_process, args=(f"bench-{i}", nodes, num_shards, work_us, ready, start, stop))
+        for i in range(num_consumers)
+    ]
+    for process in processes:
+        process.start()
+    for _ in processes:
+        ready.acquire()
+
+    began = time.perf_counter()
+    start.set()
+    while not fully_consumed(nodes, num_shards):
+        time.sleep(0.1)
+    elapsed = time.perf_counter() - began
+    stop.set()
+    for process in processes:
+        process.join(timeout=10)
+        if process.is_alive():
+            process.terminate()
+    return num_messages / elapsed
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark ingestion throughput against stream shards and consumers.")
+    parser.add_argument("--shards", type=int, nargs="+", default=[1, 2, 4, 8])
+    parser.add_argument("--consumers", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--nodes", type=int, default=2, help="Local redis-server instances to spread shards over")
+    parser.add_argument("--base-port", type=int, default=6400)
+    parser.add_argument("--messages", type=int, default=50000)
+    parser.add_argument("--users", type=int, default=32)
+    parser.add_argument("--work-us", type=float, default=200.0, help="Simulated embedding cost per chunk")
+    parser.add_argument("--output", help="Optional path to write the results as JSON.")
+    args = parser.parse_args()
+
+    redis_processes, nodes = start_redis_nodes(args.nodes, args.base_port)
+    results = []
+    try:
+        for num_shards in args.shards:
+            for num_consumers in args.consumers:
+                throughput = run_case(nodes, num_shards, num_consumers, args.messages, args.users, args.work_us)
+                results.append({"shards": num_shards, "consumers": num_consumers, "messages_per_sec": throughput})
+                print(f"shards {num_shards:>3} | consumers {num_consumers:>3} | {throughput:10.0f} messages/s")
+    finally:
+        for process in redis_processes:
+            process.terminate()
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
@@ -0,0 +1,114 @@
+# Startup time of each entry point, measured in fresh interpreters: the module import, then the time until the
+# process can do useful work, i.e.
+#   - main: Lookup built (models loaded), and one query embedded;
+#   - producer: UserIngestionWorker constructed, with the Redis connection and file processors;
+#   - consumer: IngestionConsumer constructed, with the embedding model loaded and a chunk embedded.
+# Needs the services the entry point talks to (Redis, and the Chroma server for the http backend).
+# --model-server attaches main and the consumer to a running `make model-server` instead of loading the models.
+# --importtime lists the slowest imports of each entry point (python -X importtime).
+#
+# uv run python benchmarks/bench_startup.py --repeats 3
+# uv run python benchmarks/bench_startup.py --entry-points main consumer --model-server 127.0.0.1:50055
+
+import os
+import sys
+import json
+import argparse
+import subprocess
+
+import numpy as np
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# name -> (import statement, configuration applied before startup, startup statement)
+ENTRY_POINTS = {
+    "main": (
+        "import main as m",
+        "m.model_server_address = {address}",
+        "lookup = m.get_lookup(); lookup.chroma_db_client.embedding_model.embed_query('warm up')",
+    ),
+    "producer": (
+        "import ingestion.producer as m",
+        "",
+        "m.UserIngestionWorker('user_a')",
+    ),
+    "consumer": (
+        "import ingestion.consumer as m",
+        "m.MODEL_SERVER_ADDRESS = {address}",
+        "c = m.IngestionConsumer(consumer_name='startup-bench'); c.chroma_db_client.embedding_model.embed_documents(['warm up']); c.assigner.leave()",
+    ),
+}
+
+CHILD = """
+import sys, time, json
+sys.path.insert(0, {root!r})
+start = time.perf_counter()
+{import_statement}
+imported = time.perf_counter()
+{configure}
+{startup}
+ready = time.perf_counter()
+print("STARTUP " + json.dumps({{"import_s": imported - start, "ready_s": ready - start}}))
+"""
+
+
+def measure(name, address):
+    import_statement, configure, startup = ENTRY_POINTS[name]
+    code = CHILD.format(root=REPO_ROOT, import_statement=import_statement,
+                        configure=configure.format(address=address), startup=startup)
+    result = subprocess.run([sys.executable, "-c", code], cwd=REPO_ROOT, capture_output=True, text=True)
+    for line in result.stdout.splitlines():
+        if line.startswith("STARTUP "):
+            return json.loads(line[len("STARTUP "):])
+    raise RuntimeError(f"{name} did not start:\n{result.stderr[-2000:]}")
+
+
+def _top_level_imports(statement):
+    """{module: cumulative seconds} of the top-level imports made while running statement."""
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", statement], cwd=REPO_ROOT, capture_output=True, text=True)
+    rows = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, module = line[len("import time:"):].split("|")
+        # Nested imports carry their depth as extra leading spaces
+        if len(module) - len(module.lstrip()) <= 1:
+            rows[module.strip()] = int(cumulative) / 1e6
+    return rows
+
+
+def slowest_imports(name, top):
+    """(cumulative seconds, module) of the slowest top-level imports of an entry point, interpreter startup excluded."""
+    interpreter = _top_level_imports("pass")
+    rows = [(seconds, module) for module, seconds in _top_level_imports(ENTRY_POINTS[name][0]).items() if module not in interpreter]
+    return sorted(rows, reverse=True)[:top]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark import and time-to-ready of every entry point.")
+    parser.add_argument("--entry-points", nargs="+", choices=list(ENTRY_POINTS), default=list(ENTRY_POINTS))
+    parser.add_argument("--repeats", type=int, default=3)
+    parser.add_argument("--model-server", help="host:port of a running model server for main and the consumer")
+    parser.add_argument("--importtime", type=int, default=0, metavar="N", help="Also list the N slowest imports")
+    parser.add_argument("--output", help="Optional path to write the results as JSON.")
+    args = parser.parse_args()
+
+    address = None
+    if args.model_server:
+        host, port = args.model_server.rsplit(":", 1)
+        address = (host, int(port))
+
+    results = []
+    for name in args.entry_points:
+        runs = [measure(name, address) for _ in range(args.repeats)]
+        imports, ready = [r["import_s"] for r in runs], [r["ready_s"] for r in runs]
+        results.append({"entry_point": name, "model_server": args.model_server, "import_s": float(np.median(imports)),
+                        "ready_s": float(np.median(ready)), "runs": runs})
+        print(f"{name:<10} | import {np.median(imports):6.2f} s | ready {np.median(ready):6.2f} s "
+              f"(median of {args.repeats}{', model server' if address else ''})")
+        for seconds, module in slowest_imports(name, args.importtime) if args.importtime else []:
+            print(f"    {seconds:6.2f} s  {module}")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
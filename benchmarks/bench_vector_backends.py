@@ -0,0 +1,136 @@
+# Insert and query throughput, and recall@k against exact search, of the embedded LocalANNIndex and the Chroma HTTP
+# server. Vectors are pre-computed, clustered like sentence embeddings, so only the vector store is measured.
+# The HTTP side is skipped when no `chroma run` server is reachable.
+#
+# uv run python benchmarks/bench_vector_backends.py --num-vectors 100000
+
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import tempfile
+
+import numpy as np
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from indexing_and_embedding.ann_index import LocalANNIndex, normalize
+
+DIM = 384
+
+
+def clustered_vectors(rng, n, num_clusters=200, spread=0.35):
+    # Same generator as benchmarks/bench_quantization.py, pure noise has no neighbourhoods for IVF to find
+    centers = normalize(rng.standard_normal((num_clusters, DIM)))
+    labels = rng.integers(0, num_clusters, n)
+    return normalize(centers[labels] + spread * rng.standard_normal((n, DIM)) / np.sqrt(DIM) * 4)
+
+
+def make_corpus(n, num_users, seed=0):
+    rng = np.random.default_rng(seed)
+    vectors = clustered_vectors(rng, n)
+    ids = [f"chunk-{i}" for i in range(n)]
+    texts = [f"synthetic chunk {i}" for i in range(n)]
+    metadatas = [{"user_id": f"user_{i % num_users}"} for i in range(n)]
+    queries = clustered_vectors(rng, 200)
+    return ids, vectors, texts, metadatas, queries
+
+
+def exact_neighbours(corpus, top_k, num_users):
+    """Ids of the exact top_k of each query among its user's rows (query i searches user i % num_users)."""
+    ids, vectors, _, _, queries = corpus
+    neighbours = []
+    for i, query in enumerate(queries):
+        rows = np.arange(i % num_users, len(ids), num_users)
+        neighbours.append({ids[r] for r in rows[np.argsort(-(vectors[rows] @ query))[:top_k]]})
+    return neighbours
+
+
+def recall(results, expected, top_k):
+    return sum(len(found & truth) for found, truth in zip(results, expected)) / (top_k * len(expected))
+
+
+def bench_local(corpus, batch_size, top_k, num_users, expected):
+    ids, vectors, texts, metadatas, queries = corpus
+    path = tempfile.mkdtemp(prefix="bench_local_index_")
+    try:
+        index = LocalANNIndex(path)
+        start = time.perf_counter()
+        for i in range(0, len(ids), batch_size):
+            index.add(ids[i:i + batch_size], vectors[i:i + batch_size], texts[i:i + batch_size], metadatas[i:i + batch_size])
+        index.flush()
+        insert_seconds = time.perf_counter() - start
+
+        found = []
+        start = time.perf_counter()
+        for i, query in enumerate(queries):
+            found.append({r[0] for r in index.search(query, k=top_k, where={"user_id": f"user_{i % num_users}"})})
+        query_seconds = time.perf_counter() - start
+    finally:
+        shutil.rmtree(path, ignore_errors=True)
+    return {"inserts_per_sec": len(ids) / insert_seconds, "queries_per_sec": len(queries) / query_seconds,
+            f"recall@{top_k}": recall(found, expected, top_k)}
+
+
+def bench_http(corpus, batch_size, top_k, num_users, expected, host, port):
+    from chromadb import HttpClient
+
+    ids, vectors, texts, metadatas, queries = corpus
+    client = HttpClient(host=host, port=port)
+    try:
+        client.delete_collection("bench_vector_backends")
+    except Exception:
+        pass
+    collection = client.create_collection("bench_vector_backends", metadata={"hnsw:space": "cosine"})
+    try:
+        start = time.perf_counter()
+        for i in range(0, len(ids), batch_size):
+            collection.add(
+                ids=ids[i:i + batch_size],
+                embeddings=vectors[i:i + batch_size].tolist(),
+                documents=texts[i:i + batch_size],
+                metadatas=metadatas[i:i + batch_size],
+            )
+        insert_seconds = time.perf_counter() - start
+
+        found = []
+        start = time.perf_counter()
+        for i, query in enumerate(queries):
+            result = collection.query(query_embeddings=[query.tolist()], n_results=top_k, where={"user_id": f"user_{i % num_users}"})
+            found.append(set(result["ids"][0]))
+        query_seconds = time.perf_counter() - start
+    finally:
+        client.delete_collection("bench_vector_backends")
+    return {"inserts_per_sec": len(ids) / insert_seconds, "queries_per_sec": len(queries) / query_seconds,
+            f"recall@{top_k}": recall(found, expected, top_k)}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare the embedded vector index with the Chroma HTTP server.")
+    parser.add_argument("--num-vectors", type=int, default=50000)
+    parser.add_argument("--num-users", type=int, default=5)
+    parser.add_argument("--batch-size", type=int, default=2000)
+    parser.add_argument("--top-k", type=int, default=5)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--output", help="Optional path to write the results as JSON.")
+    args = parser.parse_args()
+
+    corpus = make_corpus(args.num_vectors, args.num_users)
+    expected = exact_neighbours(corpus, args.top_k, args.num_users)
+    recall_key = f"recall@{args.top_k}"
+    results = {"num_vectors": args.num_vectors, "local": bench_local(corpus, args.batch_size, args.top_k, args.num_users, expected)}
+    print(f"local | {results['local']['inserts_per_sec']:10.0f} inserts/s | {results['local']['queries_per_sec']:8.1f} queries/s"
+          f" | {recall_key} {results['local'][recall_key]:.3f}")
+    try:
+        results["http"] = bench_http(corpus, args.batch_size, args.top_k, args.num_users, expected, args.host, args.port)
+        print(f"http  | {results['http']['inserts_per_sec']:10.0f} inserts/s | {results['http']['queries_per_sec']:8.1f} queries/s"
+              f" | {recall_key} {results['http'][recall_key]:.3f}")
+    except Exception as e:
+        print(f"http  | skipped ({e})")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
@@ -0,0 +1,418 @@
+"""
+In-process stand-ins used by the benchmark suite (benchmarks/suite.py), so component timings need neither a Redis
+server, `chroma run`, nor model downloads:
+
+    FakeRedis           : the subset of redis-py the producer, consumer, shard leases and model registry use
+                          (strings with expiry, hashes, sets, sorted sets, streams with consumer groups, pipelines
+                          and the repo's Lua scripts), one shared in-memory server per (host, port)
+    HashingEmbeddings   : deterministic feature-hashing embedder, fixed dimension, no model files
+    StubGenerator       : text2text-generation pipeline stand-in for the Lookup LLM
+    stub_captioner      : image-to-text pipeline stand-in for BLIP
+
+The vector store is the embedded LocalANNIndex (ChromaClient(backend="local")), the real code path rather than a fake.
+"""
+
+import re
+import time
+import zlib
+import threading
+from contextlib import contextmanager
+from unittest.mock import patch
+
+import numpy as np
+import redis
+
+from ingestion.stream_sharding import _RELEASE_LEASE, _RENEW_LEASE
+from indexing_and_embedding.model_registry import _CUTOVER
+
+
+def _stream_id(entry_id: str):
+    ms, _, seq = entry_id.partition("-")
+    return int(ms), int(seq or 0)
+
+
+class FakeRedisServer:
+    """State of one fake Redis node. Every FakeRedis client of the same node shares it."""
+
+    def __init__(self):
+        self.lock = threading.RLock()
+        self.data = {}
+        self.expiry = {}  # key -> monotonic deadline
+        self.last_stream_id = {}
+
+    def expire_keys(self):
+        now = time.monotonic()
+        for key in [k for k, deadline in self.expiry.items() if deadline <= now]:
+            self.data.pop(key, None)
+            self.expiry.pop(key, None)
+
+
+class _Stream:
+    def __init__(self):
+        self.entries = []  # [(id tuple, id string, fields)]
+        self.groups = {}   # name -> {"last": id tuple, "pending": {id string: [consumer, delivered_at_ms]}}
+
+    def index_after(self, last):
+        lo, hi = 0, len(self.entries)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self.entries[mid][0] <= last:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+
+
+class FakeRedis:
+    def __init__(self, server: FakeRedisServer = None):
+        self.server = server or FakeRedisServer()
+
+    # --- connection / scripts ---
+    def ping(self):
+        return True
+
+    def pipeline(self, transaction=True):
+        return FakePipeline(self)
+
+    def register_script(self, source):
+        scripts = {_RENEW_LEASE: self._renew_lease, _RELEASE_LEASE: self._release_lease, _CUTOVER: self._cutover}
+        if source not in scripts:
+            raise NotImplementedError("FakeRedis only runs the repo's own Lua scripts.")
+        return scripts[source]
+
+    def _renew_lease(self, keys, args):
+        with self.server.lock:
+            if self.get(keys[0]) == str(args[0]):
+                return self.pexpire(keys[0], int(args[1]))
+            return 0
+
+    def _release_lease(self, keys, args):
+        with self.server.lock:
+            if self.get(keys[0]) == str(args[0]):
+                return self.delete(keys[0])
+            return 0
+
+    def _cutover(self, keys, args=()):
+        with self.server.lock:
+            shadow = self.get(keys[1])
+            if shadow is None:
+                return None
+            self.set(keys[0], shadow)
+            self.delete(keys[1])
+            self.incr(keys[2])
+            return shadow
+
+    # --- keys and strings ---
+    def _get_value(self, key, default_factory=None):
+        self.server.expire_keys()
+        value = self.server.data.get(key)
+        if value is None and default_factory is not None:
+            value = self.server.data[key] = default_factory()
+        return value
+
+    def get(self, key):
+        with self.server.lock:
+            return self._get_value(key)
+
+    def set(self, key, value, nx=False, px=None, ex=None):
+        with self.server.lock:
+            if nx and self._get_value(key) is not None:
+                return None
+            self.server.data[key] = str(value)
+            self.server.expiry.pop(key, None)
+            if px is not None or ex is not None:
+                self.server.expiry[key] = time.monotonic() + (px / 1000 if px is not None else ex)
+            return True
+
+    def pexpire(self, key, ms):
+        with self.server.lock:
+            if self._get_value(key) is None:
+                return 0
+            self.server.expiry[key] = time.monotonic() + int(ms) / 1000
+            return 1
+
+    def delete(self, *keys):
+        with self.server.lock:
+            removed = 0
+            for key in keys:
+                removed += self.server.data.pop(key, None) is not None
+                self.server.expiry.pop(key, None)
+            return removed
+
+    def incr(self, key, amount=1):
+        with self.server.lock:
+            value = int(self._get_value(key) or 0) + amount
+            self.server.data[key] = str(value)
+            return value
+
+    # --- hashes ---
+    def hset(self, key, field=None, value=None, mapping=None):
+        with self.server.lock:
+            h = self._get_value(key, dict)
+            items = dict(mapping or {})
+            if field is not None:
+                items[field] = value
+            h.update({k: str(v) for k, v in items.items()})
+            return len(items)
+
+    def hgetall(self, key):
+        with self.server.lock:
+            return dict(self._get_value(key) or {})
+
+    def hincrby(self, key, field, amount=1):
+        with self.server.lock:
+            h = self._get_value(key, dict)
+            h[field] = str(int(h.get(field, 0)) + amount)
+            return int(h[field])
+
+    # --- sets ---
+    def sadd(self, key, *members):
+        with self.server.lock:
+            s = self._get_value(key, set)
+            before = len(s)
+            s.update(str(m) for m in members)
+            return len(s) - before
+
+    def scard(self, key):
+        with self.server.lock:
+            return len(self._get_value(key) or set())
+
+    def sismember(self, key, member):
+        with self.server.lock:
+            return str(member) in (self._get_value(key) or set())
+
+    def smembers(self, key):
+        with self.server.lock:
+            return set(self._get_value(key) or set())
+
+    # --- sorted sets ---
+    def zadd(self, key, mapping):
+        with self.server.lock:
+            z = self._get_value(key, dict)
+            added = sum(member not in z for member in mapping)
+            z.update({member: float(score) for member, score in mapping.items()})
+            return added
+
+    def zrem(self, key, *members):
+        with self.server.lock:
+            z = self._get_value(key) or {}
+            return sum(z.pop(member, None) is not None for member in members)
+
+    def zremrangebyscore(self, key, min_score, max_score):
+        low = float("-inf") if min_score == "-inf" else float(min_score)
+        high = float("inf") if max_score == "+inf" else float(max_score)
+        with self.server.lock:
+            z = self._get_value(key) or {}
+            doomed = [m for m, score in z.items() if low <= score <= high]
+            for member in doomed:
+                del z[member]
+            return len(doomed)
+
+    def zrange(self, key, start, end):
+        with self.server.lock:
+            ordered = [m for m, _ in sorted((self._get_value(key) or {}).items(), key=lambda item: (item[1], item[0]))]
+        return ordered[start:] if end == -1 else ordered[start:end + 1]
+
+    # --- streams ---
+    def _stream(self, key, create=False):
+        stream = self._get_value(key, _Stream if create else None)
+        if stream is None:
+            raise redis.exceptions.ResponseError(f"ERR no such key '{key}'")
+        return stream
+
+    def xadd(self, key, fields, id="*", **kwargs):
+        with self.server.lock:
+            stream = self._stream(key, create=True)
+            ms = int(time.time() * 1000)
+            last = self.server.last_stream_id.get(key, (0, 0))
+            new_id = (ms, 0) if ms > last[0] else (last[0], last[1] + 1)
+            self.server.last_stream_id[key] = new_id
+            entry_id = f"{new_id[0]}-{new_id[1]}"
+            stream.entries.append((new_id, entry_id, {str(k): str(v) for k, v in fields.items()}))
+            return entry_id
+
+    def xlen(self, key):
+        with self.server.lock:
+            stream = self._get_value(key)
+            return len(stream.entries) if stream else 0
+
+    def xgroup_create(self, key, group, id="$", mkstream=False):
+        with self.server.lock:
+            stream = self._stream(key, create=mkstream)
+            if group in stream.groups:
+                raise redis.exceptions.ResponseError("BUSYGROUP Consumer Group name already exists")
+            last = stream.entries[-1][0] if id == "$" and stream.entries else _stream_id(id if id != "$" else "0-0")
+            stream.groups[group] = {"last": last, "pending": {}}
+            return True
+
+    def xreadgroup(self, groupname, consumername, streams, count=None, block=None, noack=False):
+        result = self._read_group(groupname, consumername, streams, count)
+        if not result and block:
+            # Stand-in for blocking: wait a little and retry once instead of holding the lock
+            time.sleep(min(block, 50) / 1000)
+            result = self._read_group(groupname, consumername, streams, count)
+        return result
+
+    def _read_group(self, groupname, consumername, streams, count):
+        result = []
+        now_ms = int(time.time() * 1000)
+        with self.server.lock:
+            for key, start in streams.items():
+                stream = self._stream(key)
+                group = stream.groups[groupname]
+                if start != ">":
+                    raise NotImplementedError("FakeRedis only reads new entries ('>').")
+                first = stream.index_after(group["last"])
+                batch = stream.entries[first:first + count] if count else stream.entries[first:]
+                if not batch:
+                    continue
+                group["last"] = batch[-1][0]
+                for _, entry_id, _ in batch:
+                    group["pending"][entry_id] = [consumername, now_ms]
+                result.append([key, [(entry_id, dict(fields)) for _, entry_id, fields in batch]])
+        return result
+
+    def xack(self, key, group, *ids):
+        with self.server.lock:
+            pending = self._stream(key).groups[group]["pending"]
+            return sum(pending.pop(entry_id, None) is not None for entry_id in ids)
+
+    def xautoclaim(self, key, group, consumer, min_idle_time, start_id="0-0", count=100, justid=False):
+        now_ms = int(time.time() * 1000)
+        with self.server.lock:
+            stream = self._stream(key)
+            pending = stream.groups[group]["pending"]
+            fields_by_id = {entry_id: fields for _, entry_id, fields in stream.entries}
+            start = _stream_id(start_id)
+            claimed = []
+            for entry_id in sorted(pending, key=_stream_id):
+                if _stream_id(entry_id) < start or now_ms - pending[entry_id][1] < min_idle_time:
+                    continue
+                if len(claimed) == count:
+                    return [entry_id, claimed, []]
+                pending[entry_id] = [consumer, now_ms]
+                claimed.append(entry_id if justid else (entry_id, dict(fields_by_id[entry_id])))
+            return ["0-0", claimed, []]
+
+    def xclaim(self, key, group, consumer, min_idle_time, message_ids, justid=False, **kwargs):
+        now_ms = int(time.time() * 1000)
+        with self.server.lock:
+            pending = self._stream(key).groups[group]["pending"]
+            claimed = [entry_id for entry_id in message_ids
+                       if entry_id in pending and now_ms - pending[entry_id][1] >= min_idle_time]
+            for entry_id in claimed:
+                pending[entry_id] = [consumer, now_ms]
+            return claimed
+
+    def xpending(self, key, group):
+        with self.server.lock:
+            pending = self._stream(key).groups[group]["pending"]
+            ids = sorted(pending, key=_stream_id)
+            consumers = {}
+            for consumer, _ in pending.values():
+                consumers[consumer] = consumers.get(consumer, 0) + 1
+            return {
+                "pending": len(ids),
+                "min": ids[0] if ids else None,
+                "max": ids[-1] if ids else None,
+                "consumers": [{"name": name, "pending": n} for name, n in consumers.items()],
+            }
+
+    def xinfo_groups(self, key):
+        with self.server.lock:
+            stream = self._stream(key)
+            return [
+                {"name": name, "pending": len(group["pending"]),
+                 "lag": len(stream.entries) - stream.index_after(group["last"]),
+                 "last-delivered-id": f"{group['last'][0]}-{group['last'][1]}"}
+                for name, group in stream.groups.items()
+            ]
+
+
+class FakePipeline:
+    """Queues commands and runs them in order on execute() (no MULTI semantics are needed by the callers)."""
+
+    def __init__(self, client: FakeRedis):
+        self.client = client
+        self.commands = []
+
+    def __len__(self):
+        return len(self.commands)
+
+    def __getattr__(self, name):
+        method = getattr(self.client, name)
+
+        def queue(*args, **kwargs):
+            self.commands.append((method, args, kwargs))
+            return self
+        return queue
+
+    def execute(self):
+        with self.client.server.lock:
+            results = [method(*args, **kwargs) for method, args, kwargs in self.commands]
+        self.commands = []
+        return results
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.commands = []
+        return False
+
+
+@contextmanager
+def fake_redis_servers():
+    """Routes every redis.Redis(host, port, ...) created inside the block to a shared in-memory node."""
+    servers = {}
+
+    def connect(host="localhost", port=6379, **kwargs):
+        return FakeRedis(servers.setdefault((host, int(port)), FakeRedisServer()))
+
+    with patch.object(redis, "Redis", connect):
+        yield servers
+
+
+_TOKEN = re.compile(r"\w+")
+
+
+class HashingEmbeddings:
+    """Feature-hashing embedder: each token (and token bigram) adds +-1 to a hashed dimension, then L2-normalized.
+    Deterministic, so benchmark results and recall do not depend on downloaded weights."""
+
+    def __init__(self, dim: int = 384):
+        self.dim = dim
+
+    def _embed(self, text: str) -> np.ndarray:
+        vector = np.zeros(self.dim, dtype=np.float32)
+        tokens = _TOKEN.findall(text.lower())
+        for feature in tokens + [f"{a} {b}" for a, b in zip(tokens, tokens[1:])]:
+            h = zlib.crc32(feature.encode("utf-8"))
+            vector[h % self.dim] += 1.0 if h & 0x80000000 else -1.0
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def embed_documents(self, texts):
+        return [self._embed(text).tolist() for text in texts]
+
+    def embed_query(self, text):
+        return self._embed(text).tolist()
+
+
+class StubGenerator:
+    """Stands in for the flan-t5 text2text-generation pipeline: answers with the start of the question."""
+
+    task = "text2text-generation"
+
+    def __init__(self, answer_words: int = 20):
+        self.answer_words = answer_words
+
+    def __call__(self, prompts, **kwargs):
+        prompts = [prompts] if isinstance(prompts, str) else prompts
+        return [[{"generated_text": " ".join(prompt.split()[-self.answer_words:])}] for prompt in prompts]
+
+
+def stub_captioner(image):
+    """Stands in for BLIP: describes the image by its mean brightness."""
+    brightness = float(np.asarray(image.convert("L")).mean())
+    return [{"generated_text": f"a picture with brightness {brightness:.0f}"}]
@@ -0,0 +1,65 @@
+# benchmarks/stand_ins_test.py
+import time
+
+import numpy as np
+import pytest
+import redis
+
+from benchmarks.stand_ins import FakeRedis, HashingEmbeddings, fake_redis_servers
+from ingestion.stream_sharding import ShardAssigner
+from indexing_and_embedding.model_registry import ModelRegistry
+
+
+def test_consumer_group_delivers_acks_and_reclaims():
+    r = FakeRedis()
+    r.xgroup_create("s", "g", id="0", mkstream=True)
+    with pytest.raises(redis.exceptions.ResponseError, match="BUSYGROUP"):
+        r.xgroup_create("s", "g", id="0", mkstream=True)
+    ids = [r.xadd("s", {"n": i}) for i in range(5)]
+
+    [[key, entries]] = r.xreadgroup("g", "c1", {"s": ">"}, count=3)
+    assert key == "s" and [entry_id for entry_id, _ in entries] == ids[:3]
+    assert entries[0][1] == {"n": "0"}
+    assert r.xack("s", "g", ids[0]) == 1
+    assert r.xinfo_groups("s")[0]["lag"] == 2
+    assert r.xpending("s", "g")["pending"] == 2
+
+    _, claimed, _ = r.xautoclaim("s", "g", "c2", 0, "0-0", count=10)
+    assert [entry_id for entry_id, _ in claimed] == ids[1:3]
+    assert r.xreadgroup("g", "c2", {"s": ">"}, count=10)[0][1][-1][0] == ids[-1]
+    assert r.xreadgroup("g", "c2", {"s": ">"}, count=10) == []
+
+
+def test_leases_and_model_registry_scripts_run_on_the_fake():
+    with fake_redis_servers():
+        client = redis.Redis(host="localhost", port=6379, decode_responses=True)
+        first = ShardAssigner(client, "a", num_shards=4, member_ttl_ms=60000)
+        second = ShardAssigner(redis.Redis(host="localhost", port=6379), "b", num_shards=4, member_ttl_ms=60000)
+        assert first.refresh() == [0, 1, 2, 3]
+        second.refresh()
+        first.refresh()
+        second.refresh()
+        assert sorted(first.owned_shards + second.owned_shards) == [0, 1, 2, 3]
+        first.leave()
+        assert second.refresh() == [0, 1, 2, 3]
+
+        registry = ModelRegistry(client, "model-a")
+        registry.start_migration("model-b")
+        assert registry.cutover()["model"] == "model-b"
+        assert registry.shadow() is None and registry.generation() == 2
+
+
+def test_keys_expire():
+    r = FakeRedis()
+    r.set("lease", "a", nx=True, px=20)
+    assert r.set("lease", "b", nx=True, px=20) is None
+    time.sleep(0.03)
+    assert r.get("lease") is None
+
+
+def test_hashing_embeddings_are_deterministic_and_normalized():
+    embeddings = HashingEmbeddings(dim=64)
+    [a, b] = embeddings.embed_documents(["the code of zorbin", "unrelated words entirely"])
+    assert embeddings.embed_query("the code of zorbin") == a
+    assert np.linalg.norm(a) == pytest.approx(1.0)
+    assert np.dot(a, embeddings.embed_query("code of zorbin")) > np.dot(b, embeddings.embed_query("code of zorbin"))
@@ -0,0 +1,348 @@
+# Component micro-benchmarks on a seeded synthetic corpus, with results compared against a stored baseline.
+# Runs without Redis, a Chroma server or model downloads: Redis is replaced by the in-process FakeRedis,
+# vectors go to the embedded LocalANNIndex, and the models by stand-ins (benchmarks/stand_ins.py).
+# --real-models uses MiniLM, BLIP and flan-t5-small instead.
+#
+# Metrics ending in `_ms` are lower-is-better, `_per_s` and `recall_at_5` higher-is-better; any of them moving by more
+# than --tolerance against the baseline is reported as a regression and the run exits with status 1.
+#
+# uv run python benchmarks/suite.py                                   # all cases, compare with benchmarks/baseline.json
+# uv run python benchmarks/suite.py --cases embedding vector_query    # a subset
+# uv run python benchmarks/suite.py --save-baseline                   # record the current numbers as the baseline
+
+import os
+import sys
+import json
+import time
+import shutil
+import logging
+import argparse
+import platform
+import tempfile
+import functools
+import subprocess
+from datetime import datetime, timezone
+from unittest.mock import patch
+
+import numpy as np
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(REPO_ROOT)
+
+from benchmarks.stand_ins import HashingEmbeddings, StubGenerator, fake_redis_servers, stub_captioner
+from benchmarks.synthetic_corpus import generate_image_files, generate_text_files
+
+DEFAULT_OUTPUT = os.path.join(REPO_ROOT, "benchmarks", "results", "latest.json")
+DEFAULT_BASELINE = os.path.join(REPO_ROOT, "benchmarks", "baseline.json")
+EMBEDDING_MODEL = "sentence-transformers/all-MiniLM-L6-v2"
+LOWER_IS_BETTER = ("_ms",)
+HIGHER_IS_BETTER = ("_per_s", "recall_at_5")
+
+CASES = {}
+
+
+def case(name):
+    def register(fn):
+        CASES[name] = fn
+        return fn
+    return register
+
+
+def percentiles(samples_s, prefix):
+    samples_ms = np.asarray(samples_s) * 1000
+    return {f"{prefix}_p50_ms": float(np.percentile(samples_ms, 50)), f"{prefix}_p95_ms": float(np.percentile(samples_ms, 95))}
+
+
+def timed(fn, *args, **kwargs):
+    start = time.perf_counter()
+    result = fn(*args, **kwargs)
+    return result, time.perf_counter() - start
+
+
+class BenchContext:
+    """Shared state of one run. Built lazily, so each case only pays for what it uses."""
+
+    def __init__(self, args, corpus):
+        self.args = args
+        self.corpus = corpus
+        self.embeddings = self._build_embeddings()
+        self._chunks = None
+        self.vector_client = None
+        self.published_chunks = None
+
+    def _build_embeddings(self):
+        if self.args.real_models:
+            from langchain_community.embeddings import HuggingFaceEmbeddings
+            return HuggingFaceEmbeddings(model_name=EMBEDDING_MODEL)
+        return HashingEmbeddings()
+
+    def generator(self):
+        # None makes Lookup load flan-t5-small
+        return None if self.args.real_models else StubGenerator()
+
+    def captioner(self):
+        # None makes ImageFileProcessor load BLIP
+        return None if self.args.real_models else stub_captioner
+
+    def chunks(self):
+        if self._chunks is None:
+            from file_processors.text_file_processor import TextFileProcessor
+            self._chunks = TextFileProcessor().process_files(self.corpus.text_files)
+        return self._chunks
+
+    def local_client(self, collection_name):
+        from indexing_and_embedding.chroma_db_client import ChromaClient
+        return ChromaClient(collection_name=collection_name, backend="local", local_store_path="bench_vector_store",
+                            embedding_model=self.embeddings)
+
+
+@case("text_chunking")
+def bench_text_chunking(ctx):
+    from file_processors.text_file_processor import TextFileProcessor
+
+    processor = TextFileProcessor()
+    samples, chunks = [], 0
+    for path in ctx.corpus.text_files:
+        file_chunks, seconds = timed(processor.process_files, [path])
+        samples.append(seconds)
+        chunks += len(file_chunks)
+    return {**percentiles(samples, "file"), "chunks_per_s": chunks / sum(samples)}
+
+
+@case("text_normalization")
+def bench_text_normalization(ctx):
+    from file_processors.text_file_processor import TextFileProcessor
+
+    processor = TextFileProcessor()
+    samples, size = [], 0
+    for path in ctx.corpus.text_files:
+        with open(path) as f:
+            text = f.read()
+        _, seconds = timed(processor._remove_stop_words, text)
+        samples.append(seconds)
+        size += len(text.encode("utf-8"))
+    return {**percentiles(samples, "file"), "mb_per_s": size / 1e6 / sum(samples)}
+
+
+@case("image_captioning")
+def bench_image_captioning(ctx):
+    from file_processors.caption_cache import CaptionCache
+    from file_processors.image_file_processor import ImageFileProcessor
+
+    cache = CaptionCache("bench_caption_cache.sqlite")
+    processor = ImageFileProcessor(caption_cache=cache, captioner=ctx.captioner())
+    samples = [timed(processor.process_files, [path])[1] for path in ctx.corpus.image_files]
+    # Near-duplicates only, the corpus has no exact copies
+    first_pass_hit_rate = cache.stats()["hit_rate"]
+    # Second pass: every image is now an exact cache hit
+    cached = [timed(processor.process_files, [path])[1] for path in ctx.corpus.image_files]
+    return {
+        **percentiles(samples, "image"),
+        **percentiles(cached, "cached_image"),
+        "images_per_s": len(samples) / sum(samples),
+        "first_pass_hit_rate": first_pass_hit_rate,
+    }
+
+
+def publish_corpus(ctx):
+    """Runs each user's producer pass over the synthetic corpus. Returns (chunks published, seconds per pass)."""
+    import ingestion.producer as producer
+    from file_processors.image_file_processor import ImageFileProcessor
+
+    if ctx.published_chunks is not None:
+        return ctx.published_chunks, []
+    producer.ENABLE_CAPTION_CACHE = False
+    users = sorted(os.listdir("data"))
+    with patch.object(producer, "ImageFileProcessor", functools.partial(ImageFileProcessor, captioner=ctx.captioner())):
+        workers = [producer.UserIngestionWorker(user_id) for user_id in users]
+    samples, total = [], 0
+    for worker in workers:
+        published, seconds = timed(worker.ingest_files)
+        samples.append(seconds)
+        total += published
+    ctx.published_chunks = total
+    return total, samples
+
+
+@case("stream_publish")
+def bench_stream_publish(ctx):
+    total, samples = publish_corpus(ctx)
+    if not samples:
+        raise RuntimeError("stream_publish must run before anything else publishes the corpus.")
+    return {**percentiles(samples, "user_pass"), "chunks_per_s": total / sum(samples)}
+
+
+@case("stream_consume")
+def bench_stream_consume(ctx):
+    import ingestion.consumer as consumer_module
+
+    total, _ = publish_corpus(ctx)
+    consumer = consumer_module.IngestionConsumer(consumer_name="bench-0", chroma_db_client=ctx.local_client("bench_consume"))
+    client, stream_key = consumer.router.client_for_shard(0), consumer.router.stream_key(0)
+
+    def drained():
+        group = client.xinfo_groups(stream_key)[0]
+        return group["lag"] == 0 and group["pending"] == 0
+
+    samples, loop_count, deadline = [], 1, time.monotonic() + 600
+    try:
+        while not drained():
+            if time.monotonic() > deadline:
+                raise RuntimeError("The consumer did not drain the stream within 10 minutes.")
+            samples.append(timed(consumer.run_once, loop_count)[1])
+            loop_count += 1
+    finally:
+        consumer.assigner.leave()
+    return {**percentiles(samples, "loop"), "chunks_per_s": total / sum(samples)}
+
+
+@case("embedding")
+def bench_embedding(ctx):
+    texts = [chunk.page_content for chunk in ctx.chunks()]
+    batches = [timed(ctx.embeddings.embed_documents, texts[i:i + 64])[1] for i in range(0, len(texts), 64)]
+    questions = [question for _, question, _ in ctx.corpus.facts]
+    queries = [timed(ctx.embeddings.embed_query, question)[1] for question in questions]
+    return {**percentiles(batches, "batch64"), **percentiles(queries, "query"), "docs_per_s": len(texts) / sum(batches)}
+
+
+@case("vector_insert")
+def bench_vector_insert(ctx):
+    chunks = ctx.chunks()
+    ctx.vector_client = ctx.local_client("bench_vectors")
+    batches = [timed(ctx.vector_client.add_documents, chunks[i:i + 500])[1] for i in range(0, len(chunks), 500)]
+    _, flush_seconds = timed(ctx.vector_client.flush)
+    return {**percentiles(batches, "batch500"), "flush_ms": flush_seconds * 1000,
+            "docs_per_s": len(chunks) / (sum(batches) + flush_seconds)}
+
+
+def answer_found(documents, expected):
+    return any(expected in doc.page_content for doc in documents)
+
+
+@case("vector_query")
+def bench_vector_query(ctx):
+    if ctx.vector_client is None:
+        bench_vector_insert(ctx)
+    samples, hits = [], 0
+    for user_id, question, expected in ctx.corpus.facts[:ctx.args.queries]:
+        retriever = ctx.vector_client.get_user_retriever(user_id, top_k=5)
+        documents, seconds = timed(retriever.invoke, question)
+        samples.append(seconds)
+        hits += answer_found(documents, expected)
+    return {**percentiles(samples, "query"), "queries_per_s": len(samples) / sum(samples), "recall_at_5": hits / len(samples)}
+
+
+@case("lookup_e2e")
+def bench_lookup_e2e(ctx):
+    from lookup.lookup import Lookup
+
+    if ctx.vector_client is None:
+        bench_vector_insert(ctx)
+    lookup = Lookup(ctx.vector_client, llm_pipeline=ctx.generator())
+    samples, hits = [], 0
+    for user_id, question, expected in ctx.corpus.facts[:ctx.args.queries]:
+        result, seconds = timed(lookup.generate_reponse, user_id, question, verbose=False)
+        samples.append(seconds)
+        hits += answer_found(result["source_documents"], expected)
+    return {**percentiles(samples, "query"), "queries_per_s": len(samples) / sum(samples), "recall_at_5": hits / len(samples)}
+
+
+def compare(results, baseline, tolerance):
+    """Returns the metrics of `results` that are worse than `baseline` by more than `tolerance` (a fraction)."""
+    regressions = []
+    for case_name, metrics in results.items():
+        for metric, value in metrics.items():
+            base = baseline.get(case_name, {}).get(metric)
+            if not base:
+                continue
+            change = (value - base) / base
+            if (metric.endswith(LOWER_IS_BETTER) and change > tolerance) or \
+                    (metric.endswith(HIGHER_IS_BETTER) and change < -tolerance):
+                regressions.append({"case": case_name, "metric": metric, "baseline": base, "current": value, "change": change})
+    return regressions
+
+
+def run_metadata(args):
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=REPO_ROOT, capture_output=True, text=True).stdout.strip()
+    except OSError:
+        commit = None
+    return {
+        "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "git_commit": commit or None,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "real_models": args.real_models,
+        "corpus": {"users": args.users, "files_per_user": args.files_per_user, "images_per_user": args.images_per_user, "seed": args.seed},
+    }
+
+
+def run_suite(args):
+    corpus = generate_text_files("data", args.users, args.files_per_user, args.words_per_file, args.seed)
+    if args.images_per_user and {"image_captioning", "stream_publish", "stream_consume"} & set(args.cases):
+        generate_image_files("data", args.users, args.images_per_user, seed=args.seed, corpus=corpus)
+    ctx = BenchContext(args, corpus)
+    results = {}
+    with fake_redis_servers():
+        for name in args.cases:
+            results[name] = CASES[name](ctx)
+            print(f"{name:<20} " + "  ".join(f"{metric} {value:.4g}" for metric, value in results[name].items()))
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the component micro-benchmarks and compare them with a baseline.")
+    parser.add_argument("--cases", nargs="+", choices=list(CASES), default=list(CASES))
+    parser.add_argument("--real-models", action="store_true", help="Use MiniLM, BLIP and flan-t5-small instead of stand-ins")
+    parser.add_argument("--users", type=int, default=4)
+    parser.add_argument("--files-per-user", type=int, default=5)
+    parser.add_argument("--words-per-file", type=int, default=3000)
+    parser.add_argument("--images-per-user", type=int, default=8)
+    parser.add_argument("--queries", type=int, default=20)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", default=DEFAULT_OUTPUT)
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE)
+    parser.add_argument("--save-baseline", action="store_true", help="Write the results to --baseline as well")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="Allowed relative change before a metric counts as a regression")
+    parser.add_argument("--keep-workdir", action="store_true")
+    args = parser.parse_args()
+    output, baseline_path = os.path.abspath(args.output), os.path.abspath(args.baseline)
+
+    logging.disable(logging.INFO)  # per-file / per-batch INFO logs would dominate the small cases
+    workdir = tempfile.mkdtemp(prefix="rag_bench_")
+    previous_cwd = os.getcwd()
+    os.chdir(workdir)  # every relative store path (data/, local stores, archives, caches) lands in the workdir
+    try:
+        results = run_suite(args)
+    finally:
+        os.chdir(previous_cwd)
+        if not args.keep_workdir:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    report = {"metadata": run_metadata(args), "results": results}
+    os.makedirs(os.path.dirname(output), exist_ok=True)
+    with open(output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"Results written to {output}")
+
+    if args.save_baseline:
+        with open(baseline_path, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"Baseline saved to {baseline_path}")
+        return 0
+    if not os.path.exists(baseline_path):
+        print(f"No baseline at {baseline_path}, run with --save-baseline to record one.")
+        return 0
+    with open(baseline_path) as f:
+        baseline = json.load(f)
+    regressions = compare(results, baseline["results"], args.tolerance)
+    for r in regressions:
+        print(f"REGRESSION {r['case']}.{r['metric']}: {r['baseline']:.4g} -> {r['current']:.4g} ({r['change']:+.1%})")
+    if not regressions:
+        print(f"No regressions against {baseline_path} (commit {baseline['metadata'].get('git_commit')}).")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
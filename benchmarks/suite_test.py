@@ -0,0 +1,15 @@
+# benchmarks/suite_test.py
+from benchmarks.suite import compare
+
+
+def test_compare_flags_only_changes_beyond_tolerance_in_the_worse_direction():
+    baseline = {"vector_query": {"query_p50_ms": 10.0, "queries_per_s": 100.0, "recall_at_5": 0.9},
+                "embedding": {"docs_per_s": 1000.0, "query_p50_ms": 1.0}}
+    results = {"vector_query": {"query_p50_ms": 13.0, "queries_per_s": 130.0, "recall_at_5": 0.6},
+               "embedding": {"docs_per_s": 850.0, "query_p50_ms": 0.5},
+               "lookup_e2e": {"query_p50_ms": 50.0}}
+
+    regressions = compare(results, baseline, tolerance=0.2)
+
+    assert {(r["case"], r["metric"]) for r in regressions} == {("vector_query", "query_p50_ms"), ("vector_query", "recall_at_5")}
+    assert regressions[0]["change"] == 0.3
@@ -0,0 +1,80 @@
+"""
+Seeded synthetic corpus for the benchmark suite, laid out like the real data directory
+(`<root>/<user>/text/*.txt`, `<root>/<user>/image/*.png`) so producers and file processors see the usual paths.
+
+Text files mix stopwords (removed by TextFileProcessor) with a generated vocabulary, and every file states one
+fact ("the code of <name> is <number>") that the query cases can ask for. Images are noisy gradients; every
+`duplicate_every`-th image is a re-encoded, slightly brightened copy of an earlier one, which the caption cache
+should match by perceptual hash.
+"""
+
+import os
+import random
+from dataclasses import dataclass, field
+from typing import List
+
+STOPWORDS = ["the", "a", "of", "and", "to", "in", "is", "it", "that", "was", "for", "on", "with", "as", "at", "by"]
+
+
+@dataclass
+class SyntheticCorpus:
+    root: str
+    text_files: List[str] = field(default_factory=list)
+    image_files: List[str] = field(default_factory=list)
+    facts: List[tuple] = field(default_factory=list)  # (user_id, question, expected answer)
+
+
+def _vocabulary(rng, size):
+    letters = "abcdefghijklmnopqrstuvwxyz"
+    return ["".join(rng.choice(letters) for _ in range(rng.randint(4, 10))) for _ in range(size)]
+
+
+def _paragraph(rng, vocabulary, words):
+    tokens = [rng.choice(STOPWORDS) if rng.random() < 0.4 else rng.choice(vocabulary) for _ in range(words)]
+    return " ".join(tokens).capitalize() + "."
+
+
+def generate_text_files(root, num_users=4, files_per_user=5, words_per_file=3000, seed=0):
+    rng = random.Random(seed)
+    vocabulary = _vocabulary(rng, 5000)
+    corpus = SyntheticCorpus(root)
+    for u in range(num_users):
+        user_id = f"user_{u}"
+        text_dir = os.path.join(root, user_id, "text")
+        os.makedirs(text_dir, exist_ok=True)
+        for f in range(files_per_user):
+            name, code = rng.choice(vocabulary), rng.randint(100000, 999999)
+            paragraphs = [_paragraph(rng, vocabulary, 120) for _ in range(max(1, words_per_file // 120))]
+            paragraphs.insert(rng.randrange(len(paragraphs) + 1), f"The code of {name} is {code}.")
+            path = os.path.join(text_dir, f"doc_{f}.txt")
+            with open(path, "w") as out:
+                out.write("\n\n".join(paragraphs))
+            corpus.text_files.append(path)
+            corpus.facts.append((user_id, f"What is the code of {name}?", str(code)))
+    return corpus
+
+
+def generate_image_files(root, num_users=2, images_per_user=10, size=128, duplicate_every=4, seed=0, corpus=None):
+    import numpy as np
+    from PIL import Image
+
+    rng = np.random.default_rng(seed)
+    corpus = corpus or SyntheticCorpus(root)
+    originals = []
+    for u in range(num_users):
+        image_dir = os.path.join(root, f"user_{u}", "image")
+        os.makedirs(image_dir, exist_ok=True)
+        for i in range(images_per_user):
+            path = os.path.join(image_dir, f"img_{i}.png")
+            if originals and i % duplicate_every == duplicate_every - 1:
+                source = Image.open(originals[int(rng.integers(len(originals)))]).convert("RGB")
+                source.point(lambda value: min(255, value + 3)).save(path.replace(".png", ".jpg"), quality=90)
+                path = path.replace(".png", ".jpg")
+            else:
+                gradient = np.linspace(0, 255, size)[None, :, None] * rng.uniform(0.2, 1.0, size=(1, 1, 3))
+                noise = rng.integers(0, 40, size=(size, size, 3))
+                pixels = np.clip(gradient + noise, 0, 255).astype(np.uint8)
+                Image.fromarray(pixels).save(path)
+                originals.append(path)
+            corpus.image_files.append(path)
+    return corpus
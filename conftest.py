@@ -0,0 +1,4 @@
+# Some tests import their module under `patch.dict("sys.modules", ...)`, which drops every module first
+# imported inside the block when it exits. numpy refuses to be imported twice per process, so load it here
+# before any test module is collected.
+import numpy  # noqa: F401
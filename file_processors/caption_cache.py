@@ -0,0 +1,155 @@
+"""
+On-disk cache of BLIP captions shared by every producer process (SQLite in WAL mode).
+
+Lookups go by exact content hash first (same file copied to another folder or uploaded by another user), then by a
+64-bit difference hash (dHash) within a Hamming distance threshold (the same photo re-encoded or resized).
+Hit counts and the captioning time the hits saved are kept in the same database, so `stats()` covers all processes.
+"""
+
+import os
+import time
+import sqlite3
+import hashlib
+import logging
+import threading
+import numpy as np
+
+DEFAULT_CACHE_PATH = "caption_cache.sqlite"
+# dHash bits that may differ for two images to count as the same picture
+DEFAULT_HAMMING_THRESHOLD = 4
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS captions (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    sha256 TEXT UNIQUE NOT NULL,
+    phash INTEGER NOT NULL,
+    caption TEXT NOT NULL,
+    caption_seconds REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS stats (
+    name TEXT PRIMARY KEY,
+    value REAL NOT NULL
+);
+"""
+
+
+def file_sha256(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def dhash(image) -> int:
+    """64-bit difference hash: 9x8 grayscale thumbnail, one bit per horizontally adjacent pixel pair."""
+    pixels = np.asarray(image.convert("L").resize((9, 8)), dtype=np.int16)
+    bits = (pixels[:, 1:] > pixels[:, :-1]).flatten()
+    return int(sum(1 << i for i, bit in enumerate(bits) if bit))
+
+
+def _to_signed(value: int) -> int:
+    # SQLite integers are signed 64-bit
+    return value - (1 << 64) if value >= (1 << 63) else value
+
+
+class CaptionCache:
+    def __init__(self, path: str = DEFAULT_CACHE_PATH, hamming_threshold: int = DEFAULT_HAMMING_THRESHOLD):
+        self.path = path
+        self.hamming_threshold = hamming_threshold
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(_SCHEMA)
+        self._conn.commit()
+        self._lock = threading.Lock()
+        # In-memory copy of (id, phash, caption, seconds) for near-duplicate scans, extended with rows other
+        # processes added since the last scan
+        self._last_id = 0
+        self._ids = np.zeros(0, dtype=np.int64)
+        self._phashes = np.zeros(0, dtype=np.uint64)
+
+    def caption_for(self, image_path: str, caption_image, open_image=None):
+        """Returns the caption of image_path, running caption_image(image) only for images not seen before."""
+        sha256 = file_sha256(image_path)
+        hit = self._lookup_exact(sha256)
+        if hit is not None:
+            self._record("exact_hits", hit[1])
+            return hit[0]
+
+        if open_image is None:
+            from PIL import Image
+            open_image = Image.open
+        image = open_image(image_path)
+        phash = dhash(image)
+        hit = self._lookup_near(phash)
+        if hit is not None:
+            caption, seconds = hit
+            # Remember this exact file too, so its next lookup skips the perceptual scan
+            self._insert(sha256, phash, caption, seconds)
+            self._record("near_hits", seconds)
+            return caption
+
+        start = time.perf_counter()
+        caption = caption_image(image)
+        seconds = time.perf_counter() - start
+        self._insert(sha256, phash, caption, seconds)
+        self._record("misses", 0.0)
+        return caption
+
+    def stats(self) -> dict:
+        with self._lock:
+            rows = dict(self._conn.execute("SELECT name, value FROM stats").fetchall())
+        exact, near, misses = rows.get("exact_hits", 0), rows.get("near_hits", 0), rows.get("misses", 0)
+        lookups = exact + near + misses
+        return {
+            "lookups": int(lookups),
+            "exact_hits": int(exact),
+            "near_hits": int(near),
+            "misses": int(misses),
+            "hit_rate": (exact + near) / lookups if lookups else 0.0,
+            "seconds_saved": rows.get("seconds_saved", 0.0),
+        }
+
+    def log_stats(self):
+        stats = self.stats()
+        if stats["lookups"]:
+            logging.info(f"[CaptionCache] hit rate {stats['hit_rate']:.1%} ({stats['exact_hits']} exact, "
+                         f"{stats['near_hits']} near-duplicate, {stats['misses']} captioned), "
+                         f"{stats['seconds_saved']:.1f}s of captioning saved.")
+
+    def _lookup_exact(self, sha256):
+        with self._lock:
+            return self._conn.execute("SELECT caption, caption_seconds FROM captions WHERE sha256 = ?", (sha256,)).fetchone()
+
+    def _lookup_near(self, phash: int):
+        with self._lock:
+            new_rows = self._conn.execute("SELECT id, phash FROM captions WHERE id > ? ORDER BY id", (self._last_id,)).fetchall()
+            if new_rows:
+                self._ids = np.concatenate([self._ids, np.array([r[0] for r in new_rows], dtype=np.int64)])
+                self._phashes = np.concatenate([self._phashes, np.array([r[1] for r in new_rows], dtype=np.int64).view(np.uint64)])
+                self._last_id = new_rows[-1][0]
+            if not len(self._phashes):
+                return None
+            distances = np.bitwise_count(self._phashes ^ np.uint64(phash))
+            best = int(np.argmin(distances))
+            if distances[best] > self.hamming_threshold:
+                return None
+            return self._conn.execute("SELECT caption, caption_seconds FROM captions WHERE id = ?", (int(self._ids[best]),)).fetchone()
+
+    def _insert(self, sha256, phash, caption, seconds):
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR IGNORE INTO captions (sha256, phash, caption, caption_seconds) VALUES (?, ?, ?, ?)",
+                (sha256, _to_signed(phash), caption, seconds),
+            )
+            self._conn.commit()
+
+    def _record(self, counter, seconds_saved):
+        with self._lock:
+            self._conn.executemany(
+                "INSERT INTO stats (name, value) VALUES (?, ?) ON CONFLICT(name) DO UPDATE SET value = value + excluded.value",
+                [(counter, 1), ("seconds_saved", seconds_saved)],
+            )
+            self._conn.commit()
@@ -0,0 +1,80 @@
+# file_processors/caption_cache_test.py
+import numpy as np
+import pytest
+
+from file_processors.caption_cache import CaptionCache, dhash
+
+
+class FakeImage:
+    """Stands in for a PIL image: convert / resize return a fixed 8x9 grayscale thumbnail."""
+
+    def __init__(self, pixels):
+        self.pixels = np.asarray(pixels, dtype=np.uint8)
+
+    def convert(self, mode):
+        return self
+
+    def resize(self, size):
+        return self
+
+    def __array__(self, dtype=None, copy=None):
+        return self.pixels if dtype is None else self.pixels.astype(dtype)
+
+
+def gradient(seed):
+    return np.random.default_rng(seed).integers(0, 255, size=(8, 9))
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return CaptionCache(str(tmp_path / "captions.sqlite"), hamming_threshold=4)
+
+
+def write_file(tmp_path, name, content):
+    path = tmp_path / name
+    path.write_bytes(content)
+    return str(path)
+
+
+def test_dhash_ignores_uniform_brightness_changes():
+    pixels = gradient(0)
+    assert dhash(FakeImage(pixels)) == dhash(FakeImage(np.clip(pixels.astype(int) // 2, 0, 255)))
+    assert dhash(FakeImage(pixels)) != dhash(FakeImage(gradient(1)))
+
+
+def test_exact_copy_is_served_from_cache(cache, tmp_path):
+    captioner = lambda image: "a dog on a beach"
+    images = {}
+    open_image = lambda path: images.setdefault(path, FakeImage(gradient(0)))
+    first = write_file(tmp_path, "a.png", b"same bytes")
+    copy = write_file(tmp_path, "b.png", b"same bytes")
+
+    assert cache.caption_for(first, captioner, open_image) == "a dog on a beach"
+    assert cache.caption_for(copy, lambda image: pytest.fail("should not caption"), open_image) == "a dog on a beach"
+    stats = cache.stats()
+    assert (stats["exact_hits"], stats["near_hits"], stats["misses"]) == (1, 0, 1)
+    assert stats["hit_rate"] == 0.5
+
+
+def test_re_encoded_image_is_a_near_hit(cache, tmp_path):
+    pixels = gradient(0)
+    near = pixels.copy()
+    near[0, 0], near[0, 1] = near[0, 1], near[0, 0]  # flips at most two dHash bits
+    thumbnails = {"orig.png": FakeImage(pixels), "reencoded.jpg": FakeImage(near), "other.png": FakeImage(gradient(5))}
+    open_image = lambda path: thumbnails[path.rsplit("/", 1)[-1]]
+
+    cache.caption_for(write_file(tmp_path, "orig.png", b"v1"), lambda image: "a red car", open_image)
+    assert cache.caption_for(write_file(tmp_path, "reencoded.jpg", b"v2"), lambda image: "wrong", open_image) == "a red car"
+    assert cache.caption_for(write_file(tmp_path, "other.png", b"v3"), lambda image: "a cat", open_image) == "a cat"
+    assert cache.stats()["near_hits"] == 1
+
+
+def test_cache_is_shared_between_instances(tmp_path):
+    path = str(tmp_path / "captions.sqlite")
+    image_path = write_file(tmp_path, "a.png", b"bytes")
+    open_image = lambda p: FakeImage(gradient(0))
+    CaptionCache(path).caption_for(image_path, lambda image: "a boat", open_image)
+
+    other = CaptionCache(path)
+    assert other.caption_for(image_path, lambda image: "wrong", open_image) == "a boat"
+    assert other.stats()["lookups"] == 2
@@ -5,7 +5,6 @@ from typing import List
 from langchain.docstore.document import Document
 from langchain.text_splitter import RecursiveCharacterTextSplitter
 from file_processors.file_processor import FileProcessor
-from transformers import pipeline
 from PIL import Image
 
 class ImageFileProcessor(FileProcessor):
@@ -13,12 +12,27 @@ class ImageFileProcessor(FileProcessor):
     Processes multiple image files by captioning the image using Blip.
     """
     
-    def __init__(self):
+    def __init__(self, caption_cache=None, captioner=None):
         self.text_splitter = RecursiveCharacterTextSplitter(chunk_size=256, chunk_overlap=50)
-        self.captioner = pipeline("image-to-text", model="Salesforce/blip-image-captioning-base")
+        # captioner(image) -> [{'generated_text': ...}], BLIP unless a stand-in is passed. BLIP is loaded on the
+        # first image, so workers of users without images never import transformers or load the model
+        self._captioner = captioner
+        # Optional CaptionCache: identical / near-identical images are captioned once across users and processes
+        self.caption_cache = caption_cache
+
+    @property
+    def captioner(self):
+        if self._captioner is None:
+            from transformers import pipeline
+            self._captioner = pipeline("image-to-text", model="Salesforce/blip-image-captioning-base")
+        return self._captioner
 
     def _caption_image(self, image_path):
-        image = Image.open(image_path)
+        if self.caption_cache is not None:
+            return self.caption_cache.caption_for(image_path, self._run_captioner, Image.open)
+        return self._run_captioner(Image.open(image_path))
+
+    def _run_captioner(self, image):
         caption = self.captioner(image)
         return caption[0]['generated_text']
     
@@ -39,7 +53,8 @@ class ImageFileProcessor(FileProcessor):
                 continue
             
             file_name = os.path.basename(file_path)
-            description = self._caption_image(file_path)
+            caption = self._caption_image(file_path)
+            description = caption
             
             if description is None:
                 description = ""
@@ -54,6 +69,8 @@ class ImageFileProcessor(FileProcessor):
             for doc in documents:
                 doc.page_content = f"{description} file_path: {file_path}"
                 metadata = self.get_file_metadata(file_path)
+                # Raw BLIP output, kept so the embedding archive can rebuild without re-captioning
+                metadata['caption'] = caption or ""
                 doc.metadata = metadata
                 all_documents.append(doc)
                 
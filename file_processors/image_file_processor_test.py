@@ -14,10 +14,9 @@ with patch.dict("sys.modules", {
 
 @pytest.fixture
 def processor():
-    # Patch pipeline and Image.open so __init__ doesn't fail
-    with patch("file_processors.image_file_processor.pipeline", return_value=MagicMock()), \
-         patch("file_processors.image_file_processor.Image.open", return_value=MagicMock()):
-        yield ImageFileProcessor()
+    # A stand-in captioner keeps BLIP from loading, Image.open is patched so nothing touches the disk
+    with patch("file_processors.image_file_processor.Image.open", return_value=MagicMock()):
+        yield ImageFileProcessor(captioner=MagicMock())
 
 
 def test_process_files_with_caption(processor):
@@ -39,6 +38,7 @@ def test_process_files_with_caption(processor):
         assert docs[0].metadata["file_path"] == fake_file_path
         assert docs[0].metadata["user_id"] == "fake_user"
         assert docs[0].metadata["mime_type"] == "image"
+        assert docs[0].metadata["caption"] == "A cute cat sitting on a sofa."
 
 
 def test_process_files_with_missing_caption(processor, caplog):
@@ -71,3 +71,23 @@ def test_process_files_skips_invalid_files(processor, caplog):
             docs = processor.process_files([invalid_file_path])
             assert len(docs) == 0
             assert f"Skipping invalid image file: {invalid_file_path}" in caplog.text
+
+
+def test_caption_image_goes_through_cache(processor):
+    cache = MagicMock()
+    cache.caption_for.return_value = "A cached caption."
+    processor.caption_cache = cache
+
+    assert processor._caption_image("data/fake_user/images/cat.png") == "A cached caption."
+    cache.caption_for.assert_called_once()
+    assert cache.caption_for.call_args.args[0] == "data/fake_user/images/cat.png"
+    processor.captioner.assert_not_called()
+
+
+def test_blip_is_only_loaded_for_the_first_image():
+    fake_transformers = MagicMock()
+    with patch.dict("sys.modules", {"transformers": fake_transformers}):
+        processor = ImageFileProcessor()
+        fake_transformers.pipeline.assert_not_called()
+        assert processor.captioner is processor.captioner
+    fake_transformers.pipeline.assert_called_once_with("image-to-text", model="Salesforce/blip-image-captioning-base")
@@ -0,0 +1,495 @@
+"""
+Embedded approximate nearest neighbour index used by the "local" vector backend (no Chroma server).
+
+Layout on disk for one collection:
+    <path>/manifest.json          sealed segments + the active write-ahead log
+    <path>/seg_000001/            immutable segment, vector codes memory-mapped and grouped by IVF list
+    <path>/wal_000001.jsonl       chunks added since the last seal, replayed on open
+
+Writers (consumers, the bulk loader) serialize WAL appends and sealing on <path>/.lock, any number of processes /
+threads read. Sealed segments never change, so readers only need the manifest and the tail of the WAL to stay up to
+date (see `refresh`). `add` is an upsert: a row shadows every earlier row with the same id, in older segments (masked
+out at search time) or in the WAL, so retried and re-run writes never produce duplicates.
+"""
+
+import os
+import json
+import math
+import fcntl
+import base64
+import shutil
+import logging
+import threading
+import contextlib
+import numpy as np
+from indexing_and_embedding.quantization import fit_codec, load_codec
+
+MANIFEST_FILE = "manifest.json"
+RECORDS_FILE = "records.jsonl"
+LOCK_FILE = ".lock"
+# Default number of IVF lists probed per segment: this fraction of its lists, and at least MIN_NPROBE. A fixed count
+# falls behind as segments (and so their lists) grow; see the recall reported by benchmarks/bench_quantization.py
+PROBE_FRACTION = 0.35
+MIN_NPROBE = 16
+
+
+def normalize(vectors: np.ndarray) -> np.ndarray:
+    """L2-normalizes rows so inner product == cosine similarity."""
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+
+def train_ivf(vectors: np.ndarray, nlist: int, iterations: int = 10, sample_size: int = 50000, seed: int = 0):
+    """Spherical k-means over (a sample of) the vectors. Returns (nlist, dim) unit centroids."""
+    rng = np.random.default_rng(seed)
+    if len(vectors) > sample_size:
+        vectors = vectors[rng.choice(len(vectors), sample_size, replace=False)]
+    centroids = vectors[rng.choice(len(vectors), nlist, replace=False)].copy()
+    for _ in range(iterations):
+        labels = assign_lists(vectors, centroids)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, labels, vectors)
+        empty = np.bincount(labels, minlength=nlist) == 0
+        # Re-seed empty lists with random points so every list stays in use
+        sums[empty] = vectors[rng.choice(len(vectors), int(empty.sum()))]
+        centroids = normalize(sums)
+    return centroids
+
+
+def assign_lists(vectors: np.ndarray, centroids: np.ndarray, block_size: int = 8192) -> np.ndarray:
+    labels = np.empty(len(vectors), dtype=np.int64)
+    for start in range(0, len(vectors), block_size):
+        labels[start:start + block_size] = np.argmax(vectors[start:start + block_size] @ centroids.T, axis=1)
+    return labels
+
+
+def matches_filter(metadata: dict, where: dict) -> bool:
+    """Chroma-style equality filter: {"key": value}, {"key": {"$eq": v}}, {"key": {"$in": [...]}}, {"$and": [...]}."""
+    for key, condition in where.items():
+        if key == "$and":
+            if not all(matches_filter(metadata, sub) for sub in condition):
+                return False
+            continue
+        value = metadata.get(key)
+        if isinstance(condition, dict):
+            if "$eq" in condition and value != condition["$eq"]:
+                return False
+            if "$in" in condition and value not in condition["$in"]:
+                return False
+        elif value != condition:
+            return False
+    return True
+
+
+def _top_k(scores: np.ndarray, rows: np.ndarray, k: int):
+    if len(scores) > k:
+        best = np.argpartition(-scores, k - 1)[:k]
+        scores, rows = scores[best], rows[best]
+    order = np.argsort(-scores)
+    return scores[order], rows[order]
+
+
+class IndexSegment:
+    """Immutable segment. Rows are stored sorted by IVF list so a probe reads contiguous slices.
+
+    vectors.npy holds the codes of the segment's codec (float32, float16 or int8). Quantized segments may also
+    keep the float32 originals in exact.npy, which is only paged in for the rows being rescored.
+    """
+
+    FILTER_CACHE_SIZE = 256
+
+    def __init__(self, path: str):
+        self.path = path
+        self.codec = load_codec(path)
+        self.vectors = np.load(os.path.join(path, "vectors.npy"), mmap_mode="r")
+        exact_path = os.path.join(path, "exact.npy")
+        self.exact = np.load(exact_path, mmap_mode="r") if os.path.exists(exact_path) else None
+        self.centroids = np.load(os.path.join(path, "centroids.npy"))
+        self.list_offsets = np.load(os.path.join(path, "list_offsets.npy"))
+        self.ids, self.texts, self.metadatas = [], [], []
+        with open(os.path.join(path, RECORDS_FILE)) as f:
+            for line in f:
+                record = json.loads(line)
+                self.ids.append(record["id"])
+                self.texts.append(record["text"])
+                self.metadatas.append(record["metadata"])
+        self._filter_cache = {}
+        self._filter_lock = threading.Lock()
+
+    @classmethod
+    def write(cls, path: str, ids, vectors: np.ndarray, texts, metadatas, nlist: int = None, quantization: str = "none", keep_exact: bool = False):
+        """Trains IVF lists for the rows, writes them to a temp dir and renames it into place."""
+        n = len(ids)
+        nlist = nlist or max(1, min(1024, int(math.sqrt(n))))
+        nlist = min(nlist, n)
+        centroids = train_ivf(vectors, nlist)
+        labels = assign_lists(vectors, centroids)
+        order = np.argsort(labels, kind="stable")
+        list_offsets = np.zeros(nlist + 1, dtype=np.int64)
+        list_offsets[1:] = np.cumsum(np.bincount(labels, minlength=nlist))
+        ordered = np.ascontiguousarray(vectors[order], dtype=np.float32)
+        codec = fit_codec(quantization, ordered)
+
+        tmp_path = path + ".tmp"
+        shutil.rmtree(tmp_path, ignore_errors=True)
+        os.makedirs(tmp_path)
+        codec.save(tmp_path)
+        np.save(os.path.join(tmp_path, "vectors.npy"), codec.encode(ordered))
+        if keep_exact and quantization != "none":
+            np.save(os.path.join(tmp_path, "exact.npy"), ordered)
+        np.save(os.path.join(tmp_path, "centroids.npy"), centroids)
+        np.save(os.path.join(tmp_path, "list_offsets.npy"), list_offsets)
+        with open(os.path.join(tmp_path, RECORDS_FILE), "w") as f:
+            for row in order:
+                f.write(json.dumps({"id": ids[row], "text": texts[row], "metadata": metadatas[row]}) + "\n")
+        os.replace(tmp_path, path)
+        return cls(path)
+
+    def __len__(self):
+        return len(self.ids)
+
+    @property
+    def nlist(self) -> int:
+        return len(self.centroids)
+
+    def default_nprobe(self, probe_fraction: float = PROBE_FRACTION, min_nprobe: int = MIN_NPROBE) -> int:
+        return min(self.nlist, max(min_nprobe, math.ceil(probe_fraction * self.nlist)))
+
+    def memory_bytes(self) -> int:
+        """Bytes of vector codes a full scan touches (excludes the on-disk float32 rescoring copy)."""
+        return self.vectors.nbytes
+
+    def disk_bytes(self) -> int:
+        """Bytes of every file of the segment, the float32 rescoring copy included."""
+        return sum(entry.stat().st_size for entry in os.scandir(self.path) if entry.is_file())
+
+    def rows_matching(self, where: dict) -> np.ndarray:
+        key = json.dumps(where, sort_keys=True)
+        rows = self._filter_cache.get(key)
+        if rows is None:
+            rows = np.array([i for i, m in enumerate(self.metadatas) if matches_filter(m, where)], dtype=np.int64)
+            with self._filter_lock:
+                if len(self._filter_cache) >= self.FILTER_CACHE_SIZE:
+                    self._filter_cache.clear()
+                self._filter_cache[key] = rows
+        return rows
+
+    def search(self, query: np.ndarray, k: int, where: dict = None, nprobe: int = None, exact_threshold: int = 4096, rescore_factor: int = 0,
+               dead: np.ndarray = None):
+        """Returns (scores, rows) of the best k rows, exact when the candidate set is small. Rows set in the
+        dead mask (replaced by a later write of the same id) are never returned. nprobe defaults to default_nprobe().
+
+        With rescore_factor > 0 and a float32 copy on disk, the best k * rescore_factor rows by code score are
+        rescored with their original vectors.
+        """
+        rows = self.rows_matching(where) if where else None
+        if rows is not None and len(rows) == 0:
+            return np.empty(0, dtype=np.float32), rows
+
+        if rows is not None and len(rows) <= exact_threshold:
+            candidates = rows
+        elif rows is None and len(self) <= exact_threshold:
+            candidates = np.arange(len(self))
+        else:
+            probes = np.argsort(-(self.centroids @ query))[:nprobe or self.default_nprobe()]
+            candidates = np.concatenate([np.arange(self.list_offsets[p], self.list_offsets[p + 1]) for p in probes])
+            if rows is not None:
+                candidates = np.intersect1d(candidates, rows, assume_unique=True)
+                if len(candidates) < k:
+                    # Too few of the filtered rows fall in the probed lists, scan them all instead
+                    candidates = rows
+        if dead is not None:
+            candidates = candidates[~dead[candidates]]
+            if len(candidates) == 0:
+                return np.empty(0, dtype=np.float32), candidates
+
+        prepared = self.codec.prepare_query(query)
+        rescore = rescore_factor > 0 and self.exact is not None
+        scores, candidates = _top_k(self.codec.score(self.vectors[candidates], prepared), candidates, k * rescore_factor if rescore else k)
+        if rescore:
+            scores, candidates = _top_k(self.exact[np.sort(candidates)] @ query, np.sort(candidates), k)
+        return scores, candidates
+
+
+class LocalANNIndex:
+    """Segmented IVF index with a write-ahead log. Vectors are normalized, scores are cosine similarity."""
+
+    def __init__(self, path: str, segment_size: int = 20000, nprobe: int = None, exact_threshold: int = 4096, read_only: bool = False,
+                 quantization: str = "none", rescore_factor: int = 0, probe_fraction: float = PROBE_FRACTION):
+        self.path = path
+        self.segment_size = segment_size
+        # Lists probed per segment: a fixed count when set, else probe_fraction of each segment's lists
+        self.nprobe = nprobe
+        self.probe_fraction = probe_fraction
+        self.exact_threshold = exact_threshold
+        # Codec for newly sealed segments ("none", "float16", "int8"), existing segments keep their own
+        self.quantization = quantization
+        # 0 (default) disables rescoring. Otherwise quantized segments also keep their float32 originals on disk for
+        # rescoring, which costs more disk than an unquantized segment (see benchmarks/bench_quantization.py)
+        self.rescore_factor = rescore_factor
+        self.read_only = read_only
+        self._write_lock = threading.RLock()
+        self._state_lock = threading.Lock()
+        self._segments = ()
+        # id -> (segment name, row) of its live row (None while it is in the write buffer), and per-segment masks
+        # of the rows a later write of the same id replaced
+        self._locations = {}
+        self._dead = {}
+        self._lock_depth = 0
+        self._manifest = None
+        self._manifest_mtime = None
+        self._wal_offset = 0
+        self._reset_buffer()
+
+        if not read_only:
+            os.makedirs(path, exist_ok=True)
+            with self._exclusive():
+                if not os.path.exists(os.path.join(path, MANIFEST_FILE)):
+                    self._write_manifest({"segments": [], "wal": self._wal_name(1), "next_segment": 1})
+                self.refresh()
+                self._remove_orphans()
+        else:
+            # A reader may open a collection before the writer has created it, it simply stays empty until then
+            self.refresh()
+
+    # ----- public API -----
+
+    def add(self, ids, vectors, texts, metadatas):
+        """Upserts rows: appends them to the WAL (fsynced) and the in-memory buffer, sealing a segment when it is
+        full. The last write of an id wins."""
+        if self.read_only:
+            raise PermissionError("Index was opened read-only.")
+        vectors = normalize(vectors)
+        with self._exclusive():
+            # Another writer may have written this collection since we last did (shard handed over, bulk load)
+            self.refresh()
+            lines = []
+            for i, chunk_id in enumerate(ids):
+                lines.append(json.dumps({
+                    "id": chunk_id,
+                    "text": texts[i],
+                    "metadata": metadatas[i] or {},
+                    "vector": base64.b64encode(vectors[i].tobytes()).decode("ascii"),
+                }) + "\n")
+            with open(os.path.join(self.path, self._manifest["wal"]), "a") as f:
+                f.write("".join(lines))
+                f.flush()
+                os.fsync(f.fileno())
+                self._wal_offset = f.tell()
+            self._append_to_buffer(list(ids), vectors, list(texts), [m or {} for m in metadatas])
+            if len(self._buffer_ids) >= self.segment_size:
+                self.flush()
+
+    def search(self, query_vector, k: int = 4, where: dict = None):
+        """Returns up to k (id, text, metadata, score) tuples, best first."""
+        if self.read_only:
+            self.refresh()
+        query = normalize(query_vector)
+        with self._state_lock:
+            segments, dead = self._segments, self._dead
+            buffer = (self._buffer_ids, self._buffer_matrix(), self._buffer_texts, self._buffer_metadatas)
+
+        results = []
+        for segment in segments:
+            mask = dead.get(os.path.basename(segment.path))
+            nprobe = self.nprobe or segment.default_nprobe(self.probe_fraction)
+            scores, rows = segment.search(query, k, where, nprobe, self.exact_threshold, self.rescore_factor, mask)
+            results.extend((float(s), segment.ids[r], segment.texts[r], segment.metadatas[r]) for s, r in zip(scores, rows))
+
+        buffer_ids, buffer_vectors, buffer_texts, buffer_metadatas = buffer
+        if buffer_ids:
+            rows = np.arange(len(buffer_ids))
+            if where:
+                rows = np.array([i for i in rows if matches_filter(buffer_metadatas[i], where)], dtype=np.int64)
+            if len(rows):
+                scores, rows = _top_k(buffer_vectors[rows] @ query, rows, k)
+                results.extend((float(s), buffer_ids[r], buffer_texts[r], buffer_metadatas[r]) for s, r in zip(scores, rows))
+
+        results.sort(key=lambda r: -r[0])
+        return [(chunk_id, text, metadata, score) for score, chunk_id, text, metadata in results[:k]]
+
+    def flush(self):
+        """Seals the buffered rows into a new segment and starts a fresh WAL."""
+        with self._exclusive():
+            self.refresh()
+            if not self._buffer_ids:
+                return
+            manifest = dict(self._manifest)
+            segment_name = f"seg_{manifest['next_segment']:06d}"
+            segment = IndexSegment.write(
+                os.path.join(self.path, segment_name),
+                self._buffer_ids, self._buffer_matrix(), self._buffer_texts, self._buffer_metadatas,
+                quantization=self.quantization, keep_exact=self.rescore_factor > 0,
+            )
+            old_wal = manifest["wal"]
+            manifest["segments"] = manifest["segments"] + [segment_name]
+            manifest["next_segment"] += 1
+            manifest["wal"] = self._wal_name(manifest["next_segment"])
+            open(os.path.join(self.path, manifest["wal"]), "a").close()
+            self._write_manifest(manifest)
+            with self._state_lock:
+                self._segments = self._segments + (segment,)
+                self._manifest = manifest
+                self._reset_buffer()
+                self._wal_offset = 0
+                # The buffered rows were already deduplicated and shadowed older rows, only their location changes
+                self._shadow(segment.ids, segment_name)
+            os.remove(os.path.join(self.path, old_wal))
+            logging.info(f"[LocalANNIndex] Sealed {segment_name} with {len(segment)} vectors at {self.path}")
+
+    def refresh(self):
+        """Picks up segments sealed and WAL entries appended (possibly by another process) since the last call."""
+        manifest_path = os.path.join(self.path, MANIFEST_FILE)
+        if not os.path.exists(manifest_path):
+            return
+        mtime = os.stat(manifest_path).st_mtime_ns
+        if self._manifest is None or mtime != self._manifest_mtime:
+            with open(manifest_path) as f:
+                manifest = json.load(f)
+            known = {os.path.basename(s.path): s for s in self._segments}
+            segments = tuple(known.get(name) or IndexSegment(os.path.join(self.path, name)) for name in manifest["segments"])
+            with self._state_lock:
+                if self._manifest is None or manifest["wal"] != self._manifest["wal"]:
+                    self._reset_buffer()
+                    self._wal_offset = 0
+                self._segments = segments
+                self._manifest = manifest
+                self._manifest_mtime = mtime
+                self._locations, self._dead = {}, {}
+                for segment in segments:
+                    self._shadow(segment.ids, os.path.basename(segment.path))
+                self._shadow(self._buffer_ids, None)
+        self._replay_wal()
+
+    def __len__(self):
+        """Number of distinct ids."""
+        return len(self._locations)
+
+    def memory_bytes(self) -> int:
+        """Bytes of vectors searched in memory: segment codes plus the float32 write buffer."""
+        buffer_bytes = self._buffer_matrix().nbytes if self._buffer_ids else 0
+        return sum(s.memory_bytes() for s in self._segments) + buffer_bytes
+
+    def disk_bytes(self) -> int:
+        """Bytes on disk of the sealed segments and the current WAL."""
+        wal_path = os.path.join(self.path, self._manifest["wal"]) if self._manifest else None
+        wal_bytes = os.path.getsize(wal_path) if wal_path and os.path.exists(wal_path) else 0
+        return sum(s.disk_bytes() for s in self._segments) + wal_bytes
+
+    # ----- internals -----
+
+    def _replay_wal(self):
+        wal_path = os.path.join(self.path, self._manifest["wal"])
+        if not os.path.exists(wal_path):
+            return
+        with open(wal_path, "rb") as f:
+            f.seek(self._wal_offset)
+            data = f.read()
+        # Only consume complete lines, a writer may be half way through an append
+        end = data.rfind(b"\n") + 1
+        if end == 0:
+            return
+        ids, vectors, texts, metadatas = [], [], [], []
+        for line in data[:end].splitlines():
+            record = json.loads(line)
+            ids.append(record["id"])
+            vectors.append(np.frombuffer(base64.b64decode(record["vector"]), dtype=np.float32))
+            texts.append(record["text"])
+            metadatas.append(record["metadata"])
+        self._append_to_buffer(ids, np.stack(vectors), texts, metadatas)
+        self._wal_offset += end
+
+    def _append_to_buffer(self, ids, vectors, texts, metadatas):
+        # Last write of an id wins, within the batch and over rows already buffered
+        last = {chunk_id: i for i, chunk_id in enumerate(ids)}
+        if len(last) < len(ids):
+            keep = sorted(last.values())
+            ids, vectors = [ids[i] for i in keep], vectors[keep]
+            texts, metadatas = [texts[i] for i in keep], [metadatas[i] for i in keep]
+        with self._state_lock:
+            # Replace rather than mutate so a concurrent search keeps a consistent snapshot
+            if any(self._locations.get(chunk_id, "") is None for chunk_id in ids):
+                keep = [i for i, chunk_id in enumerate(self._buffer_ids) if chunk_id not in last]
+                matrix = self._buffer_matrix()
+                self._buffer_ids = [self._buffer_ids[i] for i in keep]
+                self._buffer_texts = [self._buffer_texts[i] for i in keep]
+                self._buffer_metadatas = [self._buffer_metadatas[i] for i in keep]
+                self._buffer_blocks = [matrix[keep]] if keep else []
+            self._buffer_ids = self._buffer_ids + ids
+            self._buffer_texts = self._buffer_texts + texts
+            self._buffer_metadatas = self._buffer_metadatas + metadatas
+            self._buffer_blocks = self._buffer_blocks + [vectors]
+            self._buffer_stacked = None
+            self._shadow(ids, None)
+
+    def _shadow(self, ids, owner):
+        """Records owner (a segment name, None for the write buffer) as the location of ids, masking out the rows
+        they replace in sealed segments. Masks are replaced, not mutated, for concurrent searches."""
+        replaced = {}
+        for row, chunk_id in enumerate(ids):
+            previous = self._locations.get(chunk_id)
+            if previous is not None:
+                replaced.setdefault(previous[0], []).append(previous[1])
+            self._locations[chunk_id] = None if owner is None else (owner, row)
+        if not replaced:
+            return
+        sizes = {os.path.basename(s.path): len(s) for s in self._segments}
+        dead = dict(self._dead)
+        for name, rows in replaced.items():
+            mask = dead[name].copy() if name in dead else np.zeros(sizes[name], dtype=bool)
+            mask[rows] = True
+            dead[name] = mask
+        self._dead = dead
+
+    def _buffer_matrix(self):
+        if self._buffer_stacked is None:
+            self._buffer_stacked = np.concatenate(self._buffer_blocks) if self._buffer_blocks else np.empty((0, 0), dtype=np.float32)
+            self._buffer_blocks = [self._buffer_stacked] if self._buffer_blocks else []
+        return self._buffer_stacked
+
+    def _reset_buffer(self):
+        self._buffer_ids, self._buffer_texts, self._buffer_metadatas = [], [], []
+        self._buffer_blocks = []
+        self._buffer_stacked = None
+
+    @contextlib.contextmanager
+    def _exclusive(self):
+        """Serializes writers of the collection, across threads and processes. Reentrant within the holder."""
+        with self._write_lock:
+            if self._lock_depth:
+                self._lock_depth += 1
+                try:
+                    yield
+                finally:
+                    self._lock_depth -= 1
+                return
+            with open(os.path.join(self.path, LOCK_FILE), "a") as lock_file:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+                self._lock_depth = 1
+                try:
+                    yield
+                finally:
+                    self._lock_depth = 0
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _write_manifest(self, manifest):
+        tmp_path = os.path.join(self.path, MANIFEST_FILE + ".tmp")
+        with open(tmp_path, "w") as f:
+            json.dump(manifest, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, os.path.join(self.path, MANIFEST_FILE))
+        self._manifest_mtime = os.stat(os.path.join(self.path, MANIFEST_FILE)).st_mtime_ns
+
+    def _remove_orphans(self):
+        """Deletes segments a crash left behind before they made it into the manifest (their rows are still in the WAL)."""
+        live = set(self._manifest["segments"])
+        for name in os.listdir(self.path):
+            if name.startswith("seg_") and name not in live:
+                shutil.rmtree(os.path.join(self.path, name), ignore_errors=True)
+
+    @staticmethod
+    def _wal_name(generation: int):
+        return f"wal_{generation:06d}.jsonl"
@@ -0,0 +1,142 @@
+# indexing_and_embedding/ann_index_test.py
+import numpy as np
+import pytest
+
+from indexing_and_embedding.ann_index import LocalANNIndex, matches_filter, normalize
+
+
+def _random_vectors(n, dim=16, seed=0):
+    return np.random.default_rng(seed).standard_normal((n, dim)).astype(np.float32)
+
+
+def _add(index, vectors, users=("user_a",), offset=0):
+    n = len(vectors)
+    index.add(
+        [f"id-{offset + i}" for i in range(n)],
+        vectors,
+        [f"text {offset + i}" for i in range(n)],
+        [{"user_id": users[i % len(users)]} for i in range(n)],
+    )
+
+
+def test_search_returns_nearest_from_buffer(tmp_path):
+    index = LocalANNIndex(str(tmp_path / "docs"))
+    vectors = _random_vectors(50)
+    _add(index, vectors)
+
+    results = index.search(vectors[7], k=3)
+
+    assert results[0][0] == "id-7"
+    assert results[0][1] == "text 7"
+    assert results[0][3] == pytest.approx(1.0, abs=1e-5)
+    assert len(results) == 3
+
+
+def test_filter_restricts_results(tmp_path):
+    index = LocalANNIndex(str(tmp_path / "docs"), segment_size=40)
+    vectors = _random_vectors(100)
+    _add(index, vectors, users=("user_a", "user_b"))
+
+    results = index.search(vectors[1], k=10, where={"user_id": "user_b"})
+
+    assert len(results) == 10
+    assert all(metadata["user_id"] == "user_b" for _, _, metadata, _ in results)
+    assert results[0][0] == "id-1"
+
+
+def test_sealed_segments_and_wal_survive_reopen(tmp_path):
+    path = str(tmp_path / "docs")
+    index = LocalANNIndex(path, segment_size=30)
+    vectors = _random_vectors(70)
+    _add(index, vectors)  # two sealed segments of 30 + ten rows left in the WAL
+
+    reopened = LocalANNIndex(path, segment_size=30)
+
+    assert len(reopened) == 70
+    assert reopened.search(vectors[65], k=1)[0][0] == "id-65"
+    assert reopened.search(vectors[3], k=1)[0][0] == "id-3"
+
+
+def test_reader_sees_writes_from_writer(tmp_path):
+    path = str(tmp_path / "docs")
+    writer = LocalANNIndex(path, segment_size=20)
+    reader = LocalANNIndex(path, read_only=True)
+    vectors = _random_vectors(30)
+
+    _add(writer, vectors[:10])
+    assert reader.search(vectors[4], k=1)[0][0] == "id-4"
+
+    _add(writer, vectors[10:], offset=10)  # crosses the seal threshold
+    assert len(reader.search(vectors[25], k=30)) == 30
+    assert reader.search(vectors[25], k=1)[0][0] == "id-25"
+
+
+def test_reader_on_missing_collection_is_empty(tmp_path):
+    reader = LocalANNIndex(str(tmp_path / "missing"), read_only=True)
+    assert reader.search(_random_vectors(1)[0], k=3) == []
+    with pytest.raises(PermissionError):
+        _add(reader, _random_vectors(1))
+
+
+def test_ivf_probe_recall(tmp_path):
+    index = LocalANNIndex(str(tmp_path / "docs"), segment_size=3000, nprobe=16, exact_threshold=100)
+    vectors = _random_vectors(3000, dim=32)
+    _add(index, vectors)
+    queries = _random_vectors(50, dim=32, seed=1)
+
+    normalized = normalize(vectors)
+    hits = 0
+    for query in queries:
+        expected = {f"id-{i}" for i in np.argsort(-(normalized @ normalize(query)))[:5]}
+        hits += len(expected & {r[0] for r in index.search(query, k=5)})
+
+    assert hits / (5 * len(queries)) > 0.6
+
+
+def test_matches_filter_operators():
+    metadata = {"user_id": "user_a", "mime_type": "text"}
+    assert matches_filter(metadata, {"user_id": "user_a"})
+    assert matches_filter(metadata, {"user_id": {"$in": ["user_a", "user_b"]}})
+    assert matches_filter(metadata, {"$and": [{"user_id": {"$eq": "user_a"}}, {"mime_type": "text"}]})
+    assert not matches_filter(metadata, {"user_id": "user_b"})
+
+
+def test_re_adding_ids_replaces_rows_in_segments_and_wal(tmp_path):
+    path = str(tmp_path / "docs")
+    index = LocalANNIndex(path, segment_size=30)
+    vectors, moved = _random_vectors(40), _random_vectors(40, seed=1)
+    _add(index, vectors)  # sealed into one segment
+    index.add([f"id-{i}" for i in range(20)], vectors[:20], ["retry"] * 20, [{}] * 20)  # buffered, shadows the segment
+    index.add([f"id-{i}" for i in range(40)], moved, [f"new text {i}" for i in range(40)], [{}] * 40)  # sealed again
+    index.add(["id-3", "id-3"], moved[[4, 3]], ["stale", "latest"], [{}, {}])  # duplicate within one batch, in the WAL
+
+    for searcher in (index, LocalANNIndex(path, segment_size=30), LocalANNIndex(path, read_only=True)):
+        results = searcher.search(moved[3], k=100)
+        assert len(searcher) == 40
+        assert sorted(r[0] for r in results) == sorted(f"id-{i}" for i in range(40))
+        assert results[0][:2] == ("id-3", "latest")
+        assert all(text == f"new text {chunk_id[3:]}" for chunk_id, text, _, _ in results[1:])
+
+
+def test_default_probing_keeps_recall_on_a_multi_segment_index(tmp_path):
+    rng = np.random.default_rng(0)
+    centers = normalize(rng.standard_normal((100, 64)))
+    points = lambda n: normalize(centers[rng.integers(0, 100, n)] + 0.2 * rng.standard_normal((n, 64)))
+    vectors, queries = points(12000), points(50)
+    index = LocalANNIndex(str(tmp_path / "docs"), segment_size=4000, exact_threshold=100)
+    for start in range(0, len(vectors), 2000):
+        index.add([f"id-{i}" for i in range(start, start + 2000)], vectors[start:start + 2000], [""] * 2000,
+                  [{"user_id": f"user_{i % 2}"} for i in range(start, start + 2000)])
+    index.flush()
+    assert len(index._segments) == 3
+
+    hits = filtered_hits = 0
+    user_rows = np.arange(0, len(vectors), 2)
+    for query in queries:
+        expected = {f"id-{i}" for i in np.argsort(-(vectors @ query))[:10]}
+        hits += len(expected & {r[0] for r in index.search(query, k=10)})
+        expected = {f"id-{i}" for i in user_rows[np.argsort(-(vectors[user_rows] @ query))[:10]]}
+        filtered_hits += len(expected & {r[0] for r in index.search(query, k=10, where={"user_id": "user_0"})})
+
+    assert hits / (10 * len(queries)) >= 0.9
+    assert filtered_hits / (10 * len(queries)) >= 0.9
@@ -0,0 +1,433 @@
+"""
+Per-user BM25 inverted index, maintained by the consumer next to the vector store so lookups can run an
+exact-term search alongside the dense one.
+
+Layout on disk (one directory per user under the store root):
+    <user>/manifest.json       sealed segments + the active write-ahead log
+    <user>/seg_000001/         vocab.json, term_offsets.npy, postings_docs.npy (uint32), postings_tfs.npy (uint16),
+                               doc_lengths.npy and docs.jsonl (chunk key, text, metadata)
+    <user>/wal_000001.jsonl    chunks added since the last seal, replayed on open
+
+Chunk text arrives already lowercased and stop-word filtered by TextFileProcessor, so tokenization is a plain
+word split. Small segments are merged once a user has more than `max_segments` of them. Writers (consumers, the
+bulk loader) serialize WAL appends, sealing and merging on <user>/.lock, as in LocalANNIndex.
+
+`add` is an upsert, as in LocalANNIndex: a document replaces every earlier one with the same key, so retried and
+re-run writes do not skew term and document frequencies. Replaced documents are masked out of scoring and dropped
+when their segment is merged.
+"""
+
+import os
+import re
+import json
+import math
+import fcntl
+import shutil
+import hashlib
+import logging
+import threading
+import contextlib
+from collections import Counter
+import numpy as np
+from indexing_and_embedding.partitioning import sanitize_name
+
+MANIFEST_FILE = "manifest.json"
+LOCK_FILE = ".lock"
+_TOKEN_PATTERN = re.compile(r"\w+")
+
+
+def tokenize(text: str):
+    return _TOKEN_PATTERN.findall(text.lower())
+
+
+def document_key(page_content: str, metadata: dict) -> str:
+    """Stable identity of a chunk, shared by the lexical and dense result lists so they can be fused."""
+    return hashlib.sha1(f"{metadata.get('file_path', '')}\n{page_content}".encode("utf-8")).hexdigest()
+
+
+class BM25Segment:
+    """Immutable segment with postings stored as flat numpy arrays sliced by term offset."""
+
+    def __init__(self, path: str):
+        self.path = path
+        with open(os.path.join(path, "vocab.json")) as f:
+            self.vocab = {term: i for i, term in enumerate(json.load(f))}
+        self.term_offsets = np.load(os.path.join(path, "term_offsets.npy"))
+        self.postings_docs = np.load(os.path.join(path, "postings_docs.npy"), mmap_mode="r")
+        self.postings_tfs = np.load(os.path.join(path, "postings_tfs.npy"), mmap_mode="r")
+        self.doc_lengths = np.load(os.path.join(path, "doc_lengths.npy"))
+        self.keys, self.texts, self.metadatas = [], [], []
+        with open(os.path.join(path, "docs.jsonl")) as f:
+            for line in f:
+                record = json.loads(line)
+                self.keys.append(record["key"])
+                self.texts.append(record["text"])
+                self.metadatas.append(record["metadata"])
+
+    @classmethod
+    def write(cls, path: str, keys, texts, metadatas, term_counts):
+        """term_counts[i] is the Counter of terms of document i."""
+        postings = {}
+        for doc, counts in enumerate(term_counts):
+            for term, tf in counts.items():
+                postings.setdefault(term, []).append((doc, tf))
+        vocab = sorted(postings)
+        term_offsets = np.zeros(len(vocab) + 1, dtype=np.int64)
+        term_offsets[1:] = np.cumsum([len(postings[t]) for t in vocab])
+        flat = [p for t in vocab for p in postings[t]]
+        postings_docs = np.array([d for d, _ in flat], dtype=np.uint32)
+        postings_tfs = np.minimum(np.array([tf for _, tf in flat], dtype=np.int64), np.iinfo(np.uint16).max).astype(np.uint16)
+        doc_lengths = np.array([sum(c.values()) for c in term_counts], dtype=np.uint32)
+
+        tmp_path = path + ".tmp"
+        shutil.rmtree(tmp_path, ignore_errors=True)
+        os.makedirs(tmp_path)
+        with open(os.path.join(tmp_path, "vocab.json"), "w") as f:
+            json.dump(vocab, f)
+        np.save(os.path.join(tmp_path, "term_offsets.npy"), term_offsets)
+        np.save(os.path.join(tmp_path, "postings_docs.npy"), postings_docs)
+        np.save(os.path.join(tmp_path, "postings_tfs.npy"), postings_tfs)
+        np.save(os.path.join(tmp_path, "doc_lengths.npy"), doc_lengths)
+        with open(os.path.join(tmp_path, "docs.jsonl"), "w") as f:
+            for i, key in enumerate(keys):
+                f.write(json.dumps({"key": key, "text": texts[i], "metadata": metadatas[i]}) + "\n")
+        os.replace(tmp_path, path)
+        return cls(path)
+
+    def __len__(self):
+        return len(self.keys)
+
+    def postings(self, term: str):
+        i = self.vocab.get(term)
+        if i is None:
+            return None, None
+        start, end = self.term_offsets[i], self.term_offsets[i + 1]
+        return self.postings_docs[start:end], self.postings_tfs[start:end]
+
+    def document_frequency(self, term: str) -> int:
+        i = self.vocab.get(term)
+        return 0 if i is None else int(self.term_offsets[i + 1] - self.term_offsets[i])
+
+    def term_counts(self):
+        """Rebuilds per-document Counters, used when merging segments."""
+        counts = [Counter() for _ in self.keys]
+        for term, i in self.vocab.items():
+            start, end = self.term_offsets[i], self.term_offsets[i + 1]
+            for doc, tf in zip(self.postings_docs[start:end], self.postings_tfs[start:end]):
+                counts[doc][term] = int(tf)
+        return counts
+
+
+class BM25Index:
+    """BM25 over one user's chunks: sealed segments + a WAL-backed in-memory buffer."""
+
+    def __init__(self, path: str, segment_size: int = 5000, max_segments: int = 8, k1: float = 1.2, b: float = 0.75, read_only: bool = False):
+        self.path = path
+        self.segment_size = segment_size
+        self.max_segments = max_segments
+        self.k1 = k1
+        self.b = b
+        self.read_only = read_only
+        self._write_lock = threading.RLock()
+        self._state_lock = threading.Lock()
+        self._segments = ()
+        # key -> (segment name, row) of its live document (None while it is in the write buffer), and per-segment
+        # masks of the documents a later write of the same key replaced
+        self._locations = {}
+        self._dead = {}
+        self._lock_depth = 0
+        self._manifest = None
+        self._manifest_mtime = None
+        self._wal_offset = 0
+        self._reset_buffer()
+
+        if not read_only:
+            os.makedirs(path, exist_ok=True)
+            with self._exclusive():
+                if not os.path.exists(os.path.join(path, MANIFEST_FILE)):
+                    self._write_manifest({"segments": [], "wal": "wal_000001.jsonl", "next_segment": 1})
+                self.refresh()
+                # Segments a crash left behind before they made it into the manifest
+                for name in os.listdir(path):
+                    if name.startswith("seg_") and name not in self._manifest["segments"]:
+                        shutil.rmtree(os.path.join(path, name), ignore_errors=True)
+        else:
+            self.refresh()
+
+    def add(self, keys, texts, metadatas):
+        """Upserts documents, the last write of a key wins."""
+        if self.read_only:
+            raise PermissionError("Index was opened read-only.")
+        with self._exclusive():
+            # Another writer may have written this user's index since we last did (shard handed over, bulk load)
+            self.refresh()
+            with open(os.path.join(self.path, self._manifest["wal"]), "a") as f:
+                f.write("".join(json.dumps({"key": k, "text": t, "metadata": m}) + "\n" for k, t, m in zip(keys, texts, metadatas)))
+                f.flush()
+                os.fsync(f.fileno())
+                self._wal_offset = f.tell()
+            self._append_to_buffer(list(keys), list(texts), list(metadatas))
+            if len(self._buffer_keys) >= self.segment_size:
+                self.flush()
+
+    def search(self, query: str, k: int = 5):
+        """Returns up to k (key, text, metadata, score) tuples, best first."""
+        if self.read_only:
+            self.refresh()
+        terms = set(tokenize(query))
+        with self._state_lock:
+            segments, dead = self._segments, self._dead
+            buffer = (self._buffer_keys, self._buffer_texts, self._buffer_metadatas, self._buffer_counts)
+        buffer_keys, buffer_texts, buffer_metadatas, buffer_counts = buffer
+        masks = [dead.get(os.path.basename(s.path)) for s in segments]
+
+        num_docs = sum(len(s) - (int(m.sum()) if m is not None else 0) for s, m in zip(segments, masks)) + len(buffer_keys)
+        if num_docs == 0 or not terms:
+            return []
+        total_length = sum(int(s.doc_lengths[~m].sum() if m is not None else s.doc_lengths.sum()) for s, m in zip(segments, masks))
+        total_length += sum(sum(c.values()) for c in buffer_counts)
+        avg_length = max(total_length / num_docs, 1e-9)
+        idf = {}
+        for term in terms:
+            df = sum(1 for c in buffer_counts if term in c)
+            for segment, mask in zip(segments, masks):
+                if mask is None:
+                    df += segment.document_frequency(term)
+                else:
+                    docs, _ = segment.postings(term)
+                    df += 0 if docs is None else int((~mask[docs]).sum())
+            if df:
+                idf[term] = math.log(1 + (num_docs - df + 0.5) / (df + 0.5))
+
+        results = []
+        for segment, mask in zip(segments, masks):
+            scores = np.zeros(len(segment), dtype=np.float32)
+            norm = self.k1 * (1 - self.b + self.b * segment.doc_lengths / avg_length)
+            for term, weight in idf.items():
+                docs, tfs = segment.postings(term)
+                if docs is None:
+                    continue
+                tfs = tfs.astype(np.float32)
+                scores[docs] += weight * tfs * (self.k1 + 1) / (tfs + norm[docs])
+            if mask is not None:
+                scores[mask] = 0
+            for doc in np.argsort(-scores)[:k]:
+                if scores[doc] > 0:
+                    results.append((float(scores[doc]), segment.keys[doc], segment.texts[doc], segment.metadatas[doc]))
+
+        for i, counts in enumerate(buffer_counts):
+            norm = self.k1 * (1 - self.b + self.b * sum(counts.values()) / avg_length)
+            score = sum(w * counts[t] * (self.k1 + 1) / (counts[t] + norm) for t, w in idf.items() if t in counts)
+            if score > 0:
+                results.append((score, buffer_keys[i], buffer_texts[i], buffer_metadatas[i]))
+
+        results.sort(key=lambda r: -r[0])
+        return [(key, text, metadata, score) for score, key, text, metadata in results[:k]]
+
+    def flush(self):
+        """Seals the buffer into a segment, then merges the smallest segments if there are too many."""
+        with self._exclusive():
+            # Seal from the current manifest: another writer may have sealed or merged since our last add
+            self.refresh()
+            if not self._buffer_keys:
+                return
+            manifest = dict(self._manifest)
+            name = f"seg_{manifest['next_segment']:06d}"
+            segment = BM25Segment.write(os.path.join(self.path, name), self._buffer_keys, self._buffer_texts, self._buffer_metadatas, self._buffer_counts)
+            old_wal = manifest["wal"]
+            manifest["next_segment"] += 1
+            manifest["segments"] = manifest["segments"] + [name]
+            manifest["wal"] = f"wal_{manifest['next_segment']:06d}.jsonl"
+            open(os.path.join(self.path, manifest["wal"]), "a").close()
+            self._write_manifest(manifest)
+            with self._state_lock:
+                self._segments = self._segments + (segment,)
+                self._manifest = manifest
+                self._reset_buffer()
+                self._wal_offset = 0
+                # The buffered documents were already deduplicated and shadowed older ones, only their location changes
+                self._shadow(segment.keys, name)
+            os.remove(os.path.join(self.path, old_wal))
+            if len(self._segments) > self.max_segments:
+                self._merge_smallest()
+
+    def refresh(self):
+        """Picks up segments and WAL entries written by another process since the last call."""
+        manifest_path = os.path.join(self.path, MANIFEST_FILE)
+        if not os.path.exists(manifest_path):
+            return
+        mtime = os.stat(manifest_path).st_mtime_ns
+        if self._manifest is None or mtime != self._manifest_mtime:
+            with open(manifest_path) as f:
+                manifest = json.load(f)
+            known = {os.path.basename(s.path): s for s in self._segments}
+            segments = tuple(known.get(n) or BM25Segment(os.path.join(self.path, n)) for n in manifest["segments"])
+            with self._state_lock:
+                if self._manifest is None or manifest["wal"] != self._manifest["wal"]:
+                    self._reset_buffer()
+                    self._wal_offset = 0
+                self._segments = segments
+                self._manifest = manifest
+                self._manifest_mtime = mtime
+                self._rebuild_locations()
+        wal_path = os.path.join(self.path, self._manifest["wal"])
+        if not os.path.exists(wal_path):
+            return
+        with open(wal_path, "rb") as f:
+            f.seek(self._wal_offset)
+            data = f.read()
+        end = data.rfind(b"\n") + 1
+        if end:
+            records = [json.loads(line) for line in data[:end].splitlines()]
+            self._append_to_buffer([r["key"] for r in records], [r["text"] for r in records], [r["metadata"] for r in records])
+            self._wal_offset += end
+
+    def __len__(self):
+        """Number of distinct keys."""
+        return len(self._locations)
+
+    def _merge_smallest(self):
+        """Merges the smallest half of the segments into one, keeping the segment count bounded."""
+        by_size = sorted(self._segments, key=len)
+        to_merge = by_size[:max(2, len(by_size) // 2)]
+        keys, texts, metadatas, counts = [], [], [], []
+        for segment in to_merge:
+            # Replaced documents are dropped here, their live versions are in later segments or the merge itself
+            mask = self._dead.get(os.path.basename(segment.path))
+            live = [i for i in range(len(segment)) if mask is None or not mask[i]]
+            segment_counts = segment.term_counts()
+            keys += [segment.keys[i] for i in live]
+            texts += [segment.texts[i] for i in live]
+            metadatas += [segment.metadatas[i] for i in live]
+            counts += [segment_counts[i] for i in live]
+        manifest = dict(self._manifest)
+        name = f"seg_{manifest['next_segment']:06d}"
+        merged = BM25Segment.write(os.path.join(self.path, name), keys, texts, metadatas, counts)
+        merged_names = {os.path.basename(s.path) for s in to_merge}
+        manifest["next_segment"] += 1
+        manifest["segments"] = [n for n in manifest["segments"] if n not in merged_names] + [name]
+        self._write_manifest(manifest)
+        with self._state_lock:
+            self._segments = tuple(s for s in self._segments if os.path.basename(s.path) not in merged_names) + (merged,)
+            self._manifest = manifest
+            self._rebuild_locations()
+        for merged_name in merged_names:
+            shutil.rmtree(os.path.join(self.path, merged_name), ignore_errors=True)
+        logging.info(f"[BM25Index] Merged {len(to_merge)} segments into {name} ({len(merged)} chunks) at {self.path}")
+
+    def _append_to_buffer(self, keys, texts, metadatas):
+        # Last write of a key wins, within the batch and over documents already buffered
+        last = {key: i for i, key in enumerate(keys)}
+        if len(last) < len(keys):
+            keep = sorted(last.values())
+            keys, texts, metadatas = [keys[i] for i in keep], [texts[i] for i in keep], [metadatas[i] for i in keep]
+        counts = [Counter(tokenize(t)) for t in texts]
+        with self._state_lock:
+            if any(self._locations.get(key, "") is None for key in keys):
+                keep = [i for i, key in enumerate(self._buffer_keys) if key not in last]
+                self._buffer_keys = [self._buffer_keys[i] for i in keep]
+                self._buffer_texts = [self._buffer_texts[i] for i in keep]
+                self._buffer_metadatas = [self._buffer_metadatas[i] for i in keep]
+                self._buffer_counts = [self._buffer_counts[i] for i in keep]
+            self._buffer_keys = self._buffer_keys + keys
+            self._buffer_texts = self._buffer_texts + texts
+            self._buffer_metadatas = self._buffer_metadatas + metadatas
+            self._buffer_counts = self._buffer_counts + counts
+            self._shadow(keys, None)
+
+    def _rebuild_locations(self):
+        """Recomputes key locations and replaced-document masks from segment order, the buffer being newest."""
+        self._locations, self._dead = {}, {}
+        for segment in self._segments:
+            self._shadow(segment.keys, os.path.basename(segment.path))
+        self._shadow(self._buffer_keys, None)
+
+    def _shadow(self, keys, owner):
+        """Records owner (a segment name, None for the write buffer) as the location of keys, masking out the
+        documents they replace in sealed segments. Masks are replaced, not mutated, for concurrent searches."""
+        replaced = {}
+        for row, key in enumerate(keys):
+            previous = self._locations.get(key)
+            if previous is not None:
+                replaced.setdefault(previous[0], []).append(previous[1])
+            self._locations[key] = None if owner is None else (owner, row)
+        if not replaced:
+            return
+        sizes = {os.path.basename(s.path): len(s) for s in self._segments}
+        dead = dict(self._dead)
+        for name, rows in replaced.items():
+            mask = dead[name].copy() if name in dead else np.zeros(sizes[name], dtype=bool)
+            mask[rows] = True
+            dead[name] = mask
+        self._dead = dead
+
+    def _reset_buffer(self):
+        self._buffer_keys, self._buffer_texts, self._buffer_metadatas, self._buffer_counts = [], [], [], []
+
+    @contextlib.contextmanager
+    def _exclusive(self):
+        """Serializes writers of the index, across threads and processes. Reentrant within the holder."""
+        with self._write_lock:
+            if self._lock_depth:
+                self._lock_depth += 1
+                try:
+                    yield
+                finally:
+                    self._lock_depth -= 1
+                return
+            with open(os.path.join(self.path, LOCK_FILE), "a") as lock_file:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+                self._lock_depth = 1
+                try:
+                    yield
+                finally:
+                    self._lock_depth = 0
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _write_manifest(self, manifest):
+        tmp_path = os.path.join(self.path, MANIFEST_FILE + ".tmp")
+        with open(tmp_path, "w") as f:
+            json.dump(manifest, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, os.path.join(self.path, MANIFEST_FILE))
+        self._manifest_mtime = os.stat(os.path.join(self.path, MANIFEST_FILE)).st_mtime_ns
+
+
+class BM25Store:
+    """One BM25Index per user under a root directory."""
+
+    def __init__(self, root: str = "bm25_index", read_only: bool = False, **index_kwargs):
+        self.root = root
+        self.read_only = read_only
+        self.index_kwargs = index_kwargs
+        self._indexes = {}
+        self._lock = threading.Lock()
+
+    def get_index(self, user_id: str) -> BM25Index:
+        with self._lock:
+            index = self._indexes.get(user_id)
+            if index is None:
+                path = os.path.join(self.root, sanitize_name(user_id))
+                index = BM25Index(path, read_only=self.read_only, **self.index_kwargs)
+                self._indexes[user_id] = index
+            return index
+
+    def add_documents(self, docs):
+        """Indexes LangChain documents under their metadata user_id."""
+        grouped = {}
+        for doc in docs:
+            grouped.setdefault(doc.metadata.get("user_id", "unknown_user"), []).append(doc)
+        for user_id, user_docs in grouped.items():
+            self.get_index(user_id).add(
+                [document_key(d.page_content, d.metadata) for d in user_docs],
+                [d.page_content for d in user_docs],
+                [d.metadata for d in user_docs],
+            )
+
+    def search(self, user_id: str, query: str, k: int = 5):
+        return self.get_index(user_id).search(query, k)
+
+    def flush(self):
+        for index in list(self._indexes.values()):
+            index.flush()
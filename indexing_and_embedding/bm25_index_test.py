@@ -0,0 +1,108 @@
+# indexing_and_embedding/bm25_index_test.py
+import threading
+from unittest.mock import MagicMock
+
+from indexing_and_embedding.bm25_index import BM25Index, BM25Store, document_key, tokenize
+
+
+def _add(index, texts, offset=0):
+    index.add([f"key-{offset + i}" for i in range(len(texts))], texts, [{"n": offset + i} for i in range(len(texts))])
+
+
+def test_tokenize_lowercases_and_splits():
+    assert tokenize("Mr. Darcy, ID-42!") == ["mr", "darcy", "id", "42"]
+
+
+def test_exact_term_ranks_first(tmp_path):
+    index = BM25Index(str(tmp_path / "user_a"))
+    _add(index, ["elizabeth walked garden", "darcy letter pemberley", "garden party netherfield", "invoice inv7731 paid"])
+
+    results = index.search("INV7731", k=2)
+
+    assert [r[0] for r in results] == ["key-3"]
+    assert results[0][1] == "invoice inv7731 paid"
+    assert index.search("unknownterm") == []
+
+
+def test_rare_terms_outweigh_common_terms(tmp_path):
+    index = BM25Index(str(tmp_path / "user_a"))
+    _add(index, ["garden rose"] + ["garden"] * 10)
+
+    assert index.search("garden rose", k=1)[0][0] == "key-0"
+
+
+def test_segments_merge_and_survive_reopen(tmp_path):
+    path = str(tmp_path / "user_a")
+    index = BM25Index(path, segment_size=2, max_segments=2)
+    for i in range(7):
+        _add(index, [f"common token{i}"], offset=i)  # 3 seals of 2 docs, a merge, and one doc left in the WAL
+
+    assert len(index._segments) <= 2
+    reopened = BM25Index(path, segment_size=2, max_segments=2)
+    assert len(reopened) == 7
+    for i in range(7):
+        assert reopened.search(f"token{i}", k=1)[0][0] == f"key-{i}"
+
+
+def test_reader_follows_writer(tmp_path):
+    path = str(tmp_path / "user_a")
+    writer = BM25Index(path, segment_size=3)
+    reader = BM25Index(path, read_only=True)
+
+    _add(writer, ["alpha", "beta"])
+    assert reader.search("beta")[0][0] == "key-1"
+    _add(writer, ["gamma", "delta"], offset=2)
+    assert reader.search("delta")[0][0] == "key-3"
+
+
+def test_store_partitions_by_user(tmp_path):
+    store = BM25Store(str(tmp_path))
+    doc_a = MagicMock(page_content="secret plan", metadata={"user_id": "user_a", "file_path": "data/user_a/text/1.txt"})
+    doc_b = MagicMock(page_content="secret recipe", metadata={"user_id": "user_b", "file_path": "data/user_b/text/1.txt"})
+    store.add_documents([doc_a, doc_b])
+
+    results = store.search("user_a", "secret", k=5)
+
+    assert len(results) == 1
+    assert results[0][0] == document_key(doc_a.page_content, doc_a.metadata)
+    assert store.search("user_c", "secret") == []
+
+
+def test_re_adding_keys_replaces_documents(tmp_path):
+    path = str(tmp_path / "user_a")
+    index = BM25Index(path, segment_size=3, max_segments=2)
+    _add(index, ["garden rose", "garden", "garden"])  # sealed
+    _add(index, ["garden rose", "garden", "garden"])  # retry: sealed again, shadows the first segment
+    _add(index, ["garden tulip"])                     # shadows key-0 from the WAL
+    _add(index, ["garden"] * 4, offset=10)            # seals and merges, dropping the replaced documents
+
+    for searcher in (index, BM25Index(path, read_only=True)):
+        results = searcher.search("garden rose tulip", k=10)
+        assert len(searcher) == 7
+        assert sorted(r[0] for r in results) == sorted(["key-0", "key-1", "key-2"] + [f"key-{10 + i}" for i in range(4)])
+        assert results[0][:2] == ("key-0", "garden tulip")
+        assert searcher.search("rose") == []
+
+
+
+def test_concurrent_writers_do_not_lose_segments(tmp_path):
+    path = str(tmp_path / "user_a")
+    # Separate instances share nothing in-process, like a consumer and the bulk loader writing the same user
+    writers = [BM25Index(path, segment_size=2, max_segments=4) for _ in range(4)]
+
+    def write(w, writer):
+        for i in range(w * 100, w * 100 + 30):
+            _add(writer, [f"common token{i}"], offset=i)
+
+    threads = [threading.Thread(target=write, args=(w, writer)) for w, writer in enumerate(writers)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    for writer in writers:
+        writer.flush()
+
+    reopened = BM25Index(path, read_only=True)
+    assert len(reopened) == 120
+    for i in [w * 100 + j for w in range(4) for j in range(30)]:
+        assert reopened.search(f"token{i}", k=1)[0][0] == f"key-{i}"
@@ -1,8 +1,11 @@
+import os
 import logging
 import time
-from chromadb import HttpClient
-from langchain_community.vectorstores import Chroma
-from langchain_community.embeddings import HuggingFaceEmbeddings
+from indexing_and_embedding.partitioning import CollectionPartitioner
+from indexing_and_embedding.embeddings import InstrumentedEmbeddings
+from observability import tracing
+
+VECTOR_BACKENDS = ("http", "local")
 
 class ChromaClient:
     def __init__(
@@ -14,38 +17,174 @@ class ChromaClient:
         port: int = 8000,
         tenant: str = "default_tenant",
         database: str = "default_database",
+        partition_mode: str = "shared",
+        num_shards: int = 16,
+        backend: str = "http",
+        local_store_path: str = "local_vector_store",
+        read_only: bool = False,
+        quantization: str = "none",
+        rescore_factor: int = 0,
+        embedding_backend: str = "torch",
+        embedding_threads: int = None,
+        embedding_model=None,
     ):
         self.collection_name = collection_name
-        self.embedding_model = HuggingFaceEmbeddings(model_name=embedding_model_name)
+        # torch-int8 / onnx / onnx-int8 are CPU-optimized backends compatible with the torch vectors.
+        # An embedding_model object (benchmark stand-ins) is used instead of loading embedding_model_name.
+        if embedding_model is not None:
+            self.embedding_model = embedding_model
+        elif embedding_backend == "torch" and embedding_threads is None:
+            from langchain_community.embeddings import HuggingFaceEmbeddings
+            self.embedding_model = HuggingFaceEmbeddings(model_name=embedding_model_name)
+        else:
+            from indexing_and_embedding.embeddings import build_embedding_model
+            self.embedding_model = build_embedding_model(embedding_model_name, embedding_backend, embedding_threads)
+        # Vector stores embed through this wrapper, which times every call (embedding_seconds metric)
+        self.instrumented_embeddings = InstrumentedEmbeddings(self.embedding_model)
         self.batch_size = batch_size
+        # shared: one collection filtered by user_id, per_user / hashed: one collection per user / user shard
+        self.partitioner = CollectionPartitioner(collection_name, mode=partition_mode, num_shards=num_shards)
+
+        # http: collections live in a `chroma run` server, local: embedded LocalANNIndex under local_store_path
+        if backend not in VECTOR_BACKENDS:
+            raise ValueError(f"Unknown vector backend '{backend}'. Expected one of {VECTOR_BACKENDS}.")
+        self.backend = backend
+        self.local_store_path = local_store_path
+        # Query processes open the embedded store read-only, only the consumer writes to it
+        self.read_only = read_only
+        # Reduced-precision segments ("float16" / "int8") are only supported by the embedded store
+        if quantization != "none" and backend != "local":
+            raise ValueError("Quantized vector storage requires backend='local'.")
+        self.quantization = quantization
+        self.rescore_factor = rescore_factor
+
+        self._vectordbs = {}
+        self._collections = {}
+        self._max_batch_size = None
+        if self.backend == "http":
+            from chromadb import HttpClient
+            logging.info("[ChromaClient] Connecting to Chroma HTTP server...")
+            self.client = HttpClient(host=host, port=port, tenant=tenant, database=database)
+        else:
+            logging.info(f"[ChromaClient] Using embedded vector store at {self.local_store_path}...")
+            self.client = None
+        self.vectordb = self.get_vectordb(self.collection_name)
+        logging.info(f"[ChromaClient] Connected to {self.backend} vector store.")
+
+    def get_vectordb(self, collection_name: str):
+        """Returns the (cached) LangChain vector store for a collection, creating the collection on first use."""
+        vectordb = self._vectordbs.get(collection_name)
+        if vectordb is None:
+            vectordb = self._create_vectordb(collection_name)
+            self._vectordbs[collection_name] = vectordb
+        return vectordb
+
+    def get_collection(self, collection_name: str):
+        """Returns the (cached) chromadb collection of the HTTP backend, used to upsert pre-computed vectors."""
+        collection = self._collections.get(collection_name)
+        if collection is None:
+            # Same as the LangChain wrapper creates it: no server-side embedding function, vectors come from us
+            collection = self.client.get_or_create_collection(name=collection_name, embedding_function=None)
+            self._collections[collection_name] = collection
+        return collection
 
-        logging.info("[ChromaClient] Connecting to Chroma HTTP server...")
-        client = HttpClient(host=host, port=port, tenant=tenant, database=database)
-        self.vectordb = Chroma(
-            client=client,
-            collection_name=self.collection_name,
-            embedding_function=self.embedding_model,
+    def upsert_batch_size(self) -> int:
+        """batch_size, capped for the HTTP backend at the largest batch the server accepts (5461 with SQLite)."""
+        if self.backend == "local":
+            return self.batch_size
+        if self._max_batch_size is None:
+            self._max_batch_size = self.client.get_max_batch_size()
+        return min(self.batch_size, self._max_batch_size)
+
+    def _create_vectordb(self, collection_name: str):
+        if self.backend == "local":
+            from indexing_and_embedding.ann_index import LocalANNIndex
+            from indexing_and_embedding.local_vector_store import LocalVectorStore
+            index = LocalANNIndex(
+                os.path.join(self.local_store_path, collection_name),
+                read_only=self.read_only,
+                quantization=self.quantization,
+                rescore_factor=self.rescore_factor,
+            )
+            return LocalVectorStore(index, self.instrumented_embeddings)
+        from langchain_community.vectorstores import Chroma
+        return Chroma(
+            client=self.client,
+            collection_name=collection_name,
+            embedding_function=self.instrumented_embeddings,
         )
-        logging.info("[ChromaClient] Connected to Chroma server.")
+
+    def flush(self):
+        """Seals buffered writes of the embedded backend into segments (no-op for the HTTP server)."""
+        if self.backend == "local":
+            for vectordb in self._vectordbs.values():
+                vectordb.index.flush()
 
     def add_documents(self, docs):
         if not docs:
             logging.warning("[ChromaClient] No documents to add.")
             return
 
+        if self.partitioner.mode == "shared":
+            self._add_documents_to_collection(self.vectordb, docs)
+        else:
+            for collection_name, collection_docs in self.partitioner.group_by_collection(docs).items():
+                logging.info(f"[ChromaClient] Writing {len(collection_docs)} documents to partition '{collection_name}'.")
+                self._add_documents_to_collection(self.get_vectordb(collection_name), collection_docs)
+        # No persist() in HTTP mode
+        logging.info("[ChromaClient] All documents added.")
+
+    def _add_documents_to_collection(self, vectordb, docs):
         logging.info(f"[ChromaClient] Adding {len(docs)} documents to Chroma DB in batches of {self.batch_size}...")
         for i in range(0, len(docs), self.batch_size):
             start = time.time()
             batch = docs[i:i + self.batch_size]
-            self.vectordb.add_documents(batch)
+            with tracing.span("chroma.add_documents", backend=self.backend, documents=len(batch)):
+                vectordb.add_documents(batch)
             end = time.time()
             logging.info(f"[ChromaClient] Adding batch {i//self.batch_size + 1}/{len(docs)//self.batch_size + 1} with {len(batch)} documents. Time Taken {end-start} seconds")
-        # No persist() in HTTP mode
-        logging.info("[ChromaClient] All documents added.")
+
+    def add_embedded_documents(self, docs, embeddings, ids):
+        """Bulk insert of documents whose vectors were computed by the caller (no call to the embedder).
+
+        On the HTTP backend existing ids are overwritten (upsert), so re-running a load with deterministic ids is
+        idempotent.
+        """
+        if not docs:
+            logging.warning("[ChromaClient] No documents to add.")
+            return
+        groups = {}
+        for doc, embedding, doc_id in zip(docs, embeddings, ids):
+            collection_name = self.partitioner.collection_for_user(doc.metadata.get("user_id", "unknown_user"))
+            group = groups.setdefault(collection_name, ([], [], []))
+            group[0].append(doc)
+            group[1].append(embedding)
+            group[2].append(doc_id)
+
+        batch_size = self.upsert_batch_size()
+        for collection_name, (group_docs, group_embeddings, group_ids) in groups.items():
+            store = self.get_vectordb(collection_name) if self.backend == "local" else self.get_collection(collection_name)
+            for i in range(0, len(group_docs), batch_size):
+                batch = slice(i, i + batch_size)
+                texts = [d.page_content for d in group_docs[batch]]
+                metadatas = [d.metadata for d in group_docs[batch]]
+                with tracing.span("chroma.upsert", backend=self.backend, collection=collection_name, documents=len(texts)):
+                    if self.backend == "local":
+                        store.add_embeddings(texts, group_embeddings[batch], metadatas, group_ids[batch])
+                    else:
+                        store.upsert(
+                            ids=group_ids[batch],
+                            embeddings=[list(map(float, e)) for e in group_embeddings[batch]],
+                            metadatas=metadatas,
+                            documents=texts,
+                        )
+            logging.info(f"[ChromaClient] Bulk inserted {len(group_docs)} pre-embedded documents into '{collection_name}'.")
 
     def get_user_retriever(self, user_id: str, top_k: int = 5):
         logging.info(f"[ChromaClient] Creating QA chain for user_id: {user_id}")
-        retriever = self.vectordb.as_retriever(
-            search_kwargs={"k":top_k, "filter": {"user_id": user_id}}
-        )
+        vectordb = self.get_vectordb(self.partitioner.collection_for_user(user_id))
+        search_kwargs = {"k": top_k}
+        if self.partitioner.needs_user_filter():
+            search_kwargs["filter"] = {"user_id": user_id}
+        retriever = vectordb.as_retriever(search_kwargs=search_kwargs)
         return retriever
@@ -14,14 +14,20 @@ sys.modules["langchain_huggingface"] = MagicMock()
 sys.modules["transformers"] = MagicMock()
 
 from indexing_and_embedding.chroma_db_client import ChromaClient
+from indexing_and_embedding.embeddings import PrecomputedEmbeddings
+
+
+def patch_dependency(module, name):
+    # ChromaClient imports these lazily, so patch the mocked module it will import from at call time
+    return patch.object(sys.modules[module], name)
 
 # -----------------------------
 # Simple tests
 # -----------------------------
 def test_chroma_client_initialization_simple():
-    with patch("indexing_and_embedding.chroma_db_client.HuggingFaceEmbeddings") as MockEmbeddings, \
-         patch("indexing_and_embedding.chroma_db_client.HttpClient") as MockHttpClient, \
-         patch("indexing_and_embedding.chroma_db_client.Chroma") as MockChroma:
+    with patch_dependency("langchain_community.embeddings", "HuggingFaceEmbeddings") as MockEmbeddings, \
+         patch_dependency("chromadb", "HttpClient") as MockHttpClient, \
+         patch_dependency("langchain_community.vectorstores", "Chroma") as MockChroma:
 
         mock_embedding_instance = MagicMock()
         MockEmbeddings.return_value = mock_embedding_instance
@@ -40,14 +46,15 @@ def test_chroma_client_initialization_simple():
         MockChroma.assert_called_once_with(
             client=MockHttpClient.return_value,
             collection_name="test_collection",
-            embedding_function=mock_embedding_instance,
+            embedding_function=client.instrumented_embeddings,
         )
+        assert client.instrumented_embeddings.model == mock_embedding_instance
 
 
 def test_add_documents_simple():
-    with patch("indexing_and_embedding.chroma_db_client.HuggingFaceEmbeddings"), \
-         patch("indexing_and_embedding.chroma_db_client.HttpClient"), \
-         patch("indexing_and_embedding.chroma_db_client.Chroma") as MockChroma:
+    with patch_dependency("langchain_community.embeddings", "HuggingFaceEmbeddings"), \
+         patch_dependency("chromadb", "HttpClient"), \
+         patch_dependency("langchain_community.vectorstores", "Chroma") as MockChroma:
 
         mock_vectordb = MagicMock()
         MockChroma.return_value = mock_vectordb
@@ -63,9 +70,9 @@ def test_add_documents_simple():
 
 
 def test_add_documents_empty_simple(caplog):
-    with patch("indexing_and_embedding.chroma_db_client.HuggingFaceEmbeddings"), \
-         patch("indexing_and_embedding.chroma_db_client.HttpClient"), \
-         patch("indexing_and_embedding.chroma_db_client.Chroma"):
+    with patch_dependency("langchain_community.embeddings", "HuggingFaceEmbeddings"), \
+         patch_dependency("chromadb", "HttpClient"), \
+         patch_dependency("langchain_community.vectorstores", "Chroma"):
 
         client = ChromaClient()
         with caplog.at_level("WARNING"):
@@ -75,9 +82,9 @@ def test_add_documents_empty_simple(caplog):
 
 
 def test_get_user_retriever_simple():
-    with patch("indexing_and_embedding.chroma_db_client.HuggingFaceEmbeddings"), \
-         patch("indexing_and_embedding.chroma_db_client.HttpClient"), \
-         patch("indexing_and_embedding.chroma_db_client.Chroma") as MockChroma:
+    with patch_dependency("langchain_community.embeddings", "HuggingFaceEmbeddings"), \
+         patch_dependency("chromadb", "HttpClient"), \
+         patch_dependency("langchain_community.vectorstores", "Chroma") as MockChroma:
 
         mock_vectordb = MagicMock()
         mock_retriever = MagicMock()
@@ -91,3 +98,141 @@ def test_get_user_retriever_simple():
             search_kwargs={"k": 3, "filter": {"user_id": "user_a"}}
         )
         assert retriever == mock_retriever
+
+
+def test_add_documents_per_user_partitions():
+    with patch_dependency("langchain_community.embeddings", "HuggingFaceEmbeddings"), \
+         patch_dependency("chromadb", "HttpClient"), \
+         patch_dependency("langchain_community.vectorstores", "Chroma") as MockChroma:
+
+        vectordbs = {}
+        MockChroma.side_effect = lambda **kwargs: vectordbs.setdefault(kwargs["collection_name"], MagicMock())
+
+        client = ChromaClient(collection_name="docs", partition_mode="per_user")
+        doc_a = MagicMock(metadata={"user_id": "user_a"})
+        doc_b = MagicMock(metadata={"user_id": "user_b"})
+        client.add_documents([doc_a, doc_b, doc_a])
+
+        vectordbs["docs__user_user_a"].add_documents.assert_called_once_with([doc_a, doc_a])
+        vectordbs["docs__user_user_b"].add_documents.assert_called_once_with([doc_b])
+        vectordbs["docs"].add_documents.assert_not_called()
+
+
+def test_get_user_retriever_per_user_drops_filter():
+    with patch_dependency("langchain_community.embeddings", "HuggingFaceEmbeddings"), \
+         patch_dependency("chromadb", "HttpClient"), \
+         patch_dependency("langchain_community.vectorstores", "Chroma") as MockChroma:
+
+        vectordbs = {}
+        MockChroma.side_effect = lambda **kwargs: vectordbs.setdefault(kwargs["collection_name"], MagicMock())
+
+        client = ChromaClient(collection_name="docs", partition_mode="per_user")
+        client.get_user_retriever("user_a", top_k=3)
+
+        vectordbs["docs__user_user_a"].as_retriever.assert_called_once_with(search_kwargs={"k": 3})
+
+
+def test_get_user_retriever_hashed_keeps_filter():
+    with patch_dependency("langchain_community.embeddings", "HuggingFaceEmbeddings"), \
+         patch_dependency("chromadb", "HttpClient"), \
+         patch_dependency("langchain_community.vectorstores", "Chroma") as MockChroma:
+
+        vectordbs = {}
+        MockChroma.side_effect = lambda **kwargs: vectordbs.setdefault(kwargs["collection_name"], MagicMock())
+
+        client = ChromaClient(collection_name="docs", partition_mode="hashed", num_shards=4)
+        client.get_user_retriever("user_a", top_k=3)
+
+        shard_collection = client.partitioner.collection_for_user("user_a")
+        vectordbs[shard_collection].as_retriever.assert_called_once_with(
+            search_kwargs={"k": 3, "filter": {"user_id": "user_a"}}
+        )
+
+
+def test_local_backend_skips_http_client():
+    fake_local_module = MagicMock()
+    with patch_dependency("langchain_community.embeddings", "HuggingFaceEmbeddings"), \
+         patch_dependency("chromadb", "HttpClient") as MockHttpClient, \
+         patch_dependency("langchain_community.vectorstores", "Chroma") as MockChroma, \
+         patch("indexing_and_embedding.ann_index.LocalANNIndex") as MockIndex, \
+         patch.dict("sys.modules", {"indexing_and_embedding.local_vector_store": fake_local_module}):
+
+        client = ChromaClient(collection_name="docs", backend="local", local_store_path="/tmp/store", read_only=True, quantization="int8")
+
+        MockHttpClient.assert_not_called()
+        MockChroma.assert_not_called()
+        MockIndex.assert_called_once_with("/tmp/store/docs", read_only=True, quantization="int8", rescore_factor=0)
+        assert client.vectordb == fake_local_module.LocalVectorStore.return_value
+
+
+def test_unknown_backend_raises():
+    with patch_dependency("langchain_community.embeddings", "HuggingFaceEmbeddings"):
+        with pytest.raises(ValueError):
+            ChromaClient(backend="faiss")
+
+
+def test_quantization_requires_local_backend():
+    with patch_dependency("langchain_community.embeddings", "HuggingFaceEmbeddings"):
+        with pytest.raises(ValueError):
+            ChromaClient(quantization="int8")
+
+
+def test_embedding_backend_uses_builder():
+    with patch_dependency("langchain_community.embeddings", "HuggingFaceEmbeddings") as MockEmbeddings, \
+         patch_dependency("chromadb", "HttpClient"), \
+         patch_dependency("langchain_community.vectorstores", "Chroma"), \
+         patch("indexing_and_embedding.embeddings.build_embedding_model") as mock_build:
+
+        client = ChromaClient(embedding_model_name="some/model", embedding_backend="onnx", embedding_threads=4)
+
+        MockEmbeddings.assert_not_called()
+        mock_build.assert_called_once_with("some/model", "onnx", 4)
+        assert client.embedding_model == mock_build.return_value
+
+
+def test_add_embedded_documents_upserts_per_partition():
+    with patch_dependency("langchain_community.embeddings", "HuggingFaceEmbeddings") as MockEmbeddings, \
+         patch_dependency("chromadb", "HttpClient") as MockHttpClient, \
+         patch_dependency("langchain_community.vectorstores", "Chroma"):
+
+        collections = {}
+        MockHttpClient.return_value.get_or_create_collection.side_effect = \
+            lambda name, embedding_function: collections.setdefault(name, MagicMock())
+        MockHttpClient.return_value.get_max_batch_size.return_value = 5461
+
+        client = ChromaClient(collection_name="docs", partition_mode="per_user")
+        doc_a = MagicMock(page_content="a", metadata={"user_id": "user_a"})
+        doc_b = MagicMock(page_content="b", metadata={"user_id": "user_b"})
+        client.add_embedded_documents([doc_a, doc_b], [[1.0, 0.0], [0.0, 1.0]], ["id_a", "id_b"])
+
+        collections["docs__user_user_a"].upsert.assert_called_once_with(
+            ids=["id_a"], embeddings=[[1.0, 0.0]], metadatas=[{"user_id": "user_a"}], documents=["a"]
+        )
+        collections["docs__user_user_b"].upsert.assert_called_once()
+        MockEmbeddings.return_value.embed_documents.assert_not_called()
+
+
+def test_add_embedded_documents_caps_batches_at_the_server_limit():
+    with patch_dependency("langchain_community.embeddings", "HuggingFaceEmbeddings"), \
+         patch_dependency("chromadb", "HttpClient") as MockHttpClient, \
+         patch_dependency("langchain_community.vectorstores", "Chroma"):
+
+        collection = MockHttpClient.return_value.get_or_create_collection.return_value
+        MockHttpClient.return_value.get_max_batch_size.return_value = 3
+
+        client = ChromaClient(collection_name="docs", batch_size=8192)
+        docs = [MagicMock(page_content=str(i), metadata={"user_id": "user_a"}) for i in range(7)]
+        client.add_embedded_documents(docs, [[float(i)] for i in range(7)], [f"id_{i}" for i in range(7)])
+
+        assert [len(c.kwargs["ids"]) for c in collection.upsert.call_args_list] == [3, 3, 1]
+
+
+def test_client_for_precomputed_embeddings_loads_no_model():
+    with patch_dependency("langchain_community.embeddings", "HuggingFaceEmbeddings") as MockEmbeddings, \
+         patch_dependency("chromadb", "HttpClient"), \
+         patch_dependency("langchain_community.vectorstores", "Chroma"):
+        client = ChromaClient(collection_name="restored", embedding_model=PrecomputedEmbeddings("some/model"))
+
+    MockEmbeddings.assert_not_called()
+    with pytest.raises(RuntimeError):
+        client.instrumented_embeddings.embed_documents(["text"])
@@ -0,0 +1,187 @@
+"""
+Append-only archive of every embedded chunk, so collections can be rebuilt without re-running the models.
+
+Layout for one writer (each consumer writes its own archive per model under <root>/<writer>__<model tag>/):
+    manifest.json                  embedding model, dimension, sealed segments and the active tail
+    seg_000001/embeddings.npy      float32 (rows, dim), memory-mapped on read
+    seg_000001/records.jsonl       {"id", "text", "metadata"} per row (image metadata carries the BLIP "caption")
+    tail_000002.f32 / .jsonl       rows appended since the last seal (raw float32 + records)
+
+A tail row is committed once its records line is complete: vectors are fsynced before records, and a writer
+reopening after a crash truncates both files back to the last complete line.
+"""
+
+import os
+import json
+import shutil
+import numpy as np
+
+MANIFEST_FILE = "manifest.json"
+RECORDS_FILE = "records.jsonl"
+EMBEDDINGS_FILE = "embeddings.npy"
+
+
+class EmbeddingArchive:
+    def __init__(self, path: str, model_name: str = None, segment_size: int = 50000, read_only: bool = False):
+        self.path = path
+        self.segment_size = segment_size
+        self.read_only = read_only
+        manifest_path = os.path.join(path, MANIFEST_FILE)
+        if os.path.exists(manifest_path):
+            with open(manifest_path) as f:
+                self._manifest = json.load(f)
+        elif read_only:
+            raise FileNotFoundError(f"No embedding archive at {path}.")
+        else:
+            os.makedirs(path, exist_ok=True)
+            self._manifest = {"model": model_name, "dim": None, "segments": [], "tail": "tail_000001", "next_segment": 1}
+            self._write_manifest(self._manifest)
+        if model_name and self._manifest["model"] and model_name != self._manifest["model"]:
+            raise ValueError(f"Archive at {path} holds '{self._manifest['model']}' embeddings, not '{model_name}'.")
+        self._tail_rows = 0
+        if not read_only:
+            self._tail_rows = self._recover_tail()
+
+    @property
+    def model_name(self):
+        return self._manifest["model"]
+
+    @property
+    def dim(self):
+        return self._manifest["dim"]
+
+    def append(self, ids, texts, metadatas, embeddings):
+        if self.read_only:
+            raise PermissionError("Archive was opened read-only.")
+        embeddings = np.ascontiguousarray(embeddings, dtype=np.float32)
+        if len(embeddings) == 0:
+            return
+        if self.dim is None:
+            self._manifest = dict(self._manifest, dim=int(embeddings.shape[1]))
+            self._write_manifest(self._manifest)
+        elif embeddings.shape[1] != self.dim:
+            raise ValueError(f"Expected {self.dim}-d embeddings, got {embeddings.shape[1]}-d.")
+
+        vectors_path, records_path = self._tail_paths(self._manifest["tail"])
+        with open(vectors_path, "ab") as f:
+            f.write(embeddings.tobytes())
+            f.flush()
+            os.fsync(f.fileno())
+        with open(records_path, "a") as f:
+            f.write("".join(json.dumps({"id": i, "text": t, "metadata": m}) + "\n" for i, t, m in zip(ids, texts, metadatas)))
+            f.flush()
+            os.fsync(f.fileno())
+        self._tail_rows += len(embeddings)
+        if self._tail_rows >= self.segment_size:
+            self.seal()
+
+    def seal(self):
+        """Turns the tail into an immutable .npy segment and starts a new tail."""
+        if self._tail_rows == 0:
+            return
+        manifest = dict(self._manifest)
+        vectors, records = self._read_tail(manifest["tail"])
+        segment_name = f"seg_{manifest['next_segment']:06d}"
+        tmp_path = os.path.join(self.path, segment_name + ".tmp")
+        shutil.rmtree(tmp_path, ignore_errors=True)
+        os.makedirs(tmp_path)
+        np.save(os.path.join(tmp_path, EMBEDDINGS_FILE), vectors)
+        with open(os.path.join(tmp_path, RECORDS_FILE), "w") as f:
+            f.writelines(records)
+        os.replace(tmp_path, os.path.join(self.path, segment_name))
+
+        old_tail = manifest["tail"]
+        manifest["segments"] = manifest["segments"] + [segment_name]
+        manifest["next_segment"] += 1
+        manifest["tail"] = f"tail_{manifest['next_segment']:06d}"
+        self._write_manifest(manifest)
+        self._manifest = manifest
+        self._tail_rows = 0
+        for old_path in self._tail_paths(old_tail):
+            if os.path.exists(old_path):
+                os.remove(old_path)
+
+    def iter_batches(self, batch_size: int = 4096, start: int = 0):
+        """Yields (ids, texts, metadatas, embeddings) batches over sealed segments, then the tail, skipping the
+        first `start` rows."""
+        for name in self._manifest["segments"]:
+            vectors = np.load(os.path.join(self.path, name, EMBEDDINGS_FILE), mmap_mode="r")
+            if start >= len(vectors):
+                start -= len(vectors)
+                continue
+            with open(os.path.join(self.path, name, RECORDS_FILE)) as f:
+                yield from self._batches(vectors, f, batch_size, start)
+            start = 0
+        vectors, records = self._read_tail(self._manifest["tail"])
+        yield from self._batches(vectors, records, batch_size, start)
+
+    def __len__(self):
+        total = 0
+        for name in self._manifest["segments"]:
+            total += len(np.load(os.path.join(self.path, name, EMBEDDINGS_FILE), mmap_mode="r"))
+        return total + len(self._read_tail(self._manifest["tail"])[0])
+
+    @staticmethod
+    def _batches(vectors, lines, batch_size, skip=0):
+        ids, texts, metadatas = [], [], []
+        start = skip
+        for row, line in enumerate(lines):
+            if row < skip:
+                continue
+            record = json.loads(line)
+            ids.append(record["id"])
+            texts.append(record["text"])
+            metadatas.append(record["metadata"])
+            if len(ids) == batch_size:
+                yield ids, texts, metadatas, np.asarray(vectors[start:start + len(ids)])
+                start += len(ids)
+                ids, texts, metadatas = [], [], []
+        if ids:
+            yield ids, texts, metadatas, np.asarray(vectors[start:start + len(ids)])
+
+    def _tail_paths(self, tail):
+        return os.path.join(self.path, tail + ".f32"), os.path.join(self.path, tail + ".jsonl")
+
+    def _read_tail(self, tail):
+        """Returns the committed tail rows: (vectors, record lines)."""
+        vectors_path, records_path = self._tail_paths(tail)
+        if self.dim is None or not os.path.exists(records_path):
+            return np.zeros((0, self.dim or 0), dtype=np.float32), []
+        with open(records_path) as f:
+            records = [line for line in f if line.endswith("\n")]
+        vectors = np.fromfile(vectors_path, dtype=np.float32) if os.path.exists(vectors_path) else np.zeros(0, np.float32)
+        rows = min(len(records), len(vectors) // self.dim)
+        return vectors[:rows * self.dim].reshape(rows, self.dim), records[:rows]
+
+    def _recover_tail(self):
+        """Drops a partially written last batch and returns the number of committed tail rows."""
+        vectors, records = self._read_tail(self._manifest["tail"])
+        vectors_path, records_path = self._tail_paths(self._manifest["tail"])
+        if os.path.exists(records_path):
+            with open(records_path, "r+") as f:
+                f.truncate(sum(len(line.encode("utf-8")) for line in records))
+        if os.path.exists(vectors_path):
+            with open(vectors_path, "r+b") as f:
+                f.truncate(vectors.nbytes)
+        return len(records)
+
+    def _write_manifest(self, manifest):
+        tmp_path = os.path.join(self.path, MANIFEST_FILE + ".tmp")
+        with open(tmp_path, "w") as f:
+            json.dump(manifest, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, os.path.join(self.path, MANIFEST_FILE))
+
+
+def open_archives(root: str, model_name: str = None):
+    """Opens every writer's archive under root read-only (one per consumer / bulk loader), optionally only those
+    holding model_name embeddings."""
+    if not os.path.isdir(root):
+        return []
+    archives = [
+        EmbeddingArchive(os.path.join(root, name), read_only=True)
+        for name in sorted(os.listdir(root))
+        if os.path.exists(os.path.join(root, name, MANIFEST_FILE))
+    ]
+    return [a for a in archives if model_name is None or a.model_name == model_name]
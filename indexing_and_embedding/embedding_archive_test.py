@@ -0,0 +1,89 @@
+# indexing_and_embedding/embedding_archive_test.py
+import os
+import numpy as np
+import pytest
+
+from indexing_and_embedding.embedding_archive import EmbeddingArchive, open_archives
+
+
+def rows(start, count, dim=4):
+    ids = [f"id_{i}" for i in range(start, start + count)]
+    texts = [f"text {i}" for i in range(start, start + count)]
+    metadatas = [{"user_id": "user_a", "caption": f"caption {i}"} for i in range(start, start + count)]
+    vectors = np.arange(start * dim, (start + count) * dim, dtype=np.float32).reshape(count, dim)
+    return ids, texts, metadatas, vectors
+
+
+def read_all(archive, batch_size=3):
+    ids, metadatas, vectors = [], [], []
+    for batch_ids, _, batch_metadatas, batch_vectors in archive.iter_batches(batch_size):
+        ids += batch_ids
+        metadatas += batch_metadatas
+        vectors.append(batch_vectors)
+    return ids, metadatas, np.concatenate(vectors)
+
+
+def test_round_trip_across_sealed_segments(tmp_path):
+    archive = EmbeddingArchive(str(tmp_path / "worker-0"), model_name="model-a", segment_size=5)
+    for start in range(0, 12, 4):
+        archive.append(*rows(start, 4))
+
+    reopened = EmbeddingArchive(str(tmp_path / "worker-0"), read_only=True)
+    ids, metadatas, vectors = read_all(reopened)
+    assert len(reopened) == 12
+    assert ids == [f"id_{i}" for i in range(12)]
+    assert metadatas[7]["caption"] == "caption 7"
+    np.testing.assert_array_equal(vectors, rows(0, 12)[3])
+
+
+def test_torn_tail_is_truncated_on_reopen(tmp_path):
+    path = str(tmp_path / "worker-0")
+    archive = EmbeddingArchive(path, model_name="model-a")
+    archive.append(*rows(0, 3))
+    vectors_path, records_path = archive._tail_paths(archive._manifest["tail"])
+    # Crash mid-batch: vectors written, records line cut short
+    with open(vectors_path, "ab") as f:
+        f.write(np.ones(4, dtype=np.float32).tobytes())
+    with open(records_path, "a") as f:
+        f.write('{"id": "id_3", "te')
+
+    archive = EmbeddingArchive(path, model_name="model-a")
+    archive.append(*rows(3, 1))
+    ids, _, vectors = read_all(archive)
+    assert ids == ["id_0", "id_1", "id_2", "id_3"]
+    np.testing.assert_array_equal(vectors, rows(0, 4)[3])
+
+
+def test_model_mismatch_raises(tmp_path):
+    EmbeddingArchive(str(tmp_path / "worker-0"), model_name="model-a")
+    with pytest.raises(ValueError):
+        EmbeddingArchive(str(tmp_path / "worker-0"), model_name="model-b")
+
+
+def test_open_archives_finds_every_writer(tmp_path):
+    EmbeddingArchive(str(tmp_path / "worker-0"), model_name="model-a").append(*rows(0, 2))
+    EmbeddingArchive(str(tmp_path / "worker-1"), model_name="model-a").append(*rows(2, 3))
+    os.makedirs(tmp_path / "not-an-archive")
+
+    archives = open_archives(str(tmp_path))
+    assert [len(a) for a in archives] == [2, 3]
+    assert open_archives(str(tmp_path / "missing")) == []
+
+
+def test_iter_batches_skips_start_rows(tmp_path):
+    archive = EmbeddingArchive(str(tmp_path / "worker-0"), model_name="model-a", segment_size=5)
+    archive.append(*rows(0, 6))
+    archive.append(*rows(6, 3))
+
+    reopened = EmbeddingArchive(str(tmp_path / "worker-0"), read_only=True)
+    ids = [i for batch_ids, _, _, _ in reopened.iter_batches(2, start=7) for i in batch_ids]
+    assert ids == ["id_7", "id_8"]
+    batches = list(reopened.iter_batches(4, start=2))
+    assert batches[0][0] == ["id_2", "id_3", "id_4", "id_5"]
+    np.testing.assert_array_equal(batches[0][3], rows(2, 4)[3])
+
+
+def test_open_archives_filters_by_model(tmp_path):
+    EmbeddingArchive(str(tmp_path / "worker-0__a"), model_name="model-a").append(*rows(0, 2))
+    EmbeddingArchive(str(tmp_path / "worker-0__b"), model_name="model-b").append(*rows(0, 1))
+    assert [a.model_name for a in open_archives(str(tmp_path), model_name="model-b")] == ["model-b"]
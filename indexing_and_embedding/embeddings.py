@@ -0,0 +1,195 @@
+"""
+CPU embedding backends for the sentence-transformers models used by ChromaClient.
+
+    torch       : HuggingFaceEmbeddings as before (reference fp32 vectors)
+    torch-int8  : same model with nn.Linear layers dynamically quantized to int8
+    onnx        : model exported once to ONNX and run with ONNX Runtime
+    onnx-int8   : the ONNX export with dynamically quantized int8 weights
+
+All backends mean-pool and L2-normalize like the all-MiniLM-L6-v2 pipeline, so their vectors can be written
+to and queried against collections built with the torch backend. Expected agreement with the fp32 torch
+vectors (mean cosine similarity, checked by benchmarks/bench_embedding_backends.py) is COSINE_TOLERANCE.
+"""
+
+import os
+import time
+import logging
+from typing import List
+import numpy as np
+from observability import metrics, tracing
+
+EMBEDDING_BACKENDS = ("torch", "torch-int8", "onnx", "onnx-int8")
+
+EMBEDDING_SECONDS = metrics.histogram("embedding_seconds", "Time of one embedder call.", ["op"])
+# Query embedding time of the current thread, read by Lookup to split retrieval into embed and search
+QUERY_EMBEDDING_TIMER = metrics.ThreadTimer()
+
+# Minimum mean cosine similarity to the fp32 torch vectors for a backend to be considered compatible
+COSINE_TOLERANCE = {
+    "torch": 1.0,
+    "onnx": 0.9999,
+    "torch-int8": 0.98,
+    "onnx-int8": 0.98,
+}
+
+
+def mean_pool(last_hidden_state: np.ndarray, attention_mask: np.ndarray) -> np.ndarray:
+    """Averages token vectors over the attention mask and L2-normalizes the result."""
+    mask = attention_mask[..., None].astype(np.float32)
+    summed = (last_hidden_state * mask).sum(axis=1)
+    pooled = summed / np.clip(mask.sum(axis=1), 1e-9, None)
+    return pooled / np.clip(np.linalg.norm(pooled, axis=1, keepdims=True), 1e-12, None)
+
+
+def build_embedding_model(model_name: str, backend: str = "torch", num_threads: int = None, onnx_dir: str = "models/onnx"):
+    """Returns a LangChain Embeddings object for the requested backend."""
+    if backend not in EMBEDDING_BACKENDS:
+        raise ValueError(f"Unknown embedding backend '{backend}'. Expected one of {EMBEDDING_BACKENDS}.")
+    if backend.startswith("onnx"):
+        return OnnxEmbeddings(model_name, quantize=backend == "onnx-int8", num_threads=num_threads, onnx_dir=onnx_dir)
+
+    import torch
+    from langchain_community.embeddings import HuggingFaceEmbeddings
+
+    if num_threads:
+        torch.set_num_threads(num_threads)
+    embeddings = HuggingFaceEmbeddings(model_name=model_name, model_kwargs={"device": "cpu"})
+    if backend == "torch-int8":
+        transformer = embeddings.client[0]
+        transformer.auto_model = torch.ao.quantization.quantize_dynamic(
+            transformer.auto_model, {torch.nn.Linear}, dtype=torch.qint8
+        )
+        logging.info(f"[Embeddings] Quantized {model_name} Linear layers to int8.")
+    return embeddings
+
+
+class OnnxEmbeddings:
+    """Runs a sentence-transformers encoder through ONNX Runtime. Implements the LangChain Embeddings interface."""
+
+    def __init__(self, model_name: str, quantize: bool = False, num_threads: int = None, onnx_dir: str = "models/onnx",
+                 batch_size: int = 64, max_seq_length: int = 256):
+        import onnxruntime
+        from transformers import AutoTokenizer
+
+        self.model_name = model_name
+        self.batch_size = batch_size
+        self.max_seq_length = max_seq_length
+        export_dir = os.path.join(onnx_dir, model_name.replace("/", "__"))
+        model_path = export_onnx_model(model_name, export_dir)
+        if quantize:
+            model_path = quantize_onnx_model(model_path)
+
+        self.tokenizer = AutoTokenizer.from_pretrained(export_dir)
+        options = onnxruntime.SessionOptions()
+        options.graph_optimization_level = onnxruntime.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if num_threads:
+            options.intra_op_num_threads = num_threads
+        self.session = onnxruntime.InferenceSession(model_path, options, providers=["CPUExecutionProvider"])
+        self.input_names = {i.name for i in self.session.get_inputs()}
+        logging.info(f"[Embeddings] Loaded ONNX model {model_path} (threads={num_threads or 'default'}).")
+
+    def _embed(self, texts: List[str]) -> np.ndarray:
+        if not texts:
+            return np.empty((0, 0), dtype=np.float32)
+        # Batch texts of similar length together to keep padding short
+        order = sorted(range(len(texts)), key=lambda i: len(texts[i]))
+        vectors = [None] * len(texts)
+        for start in range(0, len(order), self.batch_size):
+            batch = order[start:start + self.batch_size]
+            encoded = self.tokenizer(
+                [texts[i] for i in batch], padding=True, truncation=True,
+                max_length=self.max_seq_length, return_tensors="np",
+            )
+            inputs = {name: encoded[name].astype(np.int64) for name in self.input_names if name in encoded}
+            last_hidden_state = self.session.run(None, inputs)[0]
+            for i, vector in zip(batch, mean_pool(last_hidden_state, encoded["attention_mask"])):
+                vectors[i] = vector
+        return np.stack(vectors)
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self._embed(list(texts)).tolist()
+
+    def embed_query(self, text: str) -> List[float]:
+        return self._embed([text])[0].tolist()
+
+
+class PrecomputedEmbeddings:
+    """Embeddings stand-in for clients that only write stored vectors (add_embedded_documents), so no model is loaded."""
+
+    def __init__(self, model_name: str):
+        self.model_name = model_name
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        raise RuntimeError(f"No '{self.model_name}' model is loaded, only precomputed embeddings can be written.")
+
+    def embed_query(self, text: str) -> List[float]:
+        raise RuntimeError(f"No '{self.model_name}' model is loaded, only precomputed embeddings can be written.")
+
+
+class InstrumentedEmbeddings:
+    """Delegates to a LangChain Embeddings object and records the time of every call (EMBEDDING_SECONDS)."""
+
+    def __init__(self, model):
+        self.model = model
+        self._documents_seconds = EMBEDDING_SECONDS.labels(op="documents")
+        self._query_seconds = EMBEDDING_SECONDS.labels(op="query")
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        with tracing.span("embedding.documents", texts=len(texts)), self._documents_seconds.time():
+            return self.model.embed_documents(texts)
+
+    def embed_query(self, text: str) -> List[float]:
+        start = time.perf_counter()
+        try:
+            with tracing.span("embedding.query"):
+                return self.model.embed_query(text)
+        finally:
+            elapsed = time.perf_counter() - start
+            self._query_seconds.observe(elapsed)
+            QUERY_EMBEDDING_TIMER.add(elapsed)
+
+    def __getattr__(self, name):
+        if name == "model":
+            raise AttributeError(name)
+        return getattr(self.model, name)
+
+
+def export_onnx_model(model_name: str, export_dir: str) -> str:
+    """Exports the transformer to export_dir/model.onnx (once) and saves its tokenizer next to it."""
+    model_path = os.path.join(export_dir, "model.onnx")
+    # The tokenizer is saved before model.onnx is renamed into place, so a complete export has both
+    if os.path.exists(model_path) and os.path.exists(os.path.join(export_dir, "tokenizer_config.json")):
+        return model_path
+
+    import torch
+    from transformers import AutoModel, AutoTokenizer
+
+    logging.info(f"[Embeddings] Exporting {model_name} to ONNX at {model_path}...")
+    os.makedirs(export_dir, exist_ok=True)
+    tokenizer = AutoTokenizer.from_pretrained(model_name)
+    model = AutoModel.from_pretrained(model_name).eval()
+    sample = tokenizer(["export sample"], return_tensors="pt")
+    input_names = [name for name in ("input_ids", "attention_mask", "token_type_ids") if name in sample]
+    dynamic_axes = {name: {0: "batch", 1: "sequence"} for name in input_names}
+    dynamic_axes["last_hidden_state"] = {0: "batch", 1: "sequence"}
+    with torch.no_grad():
+        torch.onnx.export(
+            model, tuple(sample[name] for name in input_names), model_path + ".tmp",
+            input_names=input_names, output_names=["last_hidden_state"],
+            dynamic_axes=dynamic_axes, opset_version=17,
+        )
+    tokenizer.save_pretrained(export_dir)
+    os.replace(model_path + ".tmp", model_path)
+    return model_path
+
+
+def quantize_onnx_model(model_path: str) -> str:
+    """Writes a dynamically int8-quantized copy of the ONNX model (once) and returns its path."""
+    quantized_path = model_path.replace(".onnx", ".int8.onnx")
+    if not os.path.exists(quantized_path):
+        from onnxruntime.quantization import QuantType, quantize_dynamic
+
+        logging.info(f"[Embeddings] Quantizing {model_path} to int8...")
+        quantize_dynamic(model_path, quantized_path + ".tmp", weight_type=QuantType.QInt8)
+        os.replace(quantized_path + ".tmp", quantized_path)
+    return quantized_path
@@ -0,0 +1,56 @@
+# indexing_and_embedding/embeddings_test.py
+import numpy as np
+import pytest
+from unittest.mock import MagicMock, patch
+
+from indexing_and_embedding.embeddings import build_embedding_model, export_onnx_model, mean_pool
+
+
+def test_mean_pool_ignores_padding_and_normalizes():
+    hidden = np.array([[[1.0, 0.0], [3.0, 0.0], [100.0, 100.0]]], dtype=np.float32)
+    mask = np.array([[1, 1, 0]])
+
+    pooled = mean_pool(hidden, mask)
+
+    np.testing.assert_allclose(pooled, [[1.0, 0.0]])
+
+
+def test_unknown_backend_raises():
+    with pytest.raises(ValueError):
+        build_embedding_model("sentence-transformers/all-MiniLM-L6-v2", backend="tensorrt")
+
+
+def test_onnx_backend_builds_onnx_embeddings():
+    with patch("indexing_and_embedding.embeddings.OnnxEmbeddings") as MockOnnx:
+        model = build_embedding_model("some/model", backend="onnx-int8", num_threads=4)
+
+        MockOnnx.assert_called_once_with("some/model", quantize=True, num_threads=4, onnx_dir="models/onnx")
+        assert model == MockOnnx.return_value
+
+
+def test_torch_int8_quantizes_linear_layers():
+    fake_torch = MagicMock()
+    fake_langchain = MagicMock()
+    with patch.dict("sys.modules", {"torch": fake_torch, "langchain_community.embeddings": fake_langchain}):
+        model = build_embedding_model("some/model", backend="torch-int8", num_threads=2)
+
+    fake_torch.set_num_threads.assert_called_once_with(2)
+    transformer = fake_langchain.HuggingFaceEmbeddings.return_value.client[0]
+    assert transformer.auto_model == fake_torch.ao.quantization.quantize_dynamic.return_value
+    assert model == fake_langchain.HuggingFaceEmbeddings.return_value
+
+
+def test_onnx_export_without_tokenizer_is_redone(tmp_path):
+    (tmp_path / "model.onnx").write_bytes(b"interrupted before the tokenizer was saved")
+    fake_torch, fake_transformers = MagicMock(), MagicMock()
+    tokenizer = fake_transformers.AutoTokenizer.from_pretrained.return_value
+    tokenizer.return_value = {"input_ids": MagicMock(), "attention_mask": MagicMock()}
+    tokenizer.save_pretrained.side_effect = lambda path: (tmp_path / "tokenizer_config.json").write_text("{}")
+    fake_torch.onnx.export.side_effect = lambda *args, **kwargs: open(args[2], "wb").close()
+
+    with patch.dict("sys.modules", {"torch": fake_torch, "transformers": fake_transformers}):
+        model_path = export_onnx_model("some/model", str(tmp_path))
+        assert export_onnx_model("some/model", str(tmp_path)) == model_path
+
+    fake_torch.onnx.export.assert_called_once()
+    assert (tmp_path / "model.onnx").read_bytes() == b""
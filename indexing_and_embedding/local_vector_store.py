@@ -0,0 +1,60 @@
+"""
+LangChain VectorStore over the embedded `LocalANNIndex`, so ChromaClient can swap it in for the Chroma HTTP
+wrapper without changing add_documents / get_user_retriever callers.
+"""
+
+import uuid
+from typing import Any, Iterable, List, Optional, Tuple
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+from langchain_core.vectorstores import VectorStore
+from indexing_and_embedding.ann_index import LocalANNIndex
+
+
+class LocalVectorStore(VectorStore):
+    def __init__(self, index: LocalANNIndex, embedding_function: Embeddings):
+        self.index = index
+        self.embedding_function = embedding_function
+
+    @property
+    def embeddings(self) -> Embeddings:
+        return self.embedding_function
+
+    def add_texts(self, texts: Iterable[str], metadatas: Optional[List[dict]] = None, ids: Optional[List[str]] = None, **kwargs: Any) -> List[str]:
+        texts = list(texts)
+        if not texts:
+            return []
+        vectors = self.embedding_function.embed_documents(texts)
+        return self.add_embeddings(texts, vectors, metadatas, ids)
+
+    def add_embeddings(self, texts: List[str], embeddings, metadatas: Optional[List[dict]] = None, ids: Optional[List[str]] = None) -> List[str]:
+        """Adds pre-computed vectors (no call to the embedder)."""
+        ids = list(ids) if ids else [str(uuid.uuid4()) for _ in texts]
+        metadatas = list(metadatas) if metadatas else [{} for _ in texts]
+        self.index.add(ids, embeddings, texts, metadatas)
+        return ids
+
+    def similarity_search_with_score(self, query: str, k: int = 4, filter: Optional[dict] = None, **kwargs: Any) -> List[Tuple[Document, float]]:
+        return self.similarity_search_by_vector_with_score(self.embedding_function.embed_query(query), k, filter)
+
+    def similarity_search_by_vector_with_score(self, embedding: List[float], k: int = 4, filter: Optional[dict] = None) -> List[Tuple[Document, float]]:
+        return [
+            (Document(page_content=text, metadata=metadata, id=chunk_id), score)
+            for chunk_id, text, metadata, score in self.index.search(embedding, k=k, where=filter)
+        ]
+
+    def similarity_search(self, query: str, k: int = 4, filter: Optional[dict] = None, **kwargs: Any) -> List[Document]:
+        return [doc for doc, _ in self.similarity_search_with_score(query, k, filter)]
+
+    def similarity_search_by_vector(self, embedding: List[float], k: int = 4, filter: Optional[dict] = None, **kwargs: Any) -> List[Document]:
+        return [doc for doc, _ in self.similarity_search_by_vector_with_score(embedding, k, filter)]
+
+    def _select_relevance_score_fn(self):
+        # Scores are cosine similarity in [-1, 1]
+        return lambda score: (score + 1.0) / 2.0
+
+    @classmethod
+    def from_texts(cls, texts: List[str], embedding: Embeddings, metadatas: Optional[List[dict]] = None, path: str = "local_vector_store", **kwargs: Any) -> "LocalVectorStore":
+        store = cls(LocalANNIndex(path, **kwargs), embedding)
+        store.add_texts(texts, metadatas)
+        return store
@@ -0,0 +1,105 @@
+"""
+Which embedding model (and collection) serves queries, kept in Redis so every process agrees on it.
+
+Collections written for a model other than the original one are tagged with the model (`<base>__m_<model tag>`).
+Replacing a model goes through a shadow migration:
+1. `start_migration` registers the new model's collection as the shadow, and consumers double-write new chunks to it;
+2. a re-embedding job (scripts/reembed_to_shadow.py) backfills the shadow from stored chunk text;
+3. `cutover` swaps shadow -> active in one Lua call.
+Every change bumps a generation counter that consumers and Lookup poll to pick up the new model without a restart.
+"""
+
+import json
+import time
+import logging
+import redis
+from indexing_and_embedding.partitioning import sanitize_name
+
+ACTIVE_KEY = "embedding_model:active"
+SHADOW_KEY = "embedding_model:shadow"
+GENERATION_KEY = "embedding_model:generation"
+PROGRESS_KEY = "embedding_model:migration_progress"
+
+# Promote the shadow only if there is one, and bump the generation in the same step
+_CUTOVER = """
+local shadow = redis.call('get', KEYS[2])
+if not shadow then
+    return false
+end
+redis.call('set', KEYS[1], shadow)
+redis.call('del', KEYS[2])
+redis.call('incr', KEYS[3])
+return shadow
+"""
+
+
+def model_tag(model_name: str) -> str:
+    return sanitize_name(model_name)
+
+
+def collection_for_model(base_collection_name: str, model_name: str) -> str:
+    return f"{base_collection_name}__m_{model_tag(model_name)}"
+
+
+class ModelRegistry:
+    def __init__(self, redis_client: redis.Redis, default_model: str, default_collection: str = "all_users_docs"):
+        self.redis_client = redis_client
+        # Deployments that never migrated keep serving the untagged collection with the configured model
+        self.default = {"model": default_model, "collection": default_collection}
+        self._cutover = redis_client.register_script(_CUTOVER)
+
+    def active(self) -> dict:
+        value = self.redis_client.get(ACTIVE_KEY)
+        return json.loads(value) if value else dict(self.default)
+
+    def active_or_default(self) -> dict:
+        """active(), falling back to the configured model when Redis is unreachable (lookups keep working)."""
+        try:
+            return self.active()
+        except redis.exceptions.ConnectionError as e:
+            logging.warning(f"[ModelRegistry] Redis unavailable, using configured model '{self.default['model']}': {e}")
+            return dict(self.default)
+
+    def shadow(self):
+        value = self.redis_client.get(SHADOW_KEY)
+        return json.loads(value) if value else None
+
+    def generation(self) -> int:
+        return int(self.redis_client.get(GENERATION_KEY) or 0)
+
+    def start_migration(self, model_name: str, base_collection_name: str = None) -> dict:
+        """Registers model_name's collection as the shadow. Consumers start double-writing on their next poll."""
+        active = self.active()
+        if model_name == active["model"]:
+            raise ValueError(f"'{model_name}' is already the active embedding model.")
+        shadow = self.shadow()
+        if shadow is not None and shadow["model"] != model_name:
+            raise ValueError(f"A migration to '{shadow['model']}' is already in progress, abort it first.")
+        target = {"model": model_name, "collection": collection_for_model(base_collection_name or self.default["collection"], model_name)}
+        self.redis_client.set(SHADOW_KEY, json.dumps(target))
+        self.redis_client.delete(PROGRESS_KEY)
+        self.update_progress(status="started", started_at=time.time(), model=model_name, collection=target["collection"])
+        self.redis_client.incr(GENERATION_KEY)
+        logging.info(f"[ModelRegistry] Shadow migration to '{model_name}' into '{target['collection']}' started.")
+        return target
+
+    def cutover(self) -> dict:
+        """Atomically makes the shadow the active model. Returns the new active entry."""
+        promoted = self._cutover(keys=[ACTIVE_KEY, SHADOW_KEY, GENERATION_KEY])
+        if not promoted:
+            raise ValueError("No shadow migration to cut over to.")
+        self.update_progress(status="cut_over", finished_at=time.time())
+        active = json.loads(promoted)
+        logging.info(f"[ModelRegistry] Cut over to '{active['model']}' ('{active['collection']}').")
+        return active
+
+    def abort(self):
+        self.redis_client.delete(SHADOW_KEY)
+        self.update_progress(status="aborted", finished_at=time.time())
+        self.redis_client.incr(GENERATION_KEY)
+
+    def update_progress(self, **fields):
+        self.redis_client.hset(PROGRESS_KEY, mapping={k: str(v) for k, v in fields.items()})
+
+    def progress(self) -> dict:
+        return self.redis_client.hgetall(PROGRESS_KEY)
@@ -0,0 +1,84 @@
+# indexing_and_embedding/model_registry_test.py
+import json
+import pytest
+
+from indexing_and_embedding.model_registry import ModelRegistry, collection_for_model
+
+
+class FakeRedis:
+    """Just enough of redis for ModelRegistry: strings, counters, one hash and the cutover script."""
+
+    def __init__(self):
+        self.strings = {}
+        self.hashes = {}
+
+    def get(self, key):
+        return self.strings.get(key)
+
+    def set(self, key, value):
+        self.strings[key] = value
+
+    def delete(self, key):
+        self.strings.pop(key, None)
+        self.hashes.pop(key, None)
+
+    def incr(self, key):
+        self.strings[key] = str(int(self.strings.get(key, 0)) + 1)
+
+    def hset(self, key, mapping):
+        self.hashes.setdefault(key, {}).update(mapping)
+
+    def hgetall(self, key):
+        return dict(self.hashes.get(key, {}))
+
+    def register_script(self, source):
+        def cutover(keys, args=()):
+            shadow = self.strings.pop(keys[1], None)
+            if shadow is None:
+                return None
+            self.strings[keys[0]] = shadow
+            self.incr(keys[2])
+            return shadow
+        return cutover
+
+
+def test_defaults_to_the_configured_model_and_legacy_collection():
+    registry = ModelRegistry(FakeRedis(), "model-a", "docs")
+    assert registry.active() == {"model": "model-a", "collection": "docs"}
+    assert registry.shadow() is None
+    assert registry.generation() == 0
+
+
+def test_migration_and_cutover():
+    registry = ModelRegistry(FakeRedis(), "model-a", "docs")
+    shadow = registry.start_migration("org/model-b")
+    assert shadow == {"model": "org/model-b", "collection": collection_for_model("docs", "org/model-b")}
+    assert registry.shadow() == shadow
+    assert registry.progress()["status"] == "started"
+    assert registry.generation() == 1
+
+    assert registry.cutover() == shadow
+    assert registry.active() == shadow
+    assert registry.shadow() is None
+    assert registry.generation() == 2
+    assert registry.progress()["status"] == "cut_over"
+
+
+def test_conflicting_migrations_are_rejected():
+    registry = ModelRegistry(FakeRedis(), "model-a", "docs")
+    with pytest.raises(ValueError):
+        registry.start_migration("model-a")
+    registry.start_migration("model-b")
+    with pytest.raises(ValueError):
+        registry.start_migration("model-c")
+    registry.abort()
+    assert registry.shadow() is None
+    with pytest.raises(ValueError):
+        registry.cutover()
+
+
+def test_tagged_collection_names_are_valid():
+    name = collection_for_model("all_users_docs", "sentence-transformers/all-MiniLM-L6-v2")
+    assert name.startswith("all_users_docs__m_sentence-transformers-all-MiniLM-L6-v2")
+    assert "/" not in name
+    assert json.loads(json.dumps(name)) == name
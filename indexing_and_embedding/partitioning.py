@@ -0,0 +1,72 @@
+"""
+Maps users to Chroma collections. In the default "shared" mode every user lives in one collection and
+queries are filtered by user_id. The "per_user" and "hashed" modes give each user (or each hashed shard of
+users) its own collection so a query only scans the documents that can actually match.
+"""
+
+import re
+import zlib
+import hashlib
+
+PARTITION_MODES = ("shared", "per_user", "hashed")
+
+# Chroma collection names: 3-512 chars of [a-zA-Z0-9._-], starting and ending with an alphanumeric.
+_INVALID_NAME_CHARS = re.compile(r"[^a-zA-Z0-9._-]")
+
+
+def stable_hash(value: str) -> int:
+    """Process independent hash (python's hash() is salted per interpreter)."""
+    return zlib.crc32(value.encode("utf-8"))
+
+
+def sanitize_name(user_id: str) -> str:
+    """Makes a user id safe for collection and directory names without letting two ids collide."""
+    cleaned = _INVALID_NAME_CHARS.sub("-", user_id).strip("-._")
+    if cleaned != user_id or not cleaned:
+        # Different raw ids can sanitize to the same string, so disambiguate with a short digest.
+        digest = hashlib.sha1(user_id.encode("utf-8")).hexdigest()[:8]
+        cleaned = f"{cleaned}-{digest}" if cleaned else digest
+    return cleaned
+
+
+class CollectionPartitioner:
+    """Chooses the collection a user's documents are written to and read from."""
+
+    def __init__(self, base_collection_name: str, mode: str = "shared", num_shards: int = 16):
+        if mode not in PARTITION_MODES:
+            raise ValueError(f"Unknown partition mode '{mode}'. Expected one of {PARTITION_MODES}.")
+        if mode == "hashed" and num_shards < 1:
+            raise ValueError("num_shards must be at least 1 for hashed partitioning.")
+        self.base_collection_name = base_collection_name
+        self.mode = mode
+        self.num_shards = num_shards
+
+    def shard_for_user(self, user_id: str) -> int:
+        return stable_hash(user_id) % self.num_shards
+
+    def collection_for_user(self, user_id: str) -> str:
+        if self.mode == "shared":
+            return self.base_collection_name
+        if self.mode == "hashed":
+            return f"{self.base_collection_name}__shard_{self.shard_for_user(user_id):03d}"
+        return f"{self.base_collection_name}__user_{sanitize_name(user_id)}"
+
+    def needs_user_filter(self) -> bool:
+        """A per-user collection only holds that user's documents, so the metadata filter can be dropped."""
+        return self.mode != "per_user"
+
+    def all_collections(self, user_ids=None):
+        """Every collection this layout can write to (per_user needs the list of known users)."""
+        if self.mode == "shared":
+            return [self.base_collection_name]
+        if self.mode == "hashed":
+            return [f"{self.base_collection_name}__shard_{i:03d}" for i in range(self.num_shards)]
+        return sorted({self.collection_for_user(user_id) for user_id in (user_ids or [])})
+
+    def group_by_collection(self, docs):
+        """Groups LangChain documents by their target collection, preserving order inside each group."""
+        groups = {}
+        for doc in docs:
+            user_id = doc.metadata.get("user_id", "unknown_user")
+            groups.setdefault(self.collection_for_user(user_id), []).append(doc)
+        return groups
@@ -0,0 +1,44 @@
+# indexing_and_embedding/partitioning_test.py
+import pytest
+from unittest.mock import MagicMock
+
+from indexing_and_embedding.partitioning import CollectionPartitioner
+
+
+def test_shared_mode_uses_base_collection():
+    partitioner = CollectionPartitioner("all_users_docs")
+    assert partitioner.collection_for_user("user_a") == "all_users_docs"
+    assert partitioner.needs_user_filter()
+
+
+def test_per_user_mode_sanitizes_names():
+    partitioner = CollectionPartitioner("docs", mode="per_user")
+    assert partitioner.collection_for_user("user_a") == "docs__user_user_a"
+
+    # Ids with characters Chroma rejects get a digest so they cannot collide after cleaning
+    weird_a = partitioner.collection_for_user("a/b")
+    weird_b = partitioner.collection_for_user("a b")
+    assert weird_a != weird_b
+    assert weird_a.startswith("docs__user_a-b-")
+    assert not partitioner.needs_user_filter()
+
+
+def test_hashed_mode_is_stable_and_bounded():
+    partitioner = CollectionPartitioner("docs", mode="hashed", num_shards=4)
+    names = {partitioner.collection_for_user(f"user_{i}") for i in range(100)}
+    assert names <= set(partitioner.all_collections())
+    assert partitioner.collection_for_user("user_a") == CollectionPartitioner(
+        "docs", mode="hashed", num_shards=4).collection_for_user("user_a")
+
+
+def test_group_by_collection():
+    partitioner = CollectionPartitioner("docs", mode="per_user")
+    doc_a = MagicMock(metadata={"user_id": "user_a"})
+    doc_b = MagicMock(metadata={"user_id": "user_b"})
+    groups = partitioner.group_by_collection([doc_a, doc_b, doc_a])
+    assert groups == {"docs__user_user_a": [doc_a, doc_a], "docs__user_user_b": [doc_b]}
+
+
+def test_invalid_mode_raises():
+    with pytest.raises(ValueError):
+        CollectionPartitioner("docs", mode="random")
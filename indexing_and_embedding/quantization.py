@@ -0,0 +1,123 @@
+"""
+Vector codecs for the embedded index's sealed segments.
+
+    none    : float32, 4 bytes / dimension (1536 bytes per 384-d MiniLM vector)
+    float16 : 2 bytes / dimension
+    int8    : 1 byte / dimension, per-dimension min/max scalar quantization fitted per segment
+
+Scores are computed directly over the codes (the query is folded into the int8 scale and offset) so a
+search never decodes a whole segment back to float32.
+"""
+
+import os
+import json
+import numpy as np
+
+QUANTIZATION_MODES = ("none", "float16", "int8")
+CODEC_FILE = "codec.json"
+
+# Rows converted to float32 at a time while scoring, bounds the temporary memory of a full scan
+SCORE_BLOCK_ROWS = 65536
+
+
+class VectorCodec:
+    """Base class: encode vectors into codes and score codes against a query."""
+
+    name = None
+    dtype = None
+
+    def encode(self, vectors: np.ndarray) -> np.ndarray:
+        raise NotImplementedError("Subclasses should implement this method.")
+
+    def prepare_query(self, query: np.ndarray):
+        """Returns (weights, bias) so that score = codes @ weights + bias."""
+        return query.astype(np.float32), 0.0
+
+    def score(self, codes: np.ndarray, prepared) -> np.ndarray:
+        weights, bias = prepared
+        scores = np.empty(len(codes), dtype=np.float32)
+        for start in range(0, len(codes), SCORE_BLOCK_ROWS):
+            block = np.asarray(codes[start:start + SCORE_BLOCK_ROWS], dtype=np.float32)
+            scores[start:start + SCORE_BLOCK_ROWS] = block @ weights
+        return scores + bias
+
+    def save(self, path: str):
+        with open(os.path.join(path, CODEC_FILE), "w") as f:
+            json.dump({"name": self.name}, f)
+
+    def bytes_per_vector(self, dim: int) -> int:
+        return dim * np.dtype(self.dtype).itemsize
+
+
+class Float32Codec(VectorCodec):
+    name = "none"
+    dtype = np.float32
+
+    def encode(self, vectors):
+        return np.ascontiguousarray(vectors, dtype=np.float32)
+
+
+class Float16Codec(VectorCodec):
+    name = "float16"
+    dtype = np.float16
+
+    def encode(self, vectors):
+        return np.ascontiguousarray(vectors, dtype=np.float16)
+
+
+class Int8Codec(VectorCodec):
+    name = "int8"
+    dtype = np.int8
+
+    def __init__(self, minimum: np.ndarray, scale: np.ndarray):
+        self.minimum = minimum.astype(np.float32)
+        self.scale = scale.astype(np.float32)
+
+    @classmethod
+    def fit(cls, vectors: np.ndarray):
+        minimum = vectors.min(axis=0)
+        scale = (vectors.max(axis=0) - minimum) / 255.0
+        scale[scale == 0] = 1.0
+        return cls(minimum, scale)
+
+    def encode(self, vectors):
+        codes = np.rint((vectors - self.minimum) / self.scale) - 128
+        return np.clip(codes, -128, 127).astype(np.int8)
+
+    def decode(self, codes):
+        return (codes.astype(np.float32) + 128) * self.scale + self.minimum
+
+    def prepare_query(self, query):
+        # q . ((c + 128) * scale + min) == c . (q * scale) + q . (128 * scale + min)
+        weights = (query * self.scale).astype(np.float32)
+        bias = float(query @ (128 * self.scale + self.minimum))
+        return weights, bias
+
+    def save(self, path):
+        super().save(path)
+        np.save(os.path.join(path, "quant_params.npy"), np.stack([self.minimum, self.scale]))
+
+
+def fit_codec(mode: str, vectors: np.ndarray) -> VectorCodec:
+    if mode not in QUANTIZATION_MODES:
+        raise ValueError(f"Unknown quantization '{mode}'. Expected one of {QUANTIZATION_MODES}.")
+    if mode == "int8":
+        return Int8Codec.fit(vectors)
+    if mode == "float16":
+        return Float16Codec()
+    return Float32Codec()
+
+
+def load_codec(path: str) -> VectorCodec:
+    codec_path = os.path.join(path, CODEC_FILE)
+    if not os.path.exists(codec_path):
+        # Segments written before quantization existed are plain float32
+        return Float32Codec()
+    with open(codec_path) as f:
+        name = json.load(f)["name"]
+    if name == "int8":
+        minimum, scale = np.load(os.path.join(path, "quant_params.npy"))
+        return Int8Codec(minimum, scale)
+    if name == "float16":
+        return Float16Codec()
+    return Float32Codec()
@@ -0,0 +1,57 @@
+# indexing_and_embedding/quantization_test.py
+import numpy as np
+import pytest
+
+from indexing_and_embedding.ann_index import LocalANNIndex, normalize
+from indexing_and_embedding.quantization import Int8Codec, fit_codec, load_codec
+
+
+def _unit_vectors(n, dim=32, seed=0):
+    return normalize(np.random.default_rng(seed).standard_normal((n, dim)))
+
+
+def test_int8_scores_match_float32():
+    vectors = _unit_vectors(500)
+    query = _unit_vectors(1, seed=1)[0]
+    codec = Int8Codec.fit(vectors)
+
+    scores = codec.score(codec.encode(vectors), codec.prepare_query(query))
+
+    np.testing.assert_allclose(scores, vectors @ query, atol=0.02)
+    np.testing.assert_allclose(codec.decode(codec.encode(vectors)), vectors, atol=codec.scale.max())
+
+
+def test_float16_codec_halves_storage():
+    vectors = _unit_vectors(10)
+    codec = fit_codec("float16", vectors)
+    assert codec.encode(vectors).nbytes == vectors.nbytes // 2
+    assert codec.bytes_per_vector(384) == 768
+
+
+def test_codec_round_trips_through_disk(tmp_path):
+    codec = Int8Codec.fit(_unit_vectors(100))
+    codec.save(str(tmp_path))
+    loaded = load_codec(str(tmp_path))
+    np.testing.assert_array_equal(loaded.scale, codec.scale)
+    np.testing.assert_array_equal(loaded.minimum, codec.minimum)
+
+
+def test_unknown_mode_raises():
+    with pytest.raises(ValueError):
+        fit_codec("int4", _unit_vectors(2))
+
+
+@pytest.mark.parametrize("quantization", ["float16", "int8"])
+def test_quantized_index_recall(tmp_path, quantization):
+    vectors = _unit_vectors(1000)
+    queries = _unit_vectors(30, seed=2)
+    index = LocalANNIndex(str(tmp_path / quantization), segment_size=1000, quantization=quantization, rescore_factor=4)
+    index.add([f"id-{i}" for i in range(1000)], vectors, [""] * 1000, [{}] * 1000)
+
+    hits = 0
+    for query in queries:
+        expected = {f"id-{i}" for i in np.argsort(-(vectors @ query))[:5]}
+        hits += len(expected & {r[0] for r in index.search(query, k=5)})
+
+    assert hits / (5 * len(queries)) > 0.95
+    assert index.memory_bytes() < vectors.nbytes
@@ -0,0 +1,91 @@
+"""
+Background re-embedding of stored chunk text into the shadow collection of a model migration (see model_registry.py).
+
+Sources are the embedding archives of the active model. Consumers double-write chunks that arrive during the
+migration, so the job makes a backfill pass over what was stored when it started, then a catch-up pass over rows
+added before every consumer noticed the migration. Archives are append-only, so the rows past a source's length at
+the start are exactly the new ones (a Chroma collection gives no such guarantee: `get` pages are not in insertion
+order and upserts of existing ids do not change `count()`). Chunk ids are kept, so rows that are both double-written
+and backfilled are upserted once.
+"""
+
+import time
+import logging
+import numpy as np
+from langchain_core.documents import Document
+
+
+class ShadowReembedder:
+    def __init__(self, registry, open_sources, shadow_client, shadow_archive=None, max_chunks_per_sec: float = None,
+                 batch_size: int = 256, progress_interval_s: float = 5.0):
+        """open_sources() returns the current sources (objects with `path`, `len()` and `iter_batches(batch_size, start)`)."""
+        self.registry = registry
+        self.open_sources = open_sources
+        self.shadow_client = shadow_client
+        self.shadow_archive = shadow_archive
+        self.max_chunks_per_sec = max_chunks_per_sec
+        self.batch_size = batch_size
+        self.progress_interval_s = progress_interval_s
+        self.processed = 0
+        self._started = None
+        self._last_progress = 0.0
+
+    def run(self, grace_s: float = 30.0) -> int:
+        """Backfills every source, waits grace_s for consumers to start double-writing, then catches up. Returns the
+        number of chunks re-embedded."""
+        self._started = time.monotonic()
+        sources = self.open_sources()
+        # Rows beyond these counts were added after the backfill started
+        snapshot = {source.path: len(source) for source in sources}
+        self.registry.update_progress(status="backfilling", total=sum(snapshot.values()), processed=0)
+        for source in sources:
+            self._copy(source, 0, snapshot[source.path])
+
+        time.sleep(grace_s)
+        caught_up = {source.path: len(source) for source in self.open_sources()}
+        self.registry.update_progress(status="catching_up", total=self.processed + sum(
+            max(0, n - snapshot.get(path, 0)) for path, n in caught_up.items()))
+        for source in self.open_sources():
+            self._copy(source, snapshot.get(source.path, 0), caught_up.get(source.path, len(source)))
+
+        self.shadow_client.flush()
+        self._report(status="ready", force=True)
+        logging.info(f"[ShadowReembedder] Re-embedded {self.processed} chunks, shadow collection is ready for cutover.")
+        return self.processed
+
+    def _copy(self, source, start: int, stop: int):
+        remaining = stop - start
+        if remaining <= 0:
+            return
+        for ids, texts, metadatas, _ in source.iter_batches(self.batch_size, start):
+            ids, texts, metadatas = ids[:remaining], texts[:remaining], metadatas[:remaining]
+            docs = [Document(page_content=text, metadata=metadata) for text, metadata in zip(texts, metadatas)]
+            embeddings = np.asarray(self.shadow_client.instrumented_embeddings.embed_documents(texts), dtype=np.float32)
+            self.shadow_client.add_embedded_documents(docs, embeddings, ids)
+            if self.shadow_archive is not None:
+                self.shadow_archive.append(ids, texts, metadatas, embeddings)
+            self.processed += len(ids)
+            remaining -= len(ids)
+            self._throttle()
+            self._report(status=None)
+            if remaining <= 0:
+                return
+
+    def _throttle(self):
+        # Keeps the average rate under max_chunks_per_sec so live ingestion and queries keep their CPU / DB share
+        if self.max_chunks_per_sec:
+            ahead = self.processed / self.max_chunks_per_sec - (time.monotonic() - self._started)
+            if ahead > 0:
+                time.sleep(ahead)
+
+    def _report(self, status=None, force=False):
+        now = time.monotonic()
+        if not force and now - self._last_progress < self.progress_interval_s:
+            return
+        self._last_progress = now
+        rate = self.processed / max(now - self._started, 1e-9)
+        fields = {"processed": self.processed, "chunks_per_sec": round(rate, 1), "updated_at": time.time()}
+        if status:
+            fields["status"] = status
+        self.registry.update_progress(**fields)
+        logging.info(f"[ShadowReembedder] {self.processed} chunks re-embedded ({rate:.0f} chunks/s).")
@@ -0,0 +1,55 @@
+# indexing_and_embedding/reembedding_test.py
+from types import SimpleNamespace
+from unittest.mock import MagicMock, patch
+
+with patch.dict("sys.modules", {"langchain_core.documents": MagicMock(Document=SimpleNamespace)}):
+    from indexing_and_embedding.reembedding import ShadowReembedder
+
+
+class ListSource:
+    def __init__(self, path, rows):
+        self.path = path
+        self.rows = rows
+
+    def __len__(self):
+        return len(self.rows)
+
+    def iter_batches(self, batch_size=4096, start=0):
+        for i in range(start, len(self.rows), batch_size):
+            batch = self.rows[i:i + batch_size]
+            yield [r[0] for r in batch], [r[1] for r in batch], [{} for _ in batch], None
+
+
+def make_shadow_client():
+    client = MagicMock()
+    client.instrumented_embeddings.embed_documents.side_effect = lambda texts: [[1.0, 0.0]] * len(texts)
+    return client
+
+
+def test_backfill_then_catch_up_only_new_rows():
+    source = ListSource("worker-0", [(f"id_{i}", f"text {i}") for i in range(5)])
+    registry = MagicMock()
+    shadow_client = make_shadow_client()
+    reembedder = ShadowReembedder(registry, lambda: [source], shadow_client, batch_size=2)
+
+    def grow(_):
+        # Rows archived while consumers had not noticed the migration yet
+        source.rows.append(("id_5", "text 5"))
+
+    with patch("indexing_and_embedding.reembedding.time.sleep", side_effect=grow):
+        assert reembedder.run(grace_s=1) == 6
+
+    written = [i for call in shadow_client.add_embedded_documents.call_args_list for i in call.args[2]]
+    assert written == [f"id_{i}" for i in range(6)]
+    shadow_client.flush.assert_called_once()
+    assert registry.update_progress.call_args.kwargs["status"] == "ready"
+
+
+def test_shadow_archive_receives_new_vectors():
+    source = ListSource("worker-0", [("id_0", "text 0")])
+    archive = MagicMock()
+    reembedder = ShadowReembedder(MagicMock(), lambda: [source], make_shadow_client(), archive)
+    reembedder.run(grace_s=0)
+    ids, texts, _, embeddings = archive.append.call_args.args
+    assert ids == ["id_0"] and texts == ["text 0"]
+    assert embeddings.tolist() == [[1.0, 0.0]]
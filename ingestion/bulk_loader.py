@@ -0,0 +1,250 @@
+"""
+Offline bulk backfill of a data directory straight into the vector store, bypassing the Redis stream.
+
+Files are chunked in a process pool and embedded in the main process in large batches. The vectors are written with
+bulk inserts (`ChromaClient.add_embedded_documents`). After every insert the loader records the finished files in:
+- a checkpoint file, so an interrupted load resumes where it stopped;
+- the `published_files` / `processed_files` Redis sets, so the live producer and consumer skip them afterwards.
+
+Files are recorded (chunk metadata, Redis sets, checkpoint) under the path the live producer uses,
+data/<user_id>/<path under the user directory>, and chunks carry the user_id of their directory, whatever --data-dir
+points at. Chunk ids are the consumer's `document_key` (file path and chunk text), so re-inserting a file after a
+crash, or re-ingesting it through the live pipeline, overwrites its chunks instead of duplicating them.
+
+uv run python ingestion/bulk_loader.py --data-dir data --workers 8
+"""
+
+import os
+import sys
+import json
+import time
+import logging
+import argparse
+import multiprocessing
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+import redis
+
+# To resolve import issue
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from indexing_and_embedding.bm25_index import document_key
+
+SKIP_DIR = "books"
+TEXT_EXTENSIONS = (".txt",)
+IMAGE_EXTENSIONS = (".png", ".jpg")
+CHECKPOINT_PATH = "bulk_load_checkpoint.jsonl"
+# Root of the paths the producer records (ingestion/producer.py reads data/<user_id>/)
+PRODUCER_DATA_DIR = "data"
+# Chunks embedded and inserted per bulk insert (always whole files)
+INSERT_BATCH_SIZE = 8192
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(processName)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+# Per worker process, created on first use so text-only loads never load the captioning model
+_processors = {}
+
+
+def producer_path(data_dir: str, user_id: str, file_path: str) -> str:
+    """The path the live producer records for file_path, found under data_dir/<user_id>/."""
+    return os.path.join(PRODUCER_DATA_DIR, user_id, os.path.relpath(file_path, os.path.join(data_dir, user_id)))
+
+
+def chunk_file(file_path: str):
+    """Runs in a pool worker: chunks one file with the same processors the producer uses."""
+    if file_path.endswith(TEXT_EXTENSIONS):
+        if "text" not in _processors:
+            from file_processors.text_file_processor import TextFileProcessor
+            _processors["text"] = TextFileProcessor()
+        return _processors["text"].process_files([file_path])
+    if "image" not in _processors:
+        from file_processors.image_file_processor import ImageFileProcessor
+        from file_processors.caption_cache import CaptionCache
+        _processors["image"] = ImageFileProcessor(caption_cache=CaptionCache())
+    return _processors["image"].process_files([file_path])
+
+
+def find_files(data_dir: str):
+    """Returns {user_id: [file paths]} for every supported file under data_dir/<user_id>/ (skipping SKIP_DIR)."""
+    files = {}
+    for user_id in sorted(os.listdir(data_dir)):
+        user_dir = os.path.join(data_dir, user_id)
+        if user_id == SKIP_DIR or not os.path.isdir(user_dir):
+            continue
+        for root, dirs, names in os.walk(user_dir):
+            dirs[:] = sorted(d for d in dirs if d != SKIP_DIR)
+            for name in sorted(names):
+                if name.endswith(TEXT_EXTENSIONS + IMAGE_EXTENSIONS):
+                    files.setdefault(user_id, []).append(os.path.join(root, name))
+    return files
+
+
+class Checkpoint:
+    """Append-only record of finished files."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.done = set()
+        if os.path.exists(path):
+            with open(path) as f:
+                for line in f:
+                    try:
+                        self.done.add(json.loads(line)["file_path"])
+                    except (ValueError, KeyError):
+                        break  # torn last line of an interrupted run
+
+    def record(self, file_chunks):
+        with open(self.path, "a") as f:
+            f.write("".join(json.dumps({"file_path": p, "chunks": n}) + "\n" for p, n in file_chunks))
+            f.flush()
+            os.fsync(f.fileno())
+        self.done.update(p for p, _ in file_chunks)
+
+
+class BulkLoader:
+    def __init__(self, chroma_client, redis_client, checkpoint: Checkpoint, bm25_store=None, archive=None,
+                 num_workers: int = 4, insert_batch_size: int = INSERT_BATCH_SIZE, chunker=chunk_file, data_dir: str = PRODUCER_DATA_DIR):
+        self.chroma_client = chroma_client
+        self.redis_client = redis_client
+        self.checkpoint = checkpoint
+        self.bm25_store = bm25_store
+        self.archive = archive
+        self.num_workers = num_workers
+        self.insert_batch_size = insert_batch_size
+        self.chunker = chunker
+        # Directory find_files was run on, file paths are recorded relative to it as the producer would see them
+        self.data_dir = data_dir
+        self.total_chunks = 0
+        self._docs, self._ids, self._files = [], [], []
+
+    def pending_files(self, files_by_user):
+        """Returns (user_id, file_path) pairs not in the checkpoint and not already published by the live producer."""
+        pending = []
+        for user_id, paths in files_by_user.items():
+            published = self.redis_client.smembers(f"published_files:{user_id}")
+            pending.extend((user_id, p) for p in paths
+                           if producer_path(self.data_dir, user_id, p) not in self.checkpoint.done
+                           and producer_path(self.data_dir, user_id, p) not in published)
+        return pending
+
+    def load(self, files):
+        """Loads (user_id, file_path) pairs and returns the number of chunks inserted."""
+        start = time.time()
+        if self.num_workers > 0:
+            with ProcessPoolExecutor(self.num_workers, mp_context=multiprocessing.get_context("spawn")) as pool:
+                # Bounded read-ahead: keep the pool busy while the main process embeds, without chunking everything up front
+                queue = iter(files)
+                in_flight = deque()
+                for user_id, file_path in queue:
+                    in_flight.append((user_id, file_path, pool.submit(self.chunker, file_path)))
+                    if len(in_flight) >= self.num_workers * 4:
+                        break
+                while in_flight:
+                    user_id, file_path, future = in_flight.popleft()
+                    next_file = next(queue, None)
+                    if next_file is not None:
+                        in_flight.append((*next_file, pool.submit(self.chunker, next_file[1])))
+                    try:
+                        chunks = future.result()
+                    except Exception as e:
+                        logger.error(f"[BulkLoader] Failed to chunk {file_path}: {e}")
+                        continue
+                    self._add_file(user_id, file_path, chunks)
+        else:
+            for user_id, file_path in files:
+                self._add_file(user_id, file_path, self.chunker(file_path))
+        self._insert()
+        self.chroma_client.flush()
+        if self.bm25_store is not None:
+            self.bm25_store.flush()
+        elapsed = time.time() - start
+        logger.info(f"[BulkLoader] Loaded {len(files)} files / {self.total_chunks} chunks in {elapsed:.1f}s "
+                    f"({self.total_chunks / max(elapsed, 1e-9):.0f} chunks/s).")
+        return self.total_chunks
+
+    def _add_file(self, user_id, file_path, chunks):
+        # The file processors parse user_id out of the path, which only works for a relative data/ directory
+        file_path = producer_path(self.data_dir, user_id, file_path)
+        for chunk in chunks:
+            chunk.metadata["total_chunks"] = len(chunks)
+            chunk.metadata["user_id"] = user_id
+            chunk.metadata["file_path"] = file_path
+            if "source" in chunk.metadata:
+                chunk.metadata["source"] = file_path
+            self._docs.append(chunk)
+            # Same ids as the consumer, the archive and the re-embedding / restore jobs
+            self._ids.append(document_key(chunk.page_content, chunk.metadata))
+        self._files.append((user_id, file_path, len(chunks)))
+        if len(self._docs) >= self.insert_batch_size:
+            self._insert()
+
+    def _insert(self):
+        if not self._files:
+            return
+        docs, ids, files = self._docs, self._ids, self._files
+        self._docs, self._ids, self._files = [], [], []
+        if docs:
+            start = time.time()
+            embeddings = self.chroma_client.instrumented_embeddings.embed_documents([d.page_content for d in docs])
+            embedded = time.time()
+            self.chroma_client.add_embedded_documents(docs, embeddings, ids)
+            if self.bm25_store is not None:
+                self.bm25_store.add_documents(docs)
+            if self.archive is not None:
+                self.archive.append(ids, [d.page_content for d in docs], [d.metadata for d in docs], embeddings)
+            logger.info(f"[BulkLoader] Inserted {len(docs)} chunks from {len(files)} files "
+                        f"(embed {embedded - start:.1f}s, insert {time.time() - embedded:.1f}s).")
+        # Same state the live pipeline leaves behind once a file is fully processed
+        pipeline = self.redis_client.pipeline(transaction=False)
+        for user_id, file_path, _ in files:
+            pipeline.sadd(f"published_files:{user_id}", file_path)
+            pipeline.sadd(f"processed_files:{user_id}", file_path)
+        pipeline.execute()
+        self.checkpoint.record([(file_path, n) for _, file_path, n in files])
+        self.total_chunks += len(docs)
+
+
+def main():
+    # Same vector store / BM25 settings as the live consumer, so the backfilled collections are the ones it serves
+    import ingestion.consumer as live
+    from indexing_and_embedding.bm25_index import BM25Store
+    from indexing_and_embedding.embedding_archive import EmbeddingArchive
+    from indexing_and_embedding.model_registry import ModelRegistry, model_tag
+
+    parser = argparse.ArgumentParser(description="Bulk-load a data directory into the vector store without Redis streams.")
+    parser.add_argument("--data-dir", default="data")
+    parser.add_argument("--users", nargs="*", help="Only load these users (default: every user directory).")
+    parser.add_argument("--workers", type=int, default=max(1, (os.cpu_count() or 2) - 1), help="Chunking processes (0 chunks inline).")
+    parser.add_argument("--insert-batch-size", type=int, default=INSERT_BATCH_SIZE)
+    parser.add_argument("--checkpoint", default=CHECKPOINT_PATH)
+    parser.add_argument("--restart", action="store_true", help="Ignore (and remove) an existing checkpoint.")
+    args = parser.parse_args()
+
+    if args.restart and os.path.exists(args.checkpoint):
+        os.remove(args.checkpoint)
+
+    redis_client = redis.Redis(host=live.REDIS_HOST, port=live.REDIS_PORT, decode_responses=True)
+    registry = ModelRegistry(redis_client, live.embedding_model, "all_users_docs")
+    if registry.shadow() is not None:
+        raise SystemExit("A model migration is in progress, finish or abort it before bulk loading.")
+    active = registry.active()
+    chroma_client = live.build_chroma_client(active["model"], active["collection"], batch_size=args.insert_batch_size)
+    bm25_store = BM25Store(live.BM25_INDEX_PATH) if live.ENABLE_BM25_INDEX else None
+    archive = EmbeddingArchive(
+        os.path.join(live.EMBEDDING_ARCHIVE_PATH, f"bulk-loader__{model_tag(active['model'])}"), model_name=active["model"]
+    ) if live.ENABLE_EMBEDDING_ARCHIVE else None
+
+    files_by_user = find_files(args.data_dir)
+    if args.users:
+        files_by_user = {u: files_by_user.get(u, []) for u in args.users}
+    loader = BulkLoader(chroma_client, redis_client, Checkpoint(args.checkpoint), bm25_store, archive,
+                        num_workers=args.workers, insert_batch_size=args.insert_batch_size, data_dir=args.data_dir)
+    files = loader.pending_files(files_by_user)
+    logger.info(f"[BulkLoader] {len(files)} files to load ({len(loader.checkpoint.done)} already in checkpoint).")
+    loader.load(files)
+
+
+if __name__ == "__main__":
+    main()
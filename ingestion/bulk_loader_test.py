@@ -0,0 +1,81 @@
+# ingestion/bulk_loader_test.py
+import os
+from types import SimpleNamespace
+from unittest.mock import MagicMock
+
+from indexing_and_embedding.bm25_index import document_key
+from ingestion.bulk_loader import BulkLoader, Checkpoint, find_files
+
+
+def fake_chunker(file_path):
+    # Like the file processors, parses the user out of the path
+    metadata = {"file_path": file_path, "user_id": file_path.split("/")[1]}
+    return [SimpleNamespace(page_content=f"{file_path} part {i}", metadata=dict(metadata)) for i in range(3)]
+
+
+def make_loader(tmp_path, **kwargs):
+    chroma_client = MagicMock()
+    chroma_client.instrumented_embeddings.embed_documents.side_effect = lambda texts: [[0.0]] * len(texts)
+    redis_client = MagicMock()
+    redis_client.smembers.return_value = set()
+    checkpoint = Checkpoint(str(tmp_path / "checkpoint.jsonl"))
+    return BulkLoader(chroma_client, redis_client, checkpoint, num_workers=0, chunker=fake_chunker, **kwargs)
+
+
+def test_chunk_ids_are_the_consumer_ids(tmp_path):
+    loaders = []
+    for run in ("first", "second"):
+        (tmp_path / run).mkdir()
+        loaders.append(make_loader(tmp_path / run))
+        loaders[-1].load([("user_a", "data/user_a/text/1.txt")])
+
+    [first], [second] = (loader.chroma_client.add_embedded_documents.call_args_list for loader in loaders)
+    # The ids the consumer writes these chunks under, so re-ingesting the file through the stream upserts over them
+    assert first.args[2] == [document_key(d.page_content, d.metadata) for d in first.args[0]]
+    assert second.args[2] == first.args[2] and len(set(first.args[2])) == 3
+
+
+def test_find_files_skips_books_and_unsupported(tmp_path):
+    for rel in ["user_a/text/1.txt", "user_a/image/2.png", "user_a/books/3.txt", "user_b/notes.pdf", "books/4.txt"]:
+        os.makedirs(tmp_path / os.path.dirname(rel), exist_ok=True)
+        (tmp_path / rel).write_text("x")
+    files = find_files(str(tmp_path))
+    assert files == {"user_a": [str(tmp_path / "user_a/image/2.png"), str(tmp_path / "user_a/text/1.txt")]}
+
+
+def test_load_inserts_in_batches_and_marks_files(tmp_path):
+    loader = make_loader(tmp_path, insert_batch_size=4)
+    total = loader.load([("user_a", "data/user_a/text/a1.txt"), ("user_a", "data/user_a/text/a2.txt"), ("user_b", "data/user_b/text/b1.txt")])
+
+    assert total == 9
+    # Batches hold whole files: 6 chunks, then 3
+    calls = loader.chroma_client.add_embedded_documents.call_args_list
+    assert [len(c.args[0]) for c in calls] == [6, 3]
+    assert calls[0].args[2] == [document_key(d.page_content, d.metadata) for d in calls[0].args[0]]
+    assert calls[0].args[0][0].metadata["total_chunks"] == 3
+    pipeline = loader.redis_client.pipeline.return_value
+    pipeline.sadd.assert_any_call("published_files:user_b", "data/user_b/text/b1.txt")
+    pipeline.sadd.assert_any_call("processed_files:user_b", "data/user_b/text/b1.txt")
+
+
+def test_resume_skips_checkpointed_and_published_files(tmp_path):
+    make_loader(tmp_path).load([("user_a", "data/user_a/text/a1.txt")])
+
+    loader = make_loader(tmp_path)
+    loader.redis_client.smembers.side_effect = lambda key: {"data/user_a/text/a3.txt"} if key == "published_files:user_a" else set()
+    assert loader.pending_files({"user_a": ["data/user_a/text/a1.txt", "data/user_a/text/a2.txt", "data/user_a/text/a3.txt"]}) == [("user_a", "data/user_a/text/a2.txt")]
+
+
+def test_files_outside_a_relative_data_dir_are_recorded_as_the_producer_sees_them(tmp_path):
+    data_dir = tmp_path / "backfill"
+    os.makedirs(data_dir / "user_a" / "text")
+    (data_dir / "user_a" / "text" / "1.txt").write_text("x")
+    loader = make_loader(tmp_path, data_dir=str(data_dir))
+
+    loader.load(loader.pending_files(find_files(str(data_dir))))
+
+    [call] = loader.chroma_client.add_embedded_documents.call_args_list
+    assert {(d.metadata["user_id"], d.metadata["file_path"]) for d in call.args[0]} == {("user_a", "data/user_a/text/1.txt")}
+    assert call.args[2] == [document_key(d.page_content, d.metadata) for d in call.args[0]]
+    loader.redis_client.pipeline.return_value.sadd.assert_any_call("published_files:user_a", "data/user_a/text/1.txt")
+    assert loader.checkpoint.done == {"data/user_a/text/1.txt"}
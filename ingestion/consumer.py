@@ -5,13 +5,26 @@ import os
 import multiprocessing
 import sys
 import json
+import signal
+import threading
+import collections
+import functools
+from contextlib import contextmanager
 from datetime import datetime
 
 # To resolve import issue
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 from indexing_and_embedding.chroma_db_client import ChromaClient
-from langchain.schema import Document
+from indexing_and_embedding.bm25_index import BM25Store, document_key
+from indexing_and_embedding.embedding_archive import EmbeddingArchive
+from indexing_and_embedding.model_registry import ModelRegistry, model_tag
+from ingestion.stream_sharding import ShardAssigner, ShardRouter
+from ingestion.fair_scheduler import DeficitRoundRobinScheduler, TimeToSearchableTracker
+from observability import metrics, tracing
+from observability.profiler import setup_process_profiling
+from model_server.server import RemoteEmbeddings, connect
+from langchain_core.documents import Document
 
 # Redis Stream Config
 REDIS_HOST = 'localhost'
@@ -20,13 +33,85 @@ STREAM_KEY = 'ingestion_stream_chunks'
 CONSUMER_GROUP = 'ingestion_workers_group'
 CONSUMER_NAME_PREFIX = 'worker'
 NUM_WORKERS = 1  # Keeping this as one as I expect there is throttling by db chroma server.
+# Stream sharding by hashed user_id (must match ingestion/producer.py). One shard keeps the single STREAM_KEY.
+NUM_STREAM_SHARDS = 1
+# Shard i lives on REDIS_SHARD_NODES[i % len(REDIS_SHARD_NODES)], consumer membership and file state stay on REDIS_HOST
+REDIS_SHARD_NODES = [(REDIS_HOST, REDIS_PORT)]
+HEARTBEAT_INTERVAL_S = 5
+# A consumer (and its shard leases) is considered dead after this long without a heartbeat
+CONSUMER_TTL_MS = 30000
 # Chroma DB Config
 persist_directory = "chroma_store"
+# Only the default: the model / collection in use is read from Redis (indexing_and_embedding/model_registry.py) and
+# changes through a shadow migration (scripts/reembed_to_shadow.py) without restarting consumers
 embedding_model = "sentence-transformers/all-MiniLM-L6-v2"
+MODEL_REGISTRY_POLL_S = 5
+# "torch", "torch-int8", "onnx" or "onnx-int8" (see indexing_and_embedding/embeddings.py)
+EMBEDDING_BACKEND = "torch"
+EMBEDDING_THREADS = None  # None lets the runtime pick, set to the number of physical cores on dedicated nodes
+# Embed on a running model server (`make model-server`) instead of loading the model into every worker,
+# e.g. ("127.0.0.1", 50055). Workers load their own copy when no server is listening.
+MODEL_SERVER_ADDRESS = None
+# "shared" keeps every user in one collection, "per_user" / "hashed" give each user (or user shard) its own.
+PARTITION_MODE = "shared"
+NUM_COLLECTION_SHARDS = 16
+# "http" talks to `chroma run`, "local" writes to the embedded index under LOCAL_VECTOR_STORE_PATH.
+VECTOR_BACKEND = "http"
+LOCAL_VECTOR_STORE_PATH = "local_vector_store"
+# Precision of sealed segments in the local backend: "none" (float32), "float16" or "int8"
+VECTOR_QUANTIZATION = "none"
+# Quantized segments rescore the best k * VECTOR_RESCORE_FACTOR candidates against a float32 copy kept on disk,
+# 0 keeps no copy (the smallest disk footprint)
+VECTOR_RESCORE_FACTOR = 0
+# Per-user BM25 index kept next to the vector store for hybrid lookups
+ENABLE_BM25_INDEX = True
+BM25_INDEX_PATH = "bm25_index"
+# Every embedded chunk is also appended to <EMBEDDING_ARCHIVE_PATH>/<consumer name>__<model tag>/, so collections can be rebuilt
+# without re-embedding or re-captioning (scripts/restore_from_archive.py)
+ENABLE_EMBEDDING_ARCHIVE = True
+EMBEDDING_ARCHIVE_PATH = "embedding_archive"
 # Batch size for processing messages
 BATCH_SIZE = 5000
 # Timeout for claiming old messages (in milliseconds)
 CLAIM_TIMEOUT_MS = 60000 
+# Per-user fair scheduling: messages are read ahead into per-user queues and batches are built with deficit
+# round-robin, so a small upload is not stuck behind another user's bulk load
+SCHEDULER_QUANTUM = 200  # chunks a user may take per round
+USER_WEIGHTS = {}  # optional {user_id: weight}, e.g. {"premium_user": 4.0}
+MAX_BUFFERED_MESSAGES = 50000
+# Buffered (read but not yet processed) messages get their idle time reset this often, so they never look abandoned
+IDLE_REFRESH_INTERVAL_S = 20
+LATENCY_REPORT_INTERVAL_S = 60
+# Prometheus metrics of worker i are served on METRICS_PORT + i (None disables the endpoint)
+METRICS_PORT = 9100
+STREAM_METRICS_INTERVAL_S = 15
+# Opt-in tracing: batch spans go to <TRACE_DIR>/consumer-<pid>.jsonl, continuing the producer traces of their chunks
+TRACE_DIR = None  # e.g. "traces"
+TRACE_SAMPLE_RATE = 1.0
+# `kill -USR1 <pid>` toggles a sampling profiler writing <PROFILE_DIR>/consumer-<pid>-<n>.folded, PROFILE_FROM_START
+# profiles each worker from launch to exit
+PROFILE_DIR = "profiles"
+PROFILE_FROM_START = False
+
+STAGE_SECONDS = metrics.histogram("ingestion_consumer_stage_seconds", "Time of one consumer stage for one batch.", ["stage"])
+MESSAGES = metrics.counter("ingestion_consumer_messages_total", "Stream messages handled by the consumer.", ["result"])
+FILES_SEARCHABLE = metrics.counter("ingestion_files_searchable_total", "Files whose chunks are all searchable.")
+TIME_TO_SEARCHABLE = metrics.histogram(
+    "ingestion_time_to_searchable_seconds",
+    "From the producer picking up a saved file (message timestamp) to all of its chunks being searchable, per file.",
+    buckets=(0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600, 1800, 3600, 7200, 21600),
+)
+STREAM_LENGTH = metrics.gauge("ingestion_stream_length", "Entries in the stream shard.", ["shard"])
+STREAM_LAG = metrics.gauge("ingestion_stream_lag_messages", "Entries not yet delivered to the consumer group.", ["shard"])
+STREAM_PENDING = metrics.gauge("ingestion_stream_pending_messages", "Entries delivered to the consumer group but not acked.", ["shard"])
+BUFFERED_MESSAGES = metrics.gauge("ingestion_consumer_buffered_messages", "Messages read ahead into the fair scheduler queues.")
+
+
+@contextmanager
+def stage(name):
+    """Times one consumer stage of a batch: latency histogram, plus a span when tracing is on."""
+    with tracing.span(f"consumer.{name}"), STAGE_SECONDS.labels(stage=name).time():
+        yield
 
 
 # Configure logging
@@ -38,12 +123,24 @@ logger = logging.getLogger(__name__)
 
 
 class IngestionConsumer:
-    def __init__(self, consumer_name=None):
+    def __init__(self, consumer_name=None, chroma_db_client=None):
         self.consumer_name = consumer_name if consumer_name else f"{CONSUMER_NAME_PREFIX}-{os.getpid()}"
 
         self.redis_client = redis.Redis(
             host=REDIS_HOST, port=REDIS_PORT, decode_responses=True)
-        self.chroma_db_client = ChromaClient(collection_name="all_users_docs", embedding_model_name=embedding_model)
+        self.registry = ModelRegistry(self.redis_client, embedding_model, "all_users_docs")
+        # An injected client (benchmarks) is used as-is and never swapped for another model
+        self._builds_clients = chroma_db_client is None
+        self.active_model = self.registry.active() if self._builds_clients else dict(self.registry.default)
+        self.chroma_db_client = chroma_db_client or build_chroma_client(self.active_model["model"], self.active_model["collection"])
+        self.archive = self._open_archive(self.active_model["model"])
+        # Set while a model migration is in progress: new chunks are double-written to the shadow collection
+        self.shadow_model = None
+        self.shadow_client = None
+        self.shadow_archive = None
+        self._model_generation = None
+        self._last_model_poll = 0.0
+        self.bm25_store = BM25Store(BM25_INDEX_PATH) if ENABLE_BM25_INDEX else None
         try:
             self.redis_client.ping()
             logger.info(
@@ -53,22 +150,80 @@ class IngestionConsumer:
                 f"[Consumer] '{self.consumer_name}' could not connect to Redis: {e}")
             raise
 
-        self._create_consumer_group()
+        self.router = ShardRouter(REDIS_SHARD_NODES, NUM_STREAM_SHARDS, STREAM_KEY)
+        self.assigner = ShardAssigner(self.redis_client, self.consumer_name, NUM_STREAM_SHARDS, CONSUMER_TTL_MS)
+        for shard in range(NUM_STREAM_SHARDS):
+            self._create_consumer_group(shard)
+
+        self.scheduler = DeficitRoundRobinScheduler(SCHEDULER_QUANTUM, USER_WEIGHTS)
+        self.latency_tracker = TimeToSearchableTracker()
+        self._buffered = set()  # (shard, message_id) of messages queued in the scheduler
+        self._scheduled_shards = []
+        self._last_idle_refresh = time.monotonic()
+        self._last_latency_report = time.monotonic()
+        self._last_stream_metrics = 0.0
+        self._stream_metric_shards = set()
 
-    def _create_consumer_group(self):
+    def _create_consumer_group(self, shard):
+        stream_key = self.router.stream_key(shard)
         try:
-            self.redis_client.xgroup_create(
-                STREAM_KEY, CONSUMER_GROUP, id='0', mkstream=True)
+            self.router.client_for_shard(shard).xgroup_create(
+                stream_key, CONSUMER_GROUP, id='0', mkstream=True)
             logger.info(
-                f"[Consumer] Created consumer group '{CONSUMER_GROUP}' on stream '{STREAM_KEY}'.")
+                f"[Consumer] Created consumer group '{CONSUMER_GROUP}' on stream '{stream_key}'.")
         except redis.exceptions.ResponseError as e:
             if "BUSYGROUP" not in str(e):
                 raise e
             else:
                 logger.info(
-                    f"[Consumer] Consumer group '{CONSUMER_GROUP}' already exists.")
+                    f"[Consumer] Consumer group '{CONSUMER_GROUP}' already exists on '{stream_key}'.")
+
+    def _open_archive(self, model_name):
+        if not ENABLE_EMBEDDING_ARCHIVE:
+            return None
+        return EmbeddingArchive(os.path.join(EMBEDDING_ARCHIVE_PATH, f"{self.consumer_name}__{model_tag(model_name)}"), model_name=model_name)
+
+    def _sync_models(self):
+        """Picks up a started / aborted migration (shadow double-writes) or a cutover (new active model)."""
+        now = time.monotonic()
+        if not self._builds_clients or now - self._last_model_poll < MODEL_REGISTRY_POLL_S:
+            return
+        self._last_model_poll = now
+        generation = self.registry.generation()
+        if generation == self._model_generation:
+            return
+        self._model_generation = generation
+        active, shadow = self.registry.active(), self.registry.shadow()
+        if active != self.active_model:
+            if active == self.shadow_model:
+                # Cutover: the shadow client already has the new model loaded
+                self.chroma_db_client, self.archive = self.shadow_client, self.shadow_archive
+            else:
+                self.chroma_db_client = build_chroma_client(active["model"], active["collection"])
+                self.archive = self._open_archive(active["model"])
+            self.active_model = active
+            logger.info(f"[Consumer] Now writing '{active['model']}' embeddings to '{active['collection']}'.")
+        if shadow != self.shadow_model:
+            self.shadow_model = shadow
+            self.shadow_client = build_chroma_client(shadow["model"], shadow["collection"]) if shadow else None
+            self.shadow_archive = self._open_archive(shadow["model"]) if shadow else None
+            if shadow:
+                logger.info(f"[Consumer] Double-writing new chunks to shadow collection '{shadow['collection']}'.")
+
+    def _write_embedded(self, client, archive, docs, ids, stage_prefix=""):
+        texts = [d.page_content for d in docs]
+        with stage(f"{stage_prefix}embed"):
+            # Through the wrapper the vector stores use, so the embedding_seconds metric covers these calls
+            embeddings = client.instrumented_embeddings.embed_documents(texts)
+        with stage(f"{stage_prefix}write"):
+            client.add_embedded_documents(docs, embeddings, ids)
+        if archive is not None:
+            with stage(f"{stage_prefix}archive"):
+                archive.append(ids, texts, [d.metadata for d in docs], embeddings)
 
     def _get_chunk_count_key(self, user_id: str, file_path: str):
+        # Set of the stream ids of the file's processed chunks: a message processed twice (claimed from a slow
+        # previous owner, or redelivered after a lost ack) is counted once
         return f"file_chunks_processed:{user_id}:{os.path.basename(file_path)}"
 
     def _get_processed_files_key(self, user_id: str):
@@ -77,100 +232,358 @@ class IngestionConsumer:
     def _process_chunk_batch(self, message_list, is_pending=False):
         documents_to_add = []
         message_ids_to_ack = []
+        timestamps = []
+        traces = collections.Counter()  # producer trace context -> chunks of that trace in this batch
+        batch_start, batch_start_perf = time.time(), time.perf_counter()
         
-        for message_id, message_data in message_list:
-            try:
-                page_content = message_data.get('page_content')
-                metadata_str = message_data.get('metadata')
-                if not page_content or not metadata_str:
-                    logger.error(f"[Consumer] Invalid message format received: {message_data}. Skipping.")
+        with stage("parse"):
+            for message_id, message_data in message_list:
+                try:
+                    page_content = message_data.get('page_content')
+                    metadata_str = message_data.get('metadata')
+                    if not page_content or not metadata_str:
+                        logger.error(f"[Consumer] Invalid message format received: {message_data}. Skipping.")
+                        MESSAGES.labels(result="invalid").inc()
+                        continue
+                    metadata = json.loads(metadata_str)
+                    document = Document(page_content=page_content, metadata=metadata)
+                    documents_to_add.append(document)
+                    message_ids_to_ack.append(message_id)
+                    timestamps.append(message_data.get('timestamp'))
+                    if message_data.get('trace'):
+                        traces[message_data['trace']] += 1
+                except Exception as e:
+                    logger.error(f"[Consumer] Failed to process message {message_id}: {e}")
+                    MESSAGES.labels(result="invalid").inc()
                     continue
-                metadata = json.loads(metadata_str)
-                document = Document(page_content=page_content, metadata=metadata)
-                documents_to_add.append(document)
-                message_ids_to_ack.append(message_id)
-            except Exception as e:
-                logger.error(f"[Consumer] Failed to process message {message_id}: {e}")
-                continue
         
         if documents_to_add:
             try:
-                self.chroma_db_client.add_documents(documents_to_add)
+                # Ids derived from the chunk (the BM25 key), so a retried or re-claimed message overwrites its
+                # earlier write instead of duplicating it. Embedded once here, the same vectors go to the archive.
+                ids = [document_key(d.page_content, d.metadata) for d in documents_to_add]
+                self._write_embedded(self.chroma_db_client, self.archive, documents_to_add, ids)
+                if self.shadow_client is not None:
+                    # Same ids, so the re-embedding job's backfill upserts over these instead of duplicating them
+                    self._write_embedded(self.shadow_client, self.shadow_archive, documents_to_add, ids, stage_prefix="shadow_")
                 logger.info(f"[Consumer] Successfully added {len(documents_to_add)} documents to ChromaDB.")
+                if self.bm25_store is not None:
+                    with stage("bm25"):
+                        self.bm25_store.add_documents(documents_to_add)
                 
-                for doc in documents_to_add:
-                    user_id = doc.metadata.get('user_id')
-                    file_path = doc.metadata.get('file_path')
-                    total_chunks = int(doc.metadata.get('total_chunks'))
-                    if user_id and file_path and total_chunks:
-                        chunk_count_key = self._get_chunk_count_key(user_id, file_path)
-                        processed_count = self.redis_client.hincrby(chunk_count_key, 'processed_count', 1)
-                        if processed_count == total_chunks:
-                            processed_files_key = self._get_processed_files_key(user_id)
-                            self.redis_client.sadd(processed_files_key, file_path)
-                            logger.info(f"File '{file_path}' for user '{user_id}' is now COMPLETE (all {total_chunks} chunks processed).")
-                            self.redis_client.delete(chunk_count_key)
+                with stage("track_files"):
+                    self._track_files(documents_to_add, message_ids_to_ack, timestamps)
             except Exception as e:
                 logger.error(f"[Consumer] Failed to add documents to ChromaDB or update chunk counts: {e}")
+                MESSAGES.labels(result="failed").inc(len(documents_to_add))
                 return []
         
+        MESSAGES.labels(result="processed").inc(len(message_ids_to_ack))
+        if traces and tracing.enabled():
+            # The batch mixes chunks of many files: each producer trace gets a span for the batch work on its chunks,
+            # pointing at the batch span that has the stage breakdown
+            duration, batch_context = time.perf_counter() - batch_start_perf, tracing.span_context()
+            for trace, chunks in traces.items():
+                tracing.record_span("consumer.chunks", trace, batch_start, duration, chunks=chunks,
+                                    batch_size=len(documents_to_add), batch=batch_context, consumer=self.consumer_name)
         return message_ids_to_ack
 
-    def _process_pending_messages(self):
-        """Claims and processes pending messages from other consumers."""
-        # Use '0-0' as the start ID to claim all old messages
-        start_id = '0-0'
-        # Claim up to 2*BATCH_SIZE messages that are older than CLAIM_TIMEOUT_MS
-        claimed_messages = self.redis_client.xautoclaim(
-            STREAM_KEY,
-            CONSUMER_GROUP,
-            self.consumer_name,
-            CLAIM_TIMEOUT_MS,
-            start_id,
-            count=BATCH_SIZE*2
-        )
-
-        if claimed_messages and claimed_messages[1]:
-            logger.info(f"[Consumer] Found {len(claimed_messages[1])} pending messages. Processing...")
-            message_ids_to_ack = self._process_chunk_batch(claimed_messages[1], is_pending=True)
+    def _ack(self, shard, message_ids):
+        with stage("ack"):
+            self.router.client_for_shard(shard).xack(self.router.stream_key(shard), CONSUMER_GROUP, *message_ids)
+
+    def _track_files(self, docs, message_ids, timestamps):
+        """Counts the processed chunks of each file and marks the files whose chunks are now all searchable."""
+        tracked = []
+        pipeline = self.redis_client.pipeline(transaction=False)
+        for doc, message_id, timestamp in zip(docs, message_ids, timestamps):
+            user_id = doc.metadata.get('user_id')
+            file_path = doc.metadata.get('file_path')
+            total_chunks = int(doc.metadata.get('total_chunks') or 0)
+            if user_id and file_path and total_chunks:
+                # Scheduled batches key messages by (shard, stream id), a file's chunks all share one shard
+                stream_id = message_id[1] if isinstance(message_id, tuple) else message_id
+                chunk_count_key = self._get_chunk_count_key(user_id, file_path)
+                pipeline.sadd(chunk_count_key, stream_id)
+                pipeline.scard(chunk_count_key)
+                tracked.append((user_id, file_path, total_chunks, timestamp))
+        if not tracked:
+            return
+        counts = pipeline.execute()[1::2]
+        now = datetime.now()
+        for (user_id, file_path, total_chunks, timestamp), processed_count in zip(tracked, counts):
+            # The processed_files SADD fires completion once, even if duplicates push the count past total_chunks
+            if processed_count >= total_chunks and self.redis_client.sadd(self._get_processed_files_key(user_id), file_path):
+                logger.info(f"File '{file_path}' for user '{user_id}' is now COMPLETE (all {total_chunks} chunks processed).")
+                self.redis_client.delete(self._get_chunk_count_key(user_id, file_path))
+                FILES_SEARCHABLE.inc()
+                self._record_searchable(user_id, timestamp, now)
+
+    def _record_searchable(self, user_id, timestamp, now):
+        """Time-to-searchable of one completed file, from the timestamp the producer put in its messages."""
+        if not timestamp:
+            return
+        try:
+            seconds = (now - datetime.fromisoformat(timestamp)).total_seconds()
+        except ValueError:
+            return
+        self.latency_tracker.record(user_id, seconds)
+        TIME_TO_SEARCHABLE.observe(max(seconds, 0.0))
+
+    def _process_claimed(self, shard, claimed):
+        with tracing.span("consumer.claimed_batch", consumer=self.consumer_name, shard=shard, messages=len(claimed)):
+            message_ids_to_ack = self._process_chunk_batch(claimed, is_pending=True)
             if message_ids_to_ack:
-                self.redis_client.xack(STREAM_KEY, CONSUMER_GROUP, *message_ids_to_ack)
-                logger.info(f"[Consumer] Acknowledged {len(message_ids_to_ack)} claimed messages.")
-        else:
-            logger.info("[Consumer] No pending messages to claim.")
+                self._ack(shard, message_ids_to_ack)
+            logger.info(f"[Consumer] Acknowledged {len(message_ids_to_ack)} claimed messages on shard {shard}.")
 
+    def _drain_pending(self, shard):
+        """Claims and processes every pending message of a newly acquired shard, however recently it was delivered.
 
-    def run(self):
-        loop_count = 0
+        The previous owner may have read entries it never processed (dropped from its queues on release, or it
+        died). They are older than anything still undelivered, so they are processed before the shard's new
+        entries are read, which keeps each user's chunks in order across the handover.
+        """
+        client, stream_key = self.router.client_for_shard(shard), self.router.stream_key(shard)
+        cursor, drained = '0-0', 0
         while True:
+            # [next cursor, entries] (+ deleted ids on Redis 7)
+            result = client.xautoclaim(stream_key, CONSUMER_GROUP, self.consumer_name, 0, cursor, count=BATCH_SIZE)
+            cursor, claimed = result[0], result[1]
+            if claimed:
+                self._process_claimed(shard, claimed)
+                drained += len(claimed)
+            if cursor == '0-0':
+                break
+        if drained:
+            logger.info(f"[Consumer] Took over shard {shard} with {drained} pending messages, processed before new ones.")
+
+    def _process_pending_messages(self):
+        """Claims and processes pending messages of the owned shards (left by dead or rebalanced consumers)."""
+        for shard in self.assigner.owned_shards:
+            # Use '0-0' as the start ID to claim all old messages
+            start_id = '0-0'
+            # Claim up to 2*BATCH_SIZE messages that are older than CLAIM_TIMEOUT_MS
+            claimed_messages = self.router.client_for_shard(shard).xautoclaim(
+                self.router.stream_key(shard),
+                CONSUMER_GROUP,
+                self.consumer_name,
+                CLAIM_TIMEOUT_MS,
+                start_id,
+                count=BATCH_SIZE*2
+            )
+
+            # Messages waiting in our own scheduler queues are not abandoned, they are processed in turn
+            claimed = [(message_id, data) for message_id, data in (claimed_messages[1] if claimed_messages else [])
+                       if (shard, message_id) not in self._buffered]
+            if claimed:
+                logger.info(f"[Consumer] Found {len(claimed)} pending messages on shard {shard}. Processing...")
+                self._process_claimed(shard, claimed)
+            else:
+                logger.info(f"[Consumer] No pending messages to claim on shard {shard}.")
+
+    def _read_new_messages(self, block_ms=1000, count=None):
+        """Reads new entries from every owned shard. Returns a list of (shard, entries).
+
+        block_ms=None returns immediately (used while the scheduler still has work queued).
+        """
+        shards_by_node = {}
+        for shard in self.assigner.owned_shards:
+            shards_by_node.setdefault(self.router.node_for_shard(shard), []).append(shard)
+        # Blocking on one node would delay the others, so only block when all shards share a node
+        block = None if block_ms is None else block_ms if len(shards_by_node) == 1 else 50
+
+        batches = []
+        for shards in shards_by_node.values():
+            shard_by_key = {self.router.stream_key(shard): shard for shard in shards}
+            messages = self.router.client_for_shard(shards[0]).xreadgroup(
+                CONSUMER_GROUP,
+                self.consumer_name,
+                {key: '>' for key in shard_by_key},
+                count=count or BATCH_SIZE,
+                block=block
+            )
+            for stream_key, entries in messages or []:
+                if entries:
+                    batches.append((shard_by_key[stream_key], entries))
+        return batches
+
+    def _enqueue(self, shard, entries):
+        for message_id, message_data in entries:
             try:
-                if loop_count % 60 == 0:  
-                    self._process_pending_messages()
-                messages = self.redis_client.xreadgroup(
-                    CONSUMER_GROUP,
-                    self.consumer_name,
-                    {STREAM_KEY: '>'},
-                    count=BATCH_SIZE,
-                    block=1000
-                )
-
-                if messages and messages[0][1]:
-                    message_ids_to_ack = self._process_chunk_batch(messages[0][1])
-                    if message_ids_to_ack:
-                        self.redis_client.xack(STREAM_KEY, CONSUMER_GROUP, *message_ids_to_ack)
-                        logger.info(f"[Consumer] Acked {len(message_ids_to_ack)} new messages.")
-                else:
-                    logger.debug("[Consumer] No new messages, waiting...")
+                user_id = json.loads(message_data.get('metadata') or '{}').get('user_id') or ''
+            except (ValueError, AttributeError):
+                user_id = ''  # still queued, _process_chunk_batch logs and skips it
+            self.scheduler.enqueue(user_id, (shard, message_id, message_data))
+            self._buffered.add((shard, message_id))
+
+    def _sync_owned_shards(self):
+        """Forgets queued messages of shards this consumer no longer owns (they stay pending for the new owner) and
+        returns the shards acquired since the last call."""
+        owned = set(self.assigner.owned_shards)
+        acquired = sorted(owned - set(self._scheduled_shards))
+        if owned == set(self._scheduled_shards):
+            return acquired
+        dropped = [key for key in self._buffered if key[0] not in owned]
+        if dropped:
+            self.scheduler.discard(lambda item: item[0] not in owned)
+            self._buffered.difference_update(dropped)
+            logger.info(f"[Consumer] Dropped {len(dropped)} queued messages of released shards.")
+        self._scheduled_shards = list(owned)
+        return acquired
+
+    def _process_scheduled_batch(self, items):
+        with tracing.span("consumer.batch", consumer=self.consumer_name, messages=len(items)):
+            # Keys are (shard, message_id) so the acks can be routed back to each shard's stream
+            acked = set(self._process_chunk_batch([((shard, message_id), data) for shard, message_id, data in items]))
+            ids_by_shard = {}
+            for shard, message_id, _ in items:
+                if (shard, message_id) in acked:
+                    ids_by_shard.setdefault(shard, []).append(message_id)
+            for shard, message_ids in ids_by_shard.items():
+                self._ack(shard, message_ids)
+                logger.info(f"[Consumer] Acked {len(message_ids)} new messages on shard {shard}.")
+            self._buffered.difference_update((shard, message_id) for shard, message_id, _ in items)
+
+    def _refresh_buffered_idle(self):
+        """Resets the idle time of queued messages (XCLAIM JUSTID to ourselves) so no XAUTOCLAIM treats them as abandoned."""
+        ids_by_shard = {}
+        for shard, message_id in self._buffered:
+            ids_by_shard.setdefault(shard, []).append(message_id)
+        for shard, message_ids in ids_by_shard.items():
+            client, stream_key = self.router.client_for_shard(shard), self.router.stream_key(shard)
+            for start in range(0, len(message_ids), 1000):
+                client.xclaim(stream_key, CONSUMER_GROUP, self.consumer_name, 0, message_ids[start:start + 1000], justid=True)
+
+    def _update_stream_metrics(self):
+        """Length, lag and pending count of every owned shard (released shards are reported by their new owner)."""
+        owned = set(self.assigner.owned_shards)
+        for shard in self._stream_metric_shards - owned:
+            for gauge in (STREAM_LENGTH, STREAM_LAG, STREAM_PENDING):
+                gauge.remove(shard=shard)
+        self._stream_metric_shards = owned
+        for shard in owned:
+            client, stream_key = self.router.client_for_shard(shard), self.router.stream_key(shard)
+            STREAM_LENGTH.labels(shard=shard).set(client.xlen(stream_key))
+            STREAM_PENDING.labels(shard=shard).set(client.xpending(stream_key, CONSUMER_GROUP)['pending'])
+            for group in client.xinfo_groups(stream_key):
+                # 'lag' needs Redis 7 and is None when Redis cannot tell (e.g. after entries were deleted)
+                if group.get('name') == CONSUMER_GROUP and group.get('lag') is not None:
+                    STREAM_LAG.labels(shard=shard).set(group['lag'])
+        BUFFERED_MESSAGES.set(len(self._buffered))
+
+    def _log_latency_report(self):
+        for user_id, percentiles in self.latency_tracker.report().items():
+            if percentiles:
+                summary = " ".join(f"{name}={value:.1f}s" for name, value in percentiles.items())
+                logger.info(f"[Consumer] Time-to-searchable for user '{user_id}': {summary}")
+
+    def run_once(self, loop_count):
+        """One iteration of the consumer loop: rebalance (draining the pending messages of acquired shards), claim
+        pending (every 60 loops), read ahead into the per-user queues and process one fairly scheduled batch."""
+        self.assigner.refresh()
+        self._sync_models()
+        for shard in self._sync_owned_shards():
+            self._drain_pending(shard)
+        if not self.assigner.owned_shards:
+            logger.debug("[Consumer] No shards assigned, waiting...")
+            time.sleep(1)
+            return
+        if loop_count % 60 == 0:
+            self._process_pending_messages()
+
+        # Read ahead until the queues are full or the owned shards have nothing new, so the scheduler sees every
+        # user's backlog and a small upload behind a bulk load is scheduled in the next batch. Only wait for new
+        # messages when there is nothing queued to work on.
+        block_ms = None if len(self.scheduler) else 1000
+        while len(self.scheduler) < MAX_BUFFERED_MESSAGES:
+            batches = self._read_new_messages(block_ms=block_ms, count=min(MAX_BUFFERED_MESSAGES - len(self.scheduler), BATCH_SIZE))
+            if not batches:
+                break
+            for shard, entries in batches:
+                self._enqueue(shard, entries)
+            block_ms = None
+
+        batch = self.scheduler.next_batch(BATCH_SIZE)
+        if batch:
+            self._process_scheduled_batch(batch)
+        else:
+            logger.debug("[Consumer] No new messages, waiting...")
 
+        now = time.monotonic()
+        if self._buffered and now - self._last_idle_refresh >= IDLE_REFRESH_INTERVAL_S:
+            self._refresh_buffered_idle()
+            self._last_idle_refresh = now
+        if now - self._last_latency_report >= LATENCY_REPORT_INTERVAL_S:
+            self._log_latency_report()
+            self._last_latency_report = now
+        if now - self._last_stream_metrics >= STREAM_METRICS_INTERVAL_S:
+            self._last_stream_metrics = now
+            try:
+                self._update_stream_metrics()
+            except redis.exceptions.RedisError as e:
+                logger.warning(f"[Consumer] Could not read stream metrics: {e}")
+
+    def _heartbeat_loop(self, stop_event):
+        # Keeps leases alive while a long batch is being embedded, rebalancing itself only happens in run_once
+        while not stop_event.wait(HEARTBEAT_INTERVAL_S):
+            try:
+                self.assigner.heartbeat()
             except Exception as e:
-                logger.error(f"[Consumer] Error in loop: {e}", exc_info=True)
-                time.sleep(2)  # backoff
+                logger.error(f"[Consumer] Heartbeat failed: {e}")
+
+    def run(self):
+        stop_event = threading.Event()
+        threading.Thread(target=self._heartbeat_loop, args=(stop_event,), daemon=True).start()
+        loop_count = 0
+        try:
+            while True:
+                try:
+                    self.run_once(loop_count)
+                except Exception as e:
+                    logger.error(f"[Consumer] Error in loop: {e}", exc_info=True)
+                    time.sleep(2)  # backoff
+
+                loop_count += 1
+        finally:
+            stop_event.set()
+            self.assigner.leave()
+            tracing.shutdown()  # multiprocessing workers exit without running atexit handlers
+
+
+@functools.lru_cache(maxsize=None)
+def model_server_client():
+    """This process's connection to the model server, None when MODEL_SERVER_ADDRESS is unset or nothing listens."""
+    return connect(MODEL_SERVER_ADDRESS) if MODEL_SERVER_ADDRESS is not None else None
+
 
-            loop_count += 1
+def build_chroma_client(model_name, collection_name, **kwargs):
+    if model_server_client() is not None:
+        kwargs.setdefault("embedding_model", RemoteEmbeddings(model_server_client(), model_name, EMBEDDING_BACKEND))
+    return ChromaClient(
+        collection_name=collection_name,
+        embedding_model_name=model_name,
+        partition_mode=PARTITION_MODE,
+        num_shards=NUM_COLLECTION_SHARDS,
+        backend=VECTOR_BACKEND,
+        local_store_path=LOCAL_VECTOR_STORE_PATH,
+        quantization=VECTOR_QUANTIZATION,
+        rescore_factor=VECTOR_RESCORE_FACTOR,
+        embedding_backend=EMBEDDING_BACKEND,
+        embedding_threads=EMBEDDING_THREADS,
+        **kwargs,
+    )
 
 
 def start_worker(worker_id):
+    # Turn terminate() into a normal exit so the worker releases its shard leases on the way out
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
     worker_name = f"{CONSUMER_NAME_PREFIX}-{worker_id}"
+    if METRICS_PORT is not None:
+        metrics.start_metrics_server(METRICS_PORT + worker_id)
+    if TRACE_DIR is not None:
+        tracing.configure(TRACE_DIR, "consumer", TRACE_SAMPLE_RATE)
+    setup_process_profiling(PROFILE_DIR, "consumer", PROFILE_FROM_START)
     consumer = IngestionConsumer(consumer_name=worker_name)
     consumer.run()
 
@@ -0,0 +1,99 @@
+# ingestion/consumer_test.py
+import json
+from types import SimpleNamespace
+from unittest.mock import MagicMock, patch
+
+import pytest
+import redis
+
+from benchmarks.stand_ins import fake_redis_servers
+
+with patch.dict("sys.modules", {"langchain_core.documents": MagicMock(Document=SimpleNamespace)}):
+    from ingestion import consumer
+
+
+@pytest.fixture
+def stream(monkeypatch):
+    """The consumer's Redis (in-process stand-in) with the archive, BM25 and metrics turned off."""
+    monkeypatch.setattr(consumer, "ENABLE_EMBEDDING_ARCHIVE", False)
+    monkeypatch.setattr(consumer, "ENABLE_BM25_INDEX", False)
+    monkeypatch.setattr(consumer, "BATCH_SIZE", 10)
+    with fake_redis_servers():
+        yield redis.Redis(host=consumer.REDIS_HOST, port=consumer.REDIS_PORT, decode_responses=True)
+
+
+def publish(client, user_id, count, start=0):
+    for i in range(start, start + count):
+        metadata = {"user_id": user_id, "file_path": f"data/{user_id}/text/{i}.txt", "total_chunks": 1}
+        client.xadd(consumer.STREAM_KEY, {"page_content": f"{user_id} {i}", "metadata": json.dumps(metadata)})
+
+
+def start_consumer(name, written):
+    vector_store = MagicMock()
+    vector_store.add_embedded_documents.side_effect = lambda docs, embeddings, ids: written.extend(doc.page_content for doc in docs)
+    return consumer.IngestionConsumer(consumer_name=name, chroma_db_client=vector_store)
+
+
+def test_new_shard_owner_processes_pending_entries_before_new_ones(stream):
+    written = []
+    first = start_consumer("c1", written)
+    first.assigner.refresh()
+    publish(stream, "user_a", 5)
+    for shard, entries in first._read_new_messages(block_ms=None):
+        first._enqueue(shard, entries)  # delivered to c1, which leaves before processing them
+    first.assigner.leave()
+    publish(stream, "user_a", 5, start=5)
+
+    second = start_consumer("c2", written)
+    second.run_once(loop_count=1)
+
+    assert written == [f"user_a {i}" for i in range(10)]
+    assert stream.xpending(consumer.STREAM_KEY, consumer.CONSUMER_GROUP)["pending"] == 0
+
+
+def test_small_upload_overtakes_a_bulk_backlog(stream, monkeypatch):
+    monkeypatch.setattr(consumer, "SCHEDULER_QUANTUM", 5)
+    monkeypatch.setattr(consumer, "MAX_BUFFERED_MESSAGES", 1000)
+    publish(stream, "bulk_user", 300)
+    publish(stream, "small_user", 3)
+    written = []
+
+    start_consumer("c1", written).run_once(loop_count=1)
+
+    assert len(written) == consumer.BATCH_SIZE
+    assert [text for text in written if text.startswith("small_user")] == [f"small_user {i}" for i in range(3)]
+
+
+def test_reprocessed_messages_are_written_under_the_same_ids(stream):
+    publish(stream, "user_a", 3)
+    worker = start_consumer("c1", [])
+    worker.assigner.refresh()
+    [(_, entries)] = worker._read_new_messages(block_ms=None)
+
+    worker._process_chunk_batch(entries)
+    worker._process_chunk_batch(entries)  # e.g. the ack was lost and the messages were claimed again
+
+    first, second = [c.args[2] for c in worker.chroma_db_client.add_embedded_documents.call_args_list]
+    assert first == second and len(set(first)) == 3
+
+
+def test_a_file_completes_once_however_often_its_chunks_are_processed(stream):
+    metadata = json.dumps({"user_id": "user_a", "file_path": "data/user_a/text/big.txt", "total_chunks": 3})
+    for i in range(3):
+        stream.xadd(consumer.STREAM_KEY, {"page_content": f"part {i}", "metadata": metadata, "timestamp": "2026-01-01T00:00:00"})
+    worker = start_consumer("c1", [])
+    worker.assigner.refresh()
+    [(_, entries)] = worker._read_new_messages(block_ms=None)
+    files_before = consumer.FILES_SEARCHABLE.labels().value
+    observed = lambda: sum(consumer.TIME_TO_SEARCHABLE.labels().snapshot()[0])
+    observed_before = observed()
+
+    # A slow previous owner and the new owner both process the first two chunks, then the last one arrives
+    worker._process_chunk_batch(entries[:2])
+    worker._process_chunk_batch(entries[:2])
+    worker._process_chunk_batch(entries[2:])
+    worker._process_chunk_batch(entries)
+
+    assert stream.sismember("processed_files:user_a", "data/user_a/text/big.txt")
+    assert consumer.FILES_SEARCHABLE.labels().value - files_before == 1
+    assert observed() - observed_before == 1  # one time-to-searchable sample per file, not per chunk
@@ -0,0 +1,90 @@
+"""
+Per-user fair scheduling for the consumer.
+
+Messages read from the stream are queued per user and batches are built with deficit round-robin: each round
+every user with queued chunks earns `quantum * weight` chunks of credit and spends it in FIFO order. A user
+uploading one small file is served in the next batch even when another user has queued hundreds of thousands
+of chunks, while a bulk load that is alone in the queue still fills every batch.
+"""
+
+from collections import deque
+
+
+class DeficitRoundRobinScheduler:
+    def __init__(self, quantum: int = 200, weights: dict = None):
+        self.quantum = quantum
+        self.weights = weights or {}
+        self._queues = {}
+        self._deficits = {}
+        self._active = deque()
+        self._size = 0
+
+    def enqueue(self, user_id: str, item):
+        queue = self._queues.get(user_id)
+        if queue is None:
+            queue = self._queues[user_id] = deque()
+        if not queue:
+            self._active.append(user_id)
+            self._deficits[user_id] = 0
+        queue.append(item)
+        self._size += 1
+
+    def next_batch(self, max_items: int):
+        """Dequeues up to max_items items, interleaving users by deficit round-robin."""
+        batch = []
+        while self._active and len(batch) < max_items:
+            user_id = self._active.popleft()
+            queue = self._queues[user_id]
+            if self._deficits[user_id] <= 0:
+                self._deficits[user_id] += max(1, int(self.quantum * self.weights.get(user_id, 1.0)))
+            take = min(self._deficits[user_id], len(queue), max_items - len(batch))
+            for _ in range(take):
+                batch.append(queue.popleft())
+            self._deficits[user_id] -= take
+            self._size -= take
+            if queue:
+                if self._deficits[user_id] > 0:
+                    # Batch filled before the user spent its credit: it continues first next time
+                    self._active.appendleft(user_id)
+                else:
+                    self._active.append(user_id)
+            else:
+                self._deficits[user_id] = 0
+        return batch
+
+    def discard(self, predicate):
+        """Drops queued items matching predicate (e.g. from shards this consumer no longer owns)."""
+        for user_id, queue in self._queues.items():
+            kept = deque(item for item in queue if not predicate(item))
+            self._size -= len(queue) - len(kept)
+            self._queues[user_id] = kept
+        self._active = deque(user_id for user_id in self._active if self._queues[user_id])
+
+    def queued_per_user(self):
+        return {user_id: len(queue) for user_id, queue in self._queues.items() if queue}
+
+    def __len__(self):
+        return self._size
+
+
+class TimeToSearchableTracker:
+    """Keeps the most recent time-to-searchable samples per user and reports percentiles."""
+
+    def __init__(self, max_samples_per_user: int = 2000):
+        self.max_samples_per_user = max_samples_per_user
+        self._samples = {}
+
+    def record(self, user_id: str, seconds: float):
+        samples = self._samples.get(user_id)
+        if samples is None:
+            samples = self._samples[user_id] = deque(maxlen=self.max_samples_per_user)
+        samples.append(seconds)
+
+    def percentiles(self, user_id: str, points=(50, 95, 99)):
+        ordered = sorted(self._samples.get(user_id, ()))
+        if not ordered:
+            return {}
+        return {f"p{p}": ordered[min(len(ordered) - 1, int(len(ordered) * p / 100))] for p in points}
+
+    def report(self):
+        return {user_id: self.percentiles(user_id) for user_id in sorted(self._samples)}
@@ -0,0 +1,49 @@
+# ingestion/fair_scheduler_test.py
+from ingestion.fair_scheduler import DeficitRoundRobinScheduler, TimeToSearchableTracker
+
+
+def test_small_upload_is_not_stuck_behind_bulk_load():
+    scheduler = DeficitRoundRobinScheduler(quantum=10)
+    for i in range(10000):
+        scheduler.enqueue("bulk", ("bulk", i))
+    for i in range(5):
+        scheduler.enqueue("small", ("small", i))
+
+    batch = scheduler.next_batch(100)
+    assert [item for item in batch if item[0] == "small"] == [("small", i) for i in range(5)]
+    assert len(batch) == 100
+
+
+def test_single_user_fills_whole_batches_in_order():
+    scheduler = DeficitRoundRobinScheduler(quantum=10)
+    for i in range(250):
+        scheduler.enqueue("bulk", i)
+    assert scheduler.next_batch(100) == list(range(100))
+    assert scheduler.next_batch(100) == list(range(100, 200))
+    assert len(scheduler) == 50
+
+
+def test_weights_scale_the_share_per_round():
+    scheduler = DeficitRoundRobinScheduler(quantum=10, weights={"heavy": 3.0})
+    for i in range(1000):
+        scheduler.enqueue("heavy", ("heavy", i))
+        scheduler.enqueue("light", ("light", i))
+    batch = scheduler.next_batch(400)
+    assert sum(1 for user, _ in batch if user == "heavy") == 300
+
+
+def test_discard_drops_matching_items():
+    scheduler = DeficitRoundRobinScheduler(quantum=10)
+    for i in range(6):
+        scheduler.enqueue(f"user_{i % 2}", (i % 3, i))
+    scheduler.discard(lambda item: item[0] == 0)
+    assert len(scheduler) == 4
+    assert sorted(scheduler.next_batch(10)) == [(1, 1), (1, 4), (2, 2), (2, 5)]
+
+
+def test_time_to_searchable_percentiles():
+    tracker = TimeToSearchableTracker()
+    for seconds in range(1, 101):
+        tracker.record("user_a", float(seconds))
+    assert tracker.percentiles("user_a") == {"p50": 51.0, "p95": 96.0, "p99": 100.0}
+    assert tracker.percentiles("missing") == {}
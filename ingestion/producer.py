@@ -2,6 +2,7 @@ import os
 import multiprocessing
 import logging
 import time
+import signal
 import redis
 from datetime import datetime
 import sys
@@ -12,6 +13,10 @@ sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 from file_processors.text_file_processor import TextFileProcessor
 from file_processors.image_file_processor import ImageFileProcessor
+from file_processors.caption_cache import CaptionCache, DEFAULT_CACHE_PATH
+from ingestion.stream_sharding import ShardRouter
+from observability import metrics, tracing
+from observability.profiler import setup_process_profiling
 
 DATA_DIR = "data"
 SKIP_DIR = "books"
@@ -21,6 +26,26 @@ NUM_PROCESSES = 5
 REDIS_HOST = 'localhost'
 REDIS_PORT = 6379
 STREAM_KEY = 'ingestion_stream_chunks'
+# Stream sharding by hashed user_id (must match ingestion/consumer.py). One shard keeps the single STREAM_KEY.
+NUM_STREAM_SHARDS = 1
+REDIS_SHARD_NODES = [(REDIS_HOST, REDIS_PORT)]
+# Captions shared by all producer processes: copies and re-encodes of an image are captioned once
+ENABLE_CAPTION_CACHE = True
+CAPTION_CACHE_PATH = DEFAULT_CACHE_PATH
+# Prometheus metrics of the i-th user process are served on METRICS_PORT + i (None disables the endpoint)
+METRICS_PORT = 9120
+# Opt-in tracing: spans of every file go to <TRACE_DIR>/producer-<pid>.jsonl, and the trace id travels with the chunks
+TRACE_DIR = None  # e.g. "traces"
+TRACE_SAMPLE_RATE = 1.0
+# `kill -USR1 <pid>` toggles a sampling profiler writing <PROFILE_DIR>/producer-<pid>-<n>.folded, PROFILE_FROM_START
+# profiles each process from launch to exit
+PROFILE_DIR = "profiles"
+PROFILE_FROM_START = False
+
+# walk: one scan of the user's directory minus the chunk / publish time of new files in it
+STAGE_SECONDS = metrics.histogram("ingestion_producer_stage_seconds", "Time of one producer stage.", ["stage"])
+FILES = metrics.counter("ingestion_producer_files_total", "New files found by the producer.", ["kind"])
+CHUNKS_PUBLISHED = metrics.counter("ingestion_producer_chunks_published_total", "Chunks published to the stream.")
 
 # Configure logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(processName)s - %(levelname)s - %(message)s')
@@ -33,7 +58,8 @@ class UserIngestionWorker:
         self.data_dir = os.path.join("data", user_id)
         self.skip_dir = "books"
         self.text_processor = TextFileProcessor()
-        self.image_processor = ImageFileProcessor()
+        self.caption_cache = CaptionCache(CAPTION_CACHE_PATH) if ENABLE_CAPTION_CACHE else None
+        self.image_processor = ImageFileProcessor(caption_cache=self.caption_cache)
 
         # Connect to Redis
         self.redis_client = redis.Redis(host=REDIS_HOST, port=REDIS_PORT, decode_responses=True)
@@ -43,6 +69,8 @@ class UserIngestionWorker:
         except redis.exceptions.ConnectionError as e:
             logger.error(f"[{multiprocessing.current_process().name}] Could not connect to Redis: {e}")
             raise
+        # Every chunk of this user goes to the same shard, which keeps the user's chunks in order
+        self.stream_client, self.stream_key = ShardRouter(REDIS_SHARD_NODES, NUM_STREAM_SHARDS, STREAM_KEY).route_user(user_id)
 
     def get_published_files_key(self):
         """Return the Redis key for a user's set of published files."""
@@ -59,7 +87,7 @@ class UserIngestionWorker:
         self.redis_client.sadd(key, file_path)
         logger.info(f"Marked '{file_path}' with {total_chunks_published} chunks as published for user '{self.user_id}'.")
 
-    def _publish_chunk_to_stream(self, chunk, total_chunks):
+    def _publish_chunk_to_stream(self, chunk, total_chunks, trace=None, timestamp=None):
         """Adds a new chunk's information to the Redis Stream."""
         # Include the total number of chunks for the file in the message metadata
         chunk.metadata['total_chunks'] = total_chunks
@@ -67,14 +95,40 @@ class UserIngestionWorker:
         message = {
             'page_content': chunk.page_content,
             'metadata': json.dumps(chunk.metadata),  # Serialize metadata
-            'timestamp': datetime.now().isoformat()
+            'timestamp': timestamp or datetime.now().isoformat()
         }
+        if trace:
+            # The consumer continues the file's trace from here
+            message['trace'] = trace
         # Removing max len limit here
-        self.redis_client.xadd(STREAM_KEY, message)
+        self.stream_client.xadd(self.stream_key, message)
+
+    def _ingest_file(self, file_path, processor, kind):
+        """Chunks and publishes one new file. Returns (chunks published, seconds spent)."""
+        chunk_start = time.perf_counter()
+        # Every chunk carries the time the file was picked up, the consumer measures time-to-searchable per file from it
+        picked_up = datetime.now().isoformat()
+        with tracing.span("producer.file", user_id=self.user_id, kind=kind, path=file_path) as file_span:
+            with tracing.span("producer.chunk"):
+                chunks = processor.process_files([file_path])
+            publish_start = time.perf_counter()
+            total_chunks = len(chunks)
+            with tracing.span("producer.publish", chunks=total_chunks):
+                for chunk in chunks:
+                    self._publish_chunk_to_stream(chunk, total_chunks, file_span.context, picked_up)
+                self.mark_file_as_published(file_path, total_chunks)
+        end = time.perf_counter()
+        STAGE_SECONDS.labels(stage="chunk").observe(publish_start - chunk_start)
+        STAGE_SECONDS.labels(stage="publish").observe(end - publish_start)
+        FILES.labels(kind=kind).inc()
+        CHUNKS_PUBLISHED.inc(total_chunks)
+        return total_chunks, end - chunk_start
 
     def ingest_files(self):
         """Checks a user's directory for new files, chunks them, and publishes the chunks."""
         total_chunks_published = 0
+        pass_start = time.perf_counter()
+        file_seconds = 0.0
         if os.path.isdir(self.data_dir):
             for root, _, files in os.walk(self.data_dir):
                 if self.skip_dir in os.path.relpath(root, self.data_dir).split(os.sep):
@@ -84,26 +138,21 @@ class UserIngestionWorker:
                     if not self.has_file_been_published(file_path):
                         # Chunk the file
                         if file_path.endswith(".txt"):
-                            chunks = self.text_processor.process_files([file_path])
-                            total_chunks = len(chunks)
-                            for chunk in chunks:
-                                self._publish_chunk_to_stream(chunk, total_chunks)
-                                total_chunks_published += 1
-
-                            self.mark_file_as_published(file_path, total_chunks_published)
+                            published, seconds = self._ingest_file(file_path, self.text_processor, "text")
+                            total_chunks_published += published
+                            file_seconds += seconds
                         elif file_path.endswith(".png") or file_path.endswith(".jpg"):
-                            chunks = self.image_processor.process_files([file_path])
-                            total_chunks = len(chunks)
-                            for chunk in chunks:
-                                self._publish_chunk_to_stream(chunk, total_chunks)
-                                total_chunks_published += 1
-
-                            self.mark_file_as_published(file_path, total_chunks_published)
-
+                            published, seconds = self._ingest_file(file_path, self.image_processor, "image")
+                            total_chunks_published += published
+                            file_seconds += seconds
                         else:
                             logging.warning(f"[{multiprocessing.current_process().name}] Skipping unsupported file format: {file_path}")
+                            FILES.labels(kind="unsupported").inc()
+        STAGE_SECONDS.labels(stage="walk").observe(time.perf_counter() - pass_start - file_seconds)
         if total_chunks_published > 0:
             logger.info(f"[{multiprocessing.current_process().name}] Finished publishing new files. Total chunks: {total_chunks_published}")
+            if self.caption_cache is not None:
+                self.caption_cache.log_stats()
         return total_chunks_published
 
 def create_user_directory(user_id: str):
@@ -112,15 +161,25 @@ def create_user_directory(user_id: str):
     os.makedirs(user_dir, exist_ok=True)
     logger.info(f"User '{user_id}' directory created.")
 
-def ingestion_worker_process(user_id: str):
+def ingestion_worker_process(user_id: str, metrics_port: int = None):
     """Function to create and run a single worker process."""
+    # Turn terminate() into a normal exit so buffered trace spans are written on the way out
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    if metrics_port is not None:
+        metrics.start_metrics_server(metrics_port)
+    if TRACE_DIR is not None:
+        tracing.configure(TRACE_DIR, "producer", TRACE_SAMPLE_RATE)
+    setup_process_profiling(PROFILE_DIR, "producer", PROFILE_FROM_START)
     worker = UserIngestionWorker(user_id)
-    while True:
-        try:
-            worker.ingest_files()
-        except Exception as e:
-            logger.error(f"[{multiprocessing.current_process().name}] An error occurred: {e}")
-        time.sleep(5) # Interval between checks
+    try:
+        while True:
+            try:
+                worker.ingest_files()
+            except Exception as e:
+                logger.error(f"[{multiprocessing.current_process().name}] An error occurred: {e}")
+            time.sleep(5) # Interval between checks
+    finally:
+        tracing.shutdown()  # multiprocessing workers exit without running atexit handlers
 
 if __name__ == "__main__":
     multiprocessing.set_start_method('spawn', force=True)
@@ -134,10 +193,10 @@ if __name__ == "__main__":
 
     logger.info("Starting ingestion worker processes... 🚀")
     
-    for user_id in users_to_ingest:
+    for i, user_id in enumerate(users_to_ingest):
         process = multiprocessing.Process(
             target=ingestion_worker_process,
-            args=(user_id,),
+            args=(user_id, None if METRICS_PORT is None else METRICS_PORT + i),
             name=f"Worker-{user_id}"
         )
         processes.append(process)
@@ -0,0 +1,147 @@
+"""
+N-way partitioning of the ingestion stream by hashed user_id.
+
+Producers write a user's chunks to `<STREAM_KEY>:<shard>` (or the legacy single STREAM_KEY when there is one
+shard), so every chunk of a user lands on one stream in order. Shards can live on different Redis nodes.
+
+Consumers register in a heartbeat sorted set and split the shards with rendezvous hashing, which moves only
+~1/N of the shards when a consumer joins or leaves. A consumer only reads a shard while it holds that shard's
+lease, so two consumers never read the same user's stream at once. A consumer that acquires a shard first claims
+and processes the entries the previous owner left pending (XAUTOCLAIM with no idle threshold), then reads new
+ones, so per-user ordering survives a rebalance.
+"""
+
+import time
+import hashlib
+import logging
+import redis
+from indexing_and_embedding.partitioning import stable_hash
+
+CONSUMERS_KEY = "ingestion_consumers"
+LEASE_KEY_PREFIX = "ingestion_shard_lease"
+
+# Renew the lease only if we still own it / release it only if we still own it
+_RENEW_LEASE = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('pexpire', KEYS[1], ARGV[2])
+end
+return 0
+"""
+_RELEASE_LEASE = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('del', KEYS[1])
+end
+return 0
+"""
+
+
+def shard_for_user(user_id: str, num_shards: int) -> int:
+    return stable_hash(user_id) % num_shards
+
+
+def stream_key_for_shard(base_key: str, shard: int, num_shards: int) -> str:
+    """A single shard keeps the original key so existing deployments keep their stream."""
+    return base_key if num_shards == 1 else f"{base_key}:{shard}"
+
+
+def assign_shards(members, num_shards: int):
+    """Rendezvous (highest random weight) assignment of shards to members. Returns {member: [shards]}."""
+    assignment = {member: [] for member in members}
+    if not members:
+        return assignment
+    for shard in range(num_shards):
+        owner = max(members, key=lambda m: hashlib.md5(f"{m}:{shard}".encode("utf-8")).digest())
+        assignment[owner].append(shard)
+    return assignment
+
+
+class ShardRouter:
+    """Maps shards to Redis nodes (shard i lives on nodes[i % len(nodes)]) and caches one client per node."""
+
+    def __init__(self, nodes, num_shards: int, base_key: str):
+        self.nodes = list(nodes)
+        self.num_shards = num_shards
+        self.base_key = base_key
+        self._clients = {}
+
+    def node_for_shard(self, shard: int):
+        return self.nodes[shard % len(self.nodes)]
+
+    def client_for_shard(self, shard: int) -> redis.Redis:
+        node = self.node_for_shard(shard)
+        if node not in self._clients:
+            host, port = node
+            self._clients[node] = redis.Redis(host=host, port=port, decode_responses=True)
+        return self._clients[node]
+
+    def stream_key(self, shard: int) -> str:
+        return stream_key_for_shard(self.base_key, shard, self.num_shards)
+
+    def route_user(self, user_id: str):
+        """Returns (redis client, stream key) a producer should write this user's chunks to."""
+        shard = shard_for_user(user_id, self.num_shards)
+        return self.client_for_shard(shard), self.stream_key(shard)
+
+
+class ShardAssigner:
+    """Tracks live consumers and the shard leases this consumer holds.
+
+    `heartbeat` only keeps membership and owned leases alive, so it is safe to call from a background thread
+    while a long batch is being embedded. `refresh` also rebalances (acquires / releases leases) and must be called
+    between batches, so a shard is never released while its messages are still being processed.
+    """
+
+    def __init__(self, redis_client: redis.Redis, consumer_name: str, num_shards: int, member_ttl_ms: int = 15000):
+        self.redis_client = redis_client
+        self.consumer_name = consumer_name
+        self.num_shards = num_shards
+        self.member_ttl_ms = member_ttl_ms
+        self.owned_shards = []
+        self._renew = redis_client.register_script(_RENEW_LEASE)
+        self._release = redis_client.register_script(_RELEASE_LEASE)
+
+    def _lease_key(self, shard: int) -> str:
+        return f"{LEASE_KEY_PREFIX}:{shard}"
+
+    def live_members(self):
+        now_ms = int(time.time() * 1000)
+        self.redis_client.zremrangebyscore(CONSUMERS_KEY, "-inf", now_ms)
+        return sorted(self.redis_client.zrange(CONSUMERS_KEY, 0, -1))
+
+    def heartbeat(self):
+        now_ms = int(time.time() * 1000)
+        self.redis_client.zadd(CONSUMERS_KEY, {self.consumer_name: now_ms + self.member_ttl_ms})
+        for shard in list(self.owned_shards):
+            self._renew(keys=[self._lease_key(shard)], args=[self.consumer_name, self.member_ttl_ms])
+
+    def refresh(self):
+        """Heartbeats, recomputes the desired shards, and acquires / renews / releases leases to match.
+
+        Returns the shards this consumer may read now. A desired shard whose lease is still held by its previous
+        owner is picked up on a later refresh, once that owner releases it or its lease expires.
+        """
+        self.heartbeat()
+        members = self.live_members()
+        desired = set(assign_shards(members, self.num_shards).get(self.consumer_name, []))
+
+        owned = []
+        for shard in range(self.num_shards):
+            key = self._lease_key(shard)
+            if shard in desired:
+                if self._renew(keys=[key], args=[self.consumer_name, self.member_ttl_ms]) or \
+                        self.redis_client.set(key, self.consumer_name, nx=True, px=self.member_ttl_ms):
+                    owned.append(shard)
+            elif shard in self.owned_shards:
+                self._release(keys=[key], args=[self.consumer_name])
+
+        if owned != self.owned_shards:
+            logging.info(f"[ShardAssigner] '{self.consumer_name}' now owns shards {owned} ({len(members)} live consumers).")
+        self.owned_shards = owned
+        return owned
+
+    def leave(self):
+        """Releases every lease and deregisters so the other consumers rebalance immediately."""
+        for shard in self.owned_shards:
+            self._release(keys=[self._lease_key(shard)], args=[self.consumer_name])
+        self.redis_client.zrem(CONSUMERS_KEY, self.consumer_name)
+        self.owned_shards = []
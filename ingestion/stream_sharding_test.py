@@ -0,0 +1,98 @@
+# ingestion/stream_sharding_test.py
+import time
+
+from ingestion.stream_sharding import ShardAssigner, ShardRouter, assign_shards, shard_for_user, stream_key_for_shard
+
+
+class FakeRedis:
+    """Just enough of redis for ShardAssigner: a sorted set and string keys with expiry."""
+
+    def __init__(self):
+        self.zsets = {}
+        self.strings = {}
+
+    def _alive(self, key):
+        value, expires_at = self.strings.get(key, (None, 0))
+        return value if expires_at > time.time() else None
+
+    def zadd(self, key, mapping):
+        self.zsets.setdefault(key, {}).update(mapping)
+
+    def zremrangebyscore(self, key, low, high):
+        self.zsets[key] = {m: s for m, s in self.zsets.get(key, {}).items() if s > high}
+
+    def zrange(self, key, start, end):
+        return sorted(self.zsets.get(key, {}), key=self.zsets[key].get)
+
+    def zrem(self, key, member):
+        self.zsets.get(key, {}).pop(member, None)
+
+    def set(self, key, value, nx=False, px=None):
+        if nx and self._alive(key) is not None:
+            return None
+        self.strings[key] = (value, time.time() + px / 1000)
+        return True
+
+    def register_script(self, source):
+        def renew(keys, args):
+            if self._alive(keys[0]) == args[0]:
+                self.strings[keys[0]] = (args[0], time.time() + int(args[1]) / 1000)
+                return 1
+            return 0
+
+        def release(keys, args):
+            if self._alive(keys[0]) == args[0]:
+                del self.strings[keys[0]]
+                return 1
+            return 0
+
+        return renew if "pexpire" in source else release
+
+
+def test_stream_key_keeps_legacy_name_for_one_shard():
+    assert stream_key_for_shard("stream", 0, 1) == "stream"
+    assert stream_key_for_shard("stream", 3, 8) == "stream:3"
+
+
+def test_users_always_map_to_the_same_shard():
+    assert shard_for_user("user_a", 8) == shard_for_user("user_a", 8)
+    assert {shard_for_user(f"user_{i}", 8) for i in range(200)} == set(range(8))
+
+
+def test_assign_shards_covers_every_shard_once():
+    assignment = assign_shards(["c1", "c2", "c3"], 12)
+    assert sorted(s for shards in assignment.values() for s in shards) == list(range(12))
+
+
+def test_assign_shards_moves_few_shards_when_a_member_joins():
+    before = assign_shards(["c1", "c2", "c3"], 64)
+    after = assign_shards(["c1", "c2", "c3", "c4"], 64)
+    moved = [s for m in ["c1", "c2", "c3"] for s in before[m] if s not in after[m]]
+    # Only shards taken over by the new member move
+    assert sorted(moved) == sorted(after["c4"])
+
+
+def test_router_spreads_shards_over_nodes():
+    router = ShardRouter([("node1", 6379), ("node2", 6380)], 4, "stream")
+    assert router.node_for_shard(0) == ("node1", 6379)
+    assert router.node_for_shard(3) == ("node2", 6380)
+
+
+def test_assigners_split_shards_and_hand_over_on_leave():
+    fake = FakeRedis()
+    first = ShardAssigner(fake, "c1", 8)
+    second = ShardAssigner(fake, "c2", 8)
+
+    first.refresh()
+    assert first.owned_shards == list(range(8))
+
+    second.refresh()  # c1 still holds every lease, c2 waits
+    assert second.owned_shards == []
+    first.refresh()  # c1 releases the shards that now belong to c2
+    second.refresh()
+    assert sorted(first.owned_shards + second.owned_shards) == list(range(8))
+    assert set(first.owned_shards).isdisjoint(second.owned_shards)
+
+    second.leave()
+    first.refresh()
+    assert first.owned_shards == list(range(8))
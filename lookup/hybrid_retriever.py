@@ -0,0 +1,27 @@
+from typing import Any, List
+from langchain_core.callbacks import CallbackManagerForRetrieverRun
+from langchain_core.documents import Document
+from langchain_core.retrievers import BaseRetriever
+from lookup.hybrid_search import HybridSearcher
+
+
+class HybridRetriever(BaseRetriever):
+    """LangChain retriever over HybridSearcher: a user's dense retriever fused with their BM25 index."""
+
+    dense_retriever: BaseRetriever
+    bm25_store: Any
+    user_id: str
+    top_k: int = 5
+    # How many candidates each side contributes to the fusion
+    candidate_k: int = 20
+    budget_ms: float = 150.0
+
+    def _lexical_search(self, query: str) -> List[Document]:
+        return [
+            Document(page_content=text, metadata=metadata)
+            for _, text, metadata, _ in self.bm25_store.search(self.user_id, query, self.candidate_k)
+        ]
+
+    def _get_relevant_documents(self, query: str, *, run_manager: CallbackManagerForRetrieverRun) -> List[Document]:
+        searcher = HybridSearcher(self.dense_retriever.invoke, self._lexical_search, self.top_k, self.budget_ms)
+        return searcher.search(query)
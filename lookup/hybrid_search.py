@@ -0,0 +1,69 @@
+"""
+Fuses dense (vector) and lexical (BM25) results with reciprocal rank fusion.
+
+The lexical search runs on a thread pool in parallel with the dense search. If it misses the latency budget,
+the dense results are returned alone rather than making the user wait.
+"""
+
+import time
+import logging
+from concurrent.futures import ThreadPoolExecutor, TimeoutError
+from indexing_and_embedding.bm25_index import document_key
+from observability import tracing
+
+# Standard RRF constant: dampens the advantage of the very first ranks
+RRF_K = 60
+
+_executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="lexical-search")
+
+
+def reciprocal_rank_fusion(ranked_lists, top_n: int, rrf_k: int = RRF_K):
+    """Merges ranked lists of (key, item) pairs. Returns the top_n items by summed 1 / (rrf_k + rank)."""
+    scores = {}
+    items = {}
+    for ranked in ranked_lists:
+        for rank, (key, item) in enumerate(ranked, start=1):
+            scores[key] = scores.get(key, 0.0) + 1.0 / (rrf_k + rank)
+            items.setdefault(key, item)
+    best = sorted(scores, key=lambda key: -scores[key])[:top_n]
+    return [items[key] for key in best]
+
+
+class HybridSearcher:
+    """Runs a dense and a lexical search for one user and fuses them."""
+
+    def __init__(self, dense_search, lexical_search, top_k: int = 5, budget_ms: float = 150.0, executor: ThreadPoolExecutor = None):
+        """
+        dense_search(query) -> list of LangChain documents, best first
+        lexical_search(query) -> list of LangChain documents, best first
+        """
+        self.dense_search = dense_search
+        self.lexical_search = lexical_search
+        self.top_k = top_k
+        self.budget_ms = budget_ms
+        self.executor = executor or _executor
+
+    def search(self, query: str):
+        start = time.perf_counter()
+        lexical_future = self.executor.submit(self.lexical_search, query)
+        with tracing.span("lookup.dense_search"):
+            dense_docs = self.dense_search(query)
+
+        remaining = max(0.0, self.budget_ms / 1000 - (time.perf_counter() - start))
+        try:
+            lexical_docs = lexical_future.result(timeout=remaining)
+        except TimeoutError:
+            logging.warning(f"[HybridSearcher] Lexical search exceeded the {self.budget_ms} ms budget, using dense results only.")
+            lexical_future.cancel()
+            lexical_docs = []
+        except Exception as e:
+            logging.error(f"[HybridSearcher] Lexical search failed: {e}")
+            lexical_docs = []
+
+        return reciprocal_rank_fusion(
+            [
+                [(document_key(d.page_content, d.metadata), d) for d in dense_docs],
+                [(document_key(d.page_content, d.metadata), d) for d in lexical_docs],
+            ],
+            top_n=self.top_k,
+        )
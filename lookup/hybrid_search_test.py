@@ -0,0 +1,45 @@
+# lookup/hybrid_search_test.py
+import time
+from unittest.mock import MagicMock
+
+from lookup.hybrid_search import HybridSearcher, reciprocal_rank_fusion
+
+
+def _doc(text):
+    return MagicMock(page_content=text, metadata={"file_path": "data/user_a/text/1.txt"})
+
+
+def test_rrf_prefers_items_ranked_by_both_lists():
+    fused = reciprocal_rank_fusion([[("a", "A"), ("b", "B"), ("c", "C")], [("c", "C"), ("d", "D")]], top_n=2)
+    assert fused == ["C", "A"]
+
+
+def test_hybrid_searcher_fuses_dense_and_lexical():
+    shared, dense_only, lexical_only = _doc("shared"), _doc("dense"), _doc("inv7731")
+    searcher = HybridSearcher(lambda q: [dense_only, shared], lambda q: [lexical_only, shared], top_k=3)
+
+    results = searcher.search("inv7731")
+
+    assert results[0] is shared
+    assert {d.page_content for d in results} == {"shared", "dense", "inv7731"}
+
+
+def test_hybrid_searcher_drops_lexical_over_budget():
+    dense = _doc("dense")
+
+    def slow_lexical(query):
+        time.sleep(0.2)
+        return [_doc("late")]
+
+    searcher = HybridSearcher(lambda q: [dense], slow_lexical, top_k=5, budget_ms=20)
+
+    assert searcher.search("query") == [dense]
+
+
+def test_hybrid_searcher_survives_lexical_errors():
+    dense = _doc("dense")
+
+    def broken_lexical(query):
+        raise RuntimeError("index unavailable")
+
+    assert HybridSearcher(lambda q: [dense], broken_lexical).search("query") == [dense]
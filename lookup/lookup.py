@@ -1,25 +1,69 @@
-from langchain.chains import RetrievalQA
-from langchain_huggingface import HuggingFacePipeline
-from transformers import pipeline
-import os, sys 
+import os, sys, time, logging
 
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 from indexing_and_embedding.chroma_db_client import ChromaClient
+from indexing_and_embedding.embeddings import QUERY_EMBEDDING_TIMER
+from observability import metrics, tracing
+
+# embed: query embedding, generate: the LLM call, search: the rest (vector / BM25 search, fusion, prompt)
+STAGE_SECONDS = metrics.histogram("lookup_stage_seconds", "Time of one lookup stage for one query.", ["stage"])
+QUERIES = metrics.counter("lookup_queries_total", "Queries handled by Lookup.", ["result"])
+GENERATE_TIMER = metrics.ThreadTimer()
+
+
+class TimedPipeline:
+    """Wraps the transformers pipeline so the LLM call made inside the QA chain is timed (GENERATE_TIMER)."""
+
+    def __init__(self, pipeline):
+        self.pipeline = pipeline
+
+    def __call__(self, *args, **kwargs):
+        start = time.perf_counter()
+        try:
+            with tracing.span("lookup.generate"):
+                return self.pipeline(*args, **kwargs)
+        finally:
+            GENERATE_TIMER.add(time.perf_counter() - start)
+
+    def __getattr__(self, name):
+        if name == "pipeline":
+            raise AttributeError(name)
+        return getattr(self.pipeline, name)
+
 
 class Lookup:
-    def __init__(self, chroma_db_client, model_name="google/flan-t5-small", max_new_tokens=200, device=-1):
-        llm_pipeline = pipeline(
-            "text2text-generation",
-            model=model_name,
-            tokenizer=model_name,
-            max_new_tokens=max_new_tokens,
-            device=device
-        )
-        self.llm = HuggingFacePipeline(pipeline=llm_pipeline)
+    def __init__(self, chroma_db_client, model_name="google/flan-t5-small", max_new_tokens=200, device=-1, bm25_store=None, hybrid_budget_ms=150.0,
+                 model_registry=None, client_factory=None, model_poll_interval_s=5.0, llm_pipeline=None):
+        # llm_pipeline: an already built text2text-generation pipeline (or stand-in) instead of loading model_name
+        if llm_pipeline is None:
+            # transformers (and torch) are only imported when the model is loaded in this process
+            from transformers import pipeline
+            llm_pipeline = pipeline(
+                "text2text-generation",
+                model=model_name,
+                tokenizer=model_name,
+                max_new_tokens=max_new_tokens,
+                device=device
+            )
+        # LangChain (and the transformers import behind langchain_huggingface) loads with the first Lookup, not with main
+        from langchain_huggingface import HuggingFacePipeline
+        self.llm = HuggingFacePipeline(pipeline=TimedPipeline(llm_pipeline))
         self.chroma_db_client = chroma_db_client
+        # With a BM25Store, dense results are fused with the user's lexical index (see lookup/hybrid_search.py)
+        self.bm25_store = bm25_store
+        self.hybrid_budget_ms = hybrid_budget_ms
+        # With a ModelRegistry, a cutover to a new embedding model is picked up on the next query:
+        # client_factory(model_name, collection_name) builds the ChromaClient for the new active collection
+        self.model_registry = model_registry
+        self.client_factory = client_factory
+        self.model_poll_interval_s = model_poll_interval_s
+        self.active_model = model_registry.active_or_default() if model_registry is not None else None
+        self._model_generation = None
+        self._last_model_poll = 0.0
 
     def get_qa(self,retriever):
+        from langchain.chains import RetrievalQA
         qa_chain = RetrievalQA.from_chain_type(
             llm=self.llm,
             retriever=retriever,
@@ -27,14 +71,62 @@ class Lookup:
         )
         return qa_chain
 
-    def generate_reponse(self, user_id : str, query : str, top_k : int = 5, verbose : bool = True):
-        retriever = self.chroma_db_client.get_user_retriever(user_id, top_k)
-        qa_chain = RetrievalQA.from_chain_type(
-            llm=self.llm,
-            retriever=retriever,
-            return_source_documents=True
+    def _sync_active_model(self):
+        now = time.monotonic()
+        if self.model_registry is None or now - self._last_model_poll < self.model_poll_interval_s:
+            return
+        self._last_model_poll = now
+        try:
+            generation = self.model_registry.generation()
+            if generation == self._model_generation:
+                return
+            active = self.model_registry.active()
+        except Exception as e:
+            logging.warning(f"[Lookup] Could not check the active embedding model, keeping the current one: {e}")
+            return
+        self._model_generation = generation
+        if active != self.active_model:
+            logging.info(f"[Lookup] Switching to embedding model '{active['model']}' ('{active['collection']}').")
+            self.chroma_db_client = self.client_factory(active["model"], active["collection"])
+            self.active_model = active
+
+    def get_retriever(self, user_id : str, top_k : int = 5):
+        self._sync_active_model()
+        if self.bm25_store is None:
+            return self.chroma_db_client.get_user_retriever(user_id, top_k)
+
+        from lookup.hybrid_retriever import HybridRetriever
+        candidate_k = max(4 * top_k, 20)
+        return HybridRetriever(
+            dense_retriever=self.chroma_db_client.get_user_retriever(user_id, candidate_k),
+            bm25_store=self.bm25_store,
+            user_id=user_id,
+            top_k=top_k,
+            candidate_k=candidate_k,
+            budget_ms=self.hybrid_budget_ms,
         )
-        return qa_chain.invoke({"query": query})
+
+    def generate_reponse(self, user_id : str, query : str, top_k : int = 5, verbose : bool = True):
+        start = time.perf_counter()
+        # Embedding and generation run inside the chain, their timers are read back per thread
+        QUERY_EMBEDDING_TIMER.take()
+        GENERATE_TIMER.take()
+        try:
+            with tracing.span("lookup.query", top_k=top_k, hybrid=self.bm25_store is not None):
+                retriever = self.get_retriever(user_id, top_k)
+                qa_chain = self.get_qa(retriever)
+                result = qa_chain.invoke({"query": query})
+        except Exception:
+            QUERIES.labels(result="error").inc()
+            raise
+        total = time.perf_counter() - start
+        embed, generate = QUERY_EMBEDDING_TIMER.take(), GENERATE_TIMER.take()
+        STAGE_SECONDS.labels(stage="embed").observe(embed)
+        STAGE_SECONDS.labels(stage="search").observe(max(total - embed - generate, 0.0))
+        STAGE_SECONDS.labels(stage="generate").observe(generate)
+        STAGE_SECONDS.labels(stage="total").observe(total)
+        QUERIES.labels(result="ok").inc()
+        return result
     
 if __name__ == "__main__":
     embedding_model = "sentence-transformers/all-MiniLM-L6-v2"
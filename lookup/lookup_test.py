@@ -23,8 +23,8 @@ def mock_chroma_client():
 
 def test_lookup_initialization(mock_chroma_client):
     """It should initialize Lookup with a mocked pipeline + chroma client."""
-    with patch("lookup.lookup.pipeline", return_value=MagicMock()) as mock_pipeline, \
-         patch("lookup.lookup.HuggingFacePipeline", return_value=MagicMock()) as mock_hf_pipeline:
+    with patch.object(sys.modules["transformers"], "pipeline", return_value=MagicMock()) as mock_pipeline, \
+         patch.object(sys.modules["langchain_huggingface"], "HuggingFacePipeline", return_value=MagicMock()) as mock_hf_pipeline:
 
         lookup = Lookup(mock_chroma_client)
 
@@ -38,7 +38,7 @@ def test_get_qa_returns_chain(mock_chroma_client):
     fake_retriever = MagicMock()
     fake_chain = MagicMock()
 
-    with patch("lookup.lookup.RetrievalQA.from_chain_type", return_value=fake_chain) as mock_from_chain:
+    with patch.object(sys.modules["langchain.chains"].RetrievalQA, "from_chain_type", return_value=fake_chain) as mock_from_chain:
         lookup = Lookup(mock_chroma_client)
         chain = lookup.get_qa(fake_retriever)
 
@@ -54,10 +54,87 @@ def test_generate_response_calls_retriever_and_chain(mock_chroma_client):
     fake_chain = MagicMock()
     fake_chain.invoke.return_value = fake_result
 
-    with patch("lookup.lookup.RetrievalQA.from_chain_type", return_value=fake_chain):
+    with patch.object(sys.modules["langchain.chains"].RetrievalQA, "from_chain_type", return_value=fake_chain):
         lookup = Lookup(mock_chroma_client)
         result = lookup.generate_reponse("user_1", "test query")
 
         mock_chroma_client.get_user_retriever.assert_called_once_with("user_1", 5)
         fake_chain.invoke.assert_called_once_with({"query": "test query"})
         assert result == fake_result
+
+
+def test_get_retriever_builds_hybrid_retriever_with_bm25_store(mock_chroma_client):
+    """With a BM25 store, the dense retriever fetches extra candidates for fusion."""
+    bm25_store = MagicMock()
+    fake_hybrid_module = MagicMock()
+    with patch.dict("sys.modules", {"lookup.hybrid_retriever": fake_hybrid_module}):
+        lookup = Lookup(mock_chroma_client, bm25_store=bm25_store, hybrid_budget_ms=50)
+        retriever = lookup.get_retriever("user_1", top_k=5)
+
+    mock_chroma_client.get_user_retriever.assert_called_once_with("user_1", 20)
+    fake_hybrid_module.HybridRetriever.assert_called_once_with(
+        dense_retriever=mock_chroma_client.get_user_retriever.return_value,
+        bm25_store=bm25_store,
+        user_id="user_1",
+        top_k=5,
+        candidate_k=20,
+        budget_ms=50,
+    )
+    assert retriever == fake_hybrid_module.HybridRetriever.return_value
+
+
+def test_get_retriever_switches_client_after_cutover(mock_chroma_client):
+    """A new active embedding model in the registry swaps the chroma client without a restart."""
+    registry = MagicMock()
+    old = {"model": "old-model", "collection": "docs"}
+    new = {"model": "new-model", "collection": "docs__m_new-model"}
+    registry.active_or_default.return_value = old
+    registry.active.return_value = old
+    registry.generation.return_value = 1
+    new_client = MagicMock()
+    client_factory = MagicMock(return_value=new_client)
+
+    lookup = Lookup(mock_chroma_client, model_registry=registry, client_factory=client_factory, model_poll_interval_s=0)
+    lookup.get_retriever("user_1")
+    client_factory.assert_not_called()
+
+    registry.active.return_value = new
+    registry.generation.return_value = 2
+    retriever = lookup.get_retriever("user_1")
+
+    client_factory.assert_called_once_with("new-model", "docs__m_new-model")
+    assert retriever == new_client.get_user_retriever.return_value
+
+
+def test_generate_response_records_stage_latencies(mock_chroma_client):
+    """Query embedding and LLM time spent inside the chain are split out of the total."""
+    import lookup.lookup as lookup_module
+    from indexing_and_embedding.embeddings import QUERY_EMBEDDING_TIMER
+
+    def invoke(inputs):
+        QUERY_EMBEDDING_TIMER.add(0.25)
+        lookup_module.GENERATE_TIMER.add(1.0)
+        return {"result": "answer"}
+
+    fake_chain = MagicMock()
+    fake_chain.invoke.side_effect = invoke
+    stage_sum = lambda stage: lookup_module.STAGE_SECONDS.labels(stage=stage).snapshot()[1]
+    before = {stage: stage_sum(stage) for stage in ("embed", "generate", "total")}
+
+    with patch.object(sys.modules["langchain.chains"].RetrievalQA, "from_chain_type", return_value=fake_chain):
+        Lookup(mock_chroma_client).generate_reponse("user_1", "test query")
+
+    assert stage_sum("embed") - before["embed"] == pytest.approx(0.25)
+    assert stage_sum("generate") - before["generate"] == pytest.approx(1.0)
+    assert stage_sum("total") - before["total"] < 1.0  # the fake chain itself is instant
+
+
+def test_timed_pipeline_delegates_to_the_wrapped_pipeline():
+    import lookup.lookup as lookup_module
+
+    llm_pipeline = MagicMock(task="text2text-generation", return_value=[{"generated_text": "hi"}])
+    timed = lookup_module.TimedPipeline(llm_pipeline)
+    lookup_module.GENERATE_TIMER.take()
+    assert timed.task == "text2text-generation"
+    assert timed(["prompt"]) == [{"generated_text": "hi"}]
+    assert lookup_module.GENERATE_TIMER.take() > 0
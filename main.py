@@ -1,12 +1,16 @@
 import os
 import time
 import logging
+import redis
 from colorama import Fore, Style, init
 
-from file_processors.text_file_processor import TextFileProcessor
-from file_processors.image_file_processor import ImageFileProcessor
 from indexing_and_embedding.chroma_db_client import ChromaClient
-from lookup.lookup import Lookup
+from indexing_and_embedding.bm25_index import BM25Store
+from indexing_and_embedding.model_registry import ModelRegistry
+from model_server.server import RemoteEmbeddings, RemotePipeline, connect
+from observability import tracing
+from observability.metrics import start_metrics_server
+from observability.profiler import setup_process_profiling
 
 # Initialize colorama for colored terminal output
 init(autoreset=True)
@@ -16,21 +20,79 @@ logging.basicConfig(level=logging.INFO, format='%(levelname)s:%(message)s')
 logger = logging.getLogger(__name__)
 logger.setLevel(logging.INFO)
 
+# Default only: the active model / collection comes from the model registry in Redis (see scripts/reembed_to_shadow.py)
 embedding_model = "sentence-transformers/all-MiniLM-L6-v2"
+# Query embeddings from any backend are compatible with vectors written by the consumer's backend
+embedding_backend = "torch"
+# Must match the consumer's PARTITION_MODE / NUM_COLLECTION_SHARDS
+partition_mode = "shared"
+num_collection_shards = 16
+# Must match the consumer's VECTOR_BACKEND / LOCAL_VECTOR_STORE_PATH
+vector_backend = "http"
+local_vector_store_path = "local_vector_store"
+# Match the consumer's VECTOR_RESCORE_FACTOR to rescore against the float32 copies it keeps
+vector_rescore_factor = 0
+# Prometheus metrics of the lookup (embed / search / generate latency), None disables the endpoint. Not 9090, which is
+# Prometheus's own port
+metrics_port = 9140
+# Opt-in tracing of every query to <trace_dir>/lookup-<pid>.jsonl, None disables it
+trace_dir = None
+# `kill -USR1 <pid>` toggles a sampling profiler writing <profile_dir>/lookup-<pid>-<n>.folded
+profile_dir = "profiles"
+# LLM answering from the retrieved chunks
+llm_model = "google/flan-t5-small"
+# Attach to a running model server (`make model-server`) for the embedder and the LLM instead of loading them in
+# this process, e.g. ("127.0.0.1", 50055). Without a server listening, the models are loaded here.
+model_server_address = None
 
-# Initialize persistent vector DB
-chroma_client = ChromaClient(
-    collection_name="all_users_docs",
-    embedding_model_name=embedding_model
-)
+# Set by build_lookup() when attached to the model server
+model_server = None
+lookup = None
 
-lookup = Lookup(chroma_client)
+def build_chroma_client(model_name, collection_name):
+    return ChromaClient(
+        collection_name=collection_name,
+        embedding_model_name=model_name,
+        partition_mode=partition_mode,
+        num_shards=num_collection_shards,
+        backend=vector_backend,
+        local_store_path=local_vector_store_path,
+        read_only=True,
+        rescore_factor=vector_rescore_factor,
+        embedding_backend=embedding_backend,
+        embedding_model=RemoteEmbeddings(model_server, model_name, embedding_backend) if model_server else None,
+    )
+
+def build_lookup():
+    """Connects to the stores and loads (or attaches to) the models. Kept out of module scope so importing main is cheap."""
+    from lookup.lookup import Lookup
+
+    global model_server
+    if model_server_address is not None:
+        model_server = connect(model_server_address)
+    # Vector DB of the active embedding model
+    model_registry = ModelRegistry(redis.Redis(host="localhost", port=6379, decode_responses=True), embedding_model, "all_users_docs")
+    active_model = model_registry.active_or_default()
+    chroma_client = build_chroma_client(active_model["model"], active_model["collection"])
+
+    # Hybrid lexical + dense retrieval over the consumer's BM25 index (None for dense only)
+    bm25_store = BM25Store("bm25_index", read_only=True)
+    return Lookup(chroma_client, model_name=llm_model, bm25_store=bm25_store, hybrid_budget_ms=150.0,
+                  model_registry=model_registry, client_factory=build_chroma_client,
+                  llm_pipeline=RemotePipeline(model_server, llm_model) if model_server else None)
+
+def get_lookup():
+    global lookup
+    if lookup is None:
+        lookup = build_lookup()
+    return lookup
 
 def get_response_for_user(user_id: str, query: str, top_k : int = 5, debug: bool = True):
-    return lookup.generate_reponse(user_id, query, top_k)
+    return get_lookup().generate_reponse(user_id, query, top_k)
 
 # Terminal-based chat interface
 def chat_interface():
+    lookup = get_lookup()
     print(Fore.CYAN + Style.BRIGHT + "\n🚀 FS-RAG Chatbot (Terminal Edition) 🚀")
     print(Fore.YELLOW + "Type your questions below. Type 'exit' to quit.\n")
 
@@ -66,4 +128,9 @@ def chat_interface():
             print(Fore.RED + "⚠ Something went wrong. Please try again.")
 
 if __name__ == "__main__":
+    if metrics_port is not None:
+        start_metrics_server(metrics_port)
+    if trace_dir is not None:
+        tracing.configure(trace_dir, "lookup")
+    setup_process_profiling(profile_dir, "lookup")
     chat_interface()
\ No newline at end of file
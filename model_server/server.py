@@ -0,0 +1,214 @@
+"""
+Long-lived local process holding the embedding models and the LLM, shared by every lookup session and consumer.
+
+Starting a consumer or `make run` otherwise loads MiniLM (and flan-t5) into each process, which takes most of its
+startup time and a copy of the weights per process. With the model server running (`make model-server`), processes
+that set MODEL_SERVER_ADDRESS (`model_server_address` in main.py) attach to it instead:
+
+    RemoteEmbeddings : LangChain Embeddings interface, passed to ChromaClient(embedding_model=...)
+    RemotePipeline   : text2text-generation pipeline stand-in, passed to Lookup(llm_pipeline=...)
+
+Models are loaded on first use (or at start with --preload-*) and keyed by name, so clients on different models
+share one server. The transport is multiprocessing.managers (pickle over an authenticated socket): bind it to
+localhost only. There is no built-in key: the server takes it from $MODEL_SERVER_AUTHKEY, or generates one into a
+0600 key file (MODEL_SERVER_AUTHKEY_FILE) that clients started by the same user read. When no server is listening
+or no key is found, connect() returns None and callers load their own models as before.
+"""
+
+import os
+import sys
+import time
+import logging
+import secrets
+import argparse
+import threading
+from multiprocessing import AuthenticationError
+from multiprocessing.managers import BaseManager
+
+import numpy as np
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+MODEL_SERVER_ADDRESS = ("127.0.0.1", 50055)
+# Shared secret of the socket: the environment variable wins, else the key file the server writes at start
+MODEL_SERVER_AUTHKEY_ENV = "MODEL_SERVER_AUTHKEY"
+MODEL_SERVER_AUTHKEY_FILE = "model_server.key"
+
+
+def load_authkey(path=MODEL_SERVER_AUTHKEY_FILE):
+    """The model server key from the environment or the key file, None when neither is set."""
+    if os.environ.get(MODEL_SERVER_AUTHKEY_ENV):
+        return os.environ[MODEL_SERVER_AUTHKEY_ENV].encode("utf-8")
+    try:
+        with open(path, "rb") as f:
+            return f.read().strip() or None
+    except FileNotFoundError:
+        return None
+
+
+def create_authkey(path=MODEL_SERVER_AUTHKEY_FILE):
+    """The server's key: load_authkey(), else a random key written to path, readable by this user only."""
+    authkey = load_authkey(path)
+    if authkey is None:
+        authkey = secrets.token_hex(32).encode("utf-8")
+        fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(fd, "wb") as f:
+            f.write(authkey)
+        logging.info(f"[ModelServer] Wrote a new key to {path}.")
+    return authkey
+
+
+def _load_embedding_model(model_name, backend):
+    from indexing_and_embedding.embeddings import build_embedding_model
+    return build_embedding_model(model_name, backend)
+
+
+def _load_generator(model_name, max_new_tokens):
+    from transformers import pipeline
+    return pipeline("text2text-generation", model=model_name, tokenizer=model_name, max_new_tokens=max_new_tokens, device=-1)
+
+
+class _ModelCache:
+    def __init__(self, load):
+        self._load = load
+        self._models = {}
+        self._lock = threading.Lock()
+
+    def get(self, *key):
+        # Loading holds the lock, so concurrent first requests for a model load it once
+        with self._lock:
+            model = self._models.get(key)
+            if model is None:
+                start = time.perf_counter()
+                model = self._models[key] = self._load(*key)
+                logging.info(f"[ModelServer] Loaded {key} in {time.perf_counter() - start:.1f}s.")
+            return model
+
+    def loaded(self):
+        with self._lock:
+            return list(self._models)
+
+
+class EmbedderService:
+    """Embedding models of the server, one per (model name, backend)."""
+
+    def __init__(self, load_model=_load_embedding_model):
+        self._models = _ModelCache(load_model)
+
+    def embed_documents(self, model_name, backend, texts):
+        # float32 arrays pickle to a fraction of the size of nested float lists
+        return np.asarray(self._models.get(model_name, backend).embed_documents(list(texts)), dtype=np.float32)
+
+    def embed_query(self, model_name, backend, text):
+        return np.asarray(self._models.get(model_name, backend).embed_query(text), dtype=np.float32)
+
+    def loaded(self):
+        return self._models.loaded()
+
+
+class GeneratorService:
+    """text2text-generation pipelines of the server, one per (model name, max_new_tokens)."""
+
+    def __init__(self, load_pipeline=_load_generator):
+        self._pipelines = _ModelCache(load_pipeline)
+
+    def generate(self, model_name, max_new_tokens, prompts, kwargs):
+        return self._pipelines.get(model_name, max_new_tokens)(prompts, **kwargs)
+
+    def loaded(self):
+        return self._pipelines.loaded()
+
+
+class ModelServerClient(BaseManager):
+    pass
+
+
+ModelServerClient.register("embedder")
+ModelServerClient.register("generator")
+
+
+def build_server(embedder=None, generator=None, address=MODEL_SERVER_ADDRESS, authkey=None):
+    """Returns a multiprocessing.managers Server (call serve_forever()) sharing one embedder and one generator
+    service between all its clients."""
+    embedder = embedder or EmbedderService()
+    generator = generator or GeneratorService()
+    authkey = authkey or create_authkey()
+
+    class ModelServerManager(BaseManager):
+        pass
+
+    ModelServerManager.register("embedder", callable=lambda: embedder)
+    ModelServerManager.register("generator", callable=lambda: generator)
+    return ModelServerManager(address=tuple(address), authkey=authkey).get_server()
+
+
+def connect(address=MODEL_SERVER_ADDRESS, authkey=None):
+    """Connects to a running model server. Returns None when none is listening, callers then load their own models."""
+    authkey = authkey or load_authkey()
+    if authkey is None:
+        logging.warning(f"[ModelServer] No key in ${MODEL_SERVER_AUTHKEY_ENV} or {MODEL_SERVER_AUTHKEY_FILE}, loading models in-process.")
+        return None
+    client = ModelServerClient(address=tuple(address), authkey=authkey)
+    try:
+        client.connect()
+    except OSError as e:
+        logging.warning(f"[ModelServer] No model server at {address[0]}:{address[1]} ({e}), loading models in-process.")
+        return None
+    except AuthenticationError:
+        logging.warning(f"[ModelServer] The model server at {address[0]}:{address[1]} rejected our key, loading models in-process.")
+        return None
+    logging.info(f"[ModelServer] Attached to the model server at {address[0]}:{address[1]}.")
+    return client
+
+
+class RemoteEmbeddings:
+    """LangChain Embeddings interface computed by the model server."""
+
+    def __init__(self, client: ModelServerClient, model_name: str, backend: str = "torch"):
+        # Proxies open one connection per thread, so this object can be shared by query threads
+        self.embedder = client.embedder()
+        self.model_name = model_name
+        self.backend = backend
+
+    def embed_documents(self, texts):
+        return self.embedder.embed_documents(self.model_name, self.backend, list(texts)).tolist()
+
+    def embed_query(self, text):
+        return self.embedder.embed_query(self.model_name, self.backend, text).tolist()
+
+
+class RemotePipeline:
+    """Stands in for the transformers text2text-generation pipeline that Lookup wraps, generating on the model server."""
+
+    task = "text2text-generation"
+
+    def __init__(self, client: ModelServerClient, model_name: str, max_new_tokens: int = 200):
+        self.generator = client.generator()
+        self.model_name = model_name
+        self.max_new_tokens = max_new_tokens
+
+    def __call__(self, prompts, **kwargs):
+        return self.generator.generate(self.model_name, self.max_new_tokens, prompts, kwargs)
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    parser = argparse.ArgumentParser(description="Serve the embedding models and the LLM to local processes.")
+    parser.add_argument("--host", default=MODEL_SERVER_ADDRESS[0], help="Keep this on localhost, the protocol is pickle")
+    parser.add_argument("--port", type=int, default=MODEL_SERVER_ADDRESS[1])
+    parser.add_argument("--authkey-file", default=MODEL_SERVER_AUTHKEY_FILE,
+                        help=f"Key file written at start (mode 0600) unless ${MODEL_SERVER_AUTHKEY_ENV} is set")
+    parser.add_argument("--preload-embedder", nargs="*", default=["sentence-transformers/all-MiniLM-L6-v2"],
+                        help="Embedding models to load at start (torch backend)")
+    parser.add_argument("--preload-generator", nargs="*", default=["google/flan-t5-small"],
+                        help="LLMs to load at start (max_new_tokens=200, as Lookup uses)")
+    args = parser.parse_args()
+
+    embedder, generator = EmbedderService(), GeneratorService()
+    for model_name in args.preload_embedder:
+        embedder.embed_query(model_name, "torch", "warm up")
+    for model_name in args.preload_generator:
+        generator.generate(model_name, 200, ["warm up"], {})
+    server = build_server(embedder, generator, (args.host, args.port), create_authkey(args.authkey_file))
+    logging.info(f"[ModelServer] Serving on {args.host}:{args.port}.")
+    server.serve_forever()
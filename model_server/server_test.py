@@ -0,0 +1,74 @@
+# model_server/server_test.py
+import os
+import stat
+import threading
+
+import numpy as np
+import pytest
+
+from benchmarks.stand_ins import HashingEmbeddings, StubGenerator
+from model_server.server import (EmbedderService, GeneratorService, RemoteEmbeddings, RemotePipeline, build_server, connect,
+                                 create_authkey, load_authkey)
+
+AUTHKEY = b"test"
+
+
+@pytest.fixture
+def server():
+    loads = []
+
+    def load_embedder(model_name, backend):
+        loads.append((model_name, backend))
+        return HashingEmbeddings(dim=16)
+
+    server = build_server(EmbedderService(load_embedder), GeneratorService(lambda name, tokens: StubGenerator(3)),
+                          address=("127.0.0.1", 0), authkey=AUTHKEY)
+    # serve_forever() ends with sys.exit(), so the daemon thread is left to exit with the test process
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    server.loads = loads
+    return server
+
+
+def test_clients_share_the_server_models(server):
+    first, second = connect(server.address, AUTHKEY), connect(server.address, AUTHKEY)
+    local = HashingEmbeddings(dim=16)
+
+    embeddings = RemoteEmbeddings(first, "mini")
+    vectors = embeddings.embed_documents(["a b c", "d e"])
+    assert np.allclose(vectors, local.embed_documents(["a b c", "d e"]))
+    assert isinstance(vectors[0], list)
+    assert np.allclose(RemoteEmbeddings(second, "mini").embed_query("a b c"), local.embed_query("a b c"))
+    assert server.loads == [("mini", "torch")]
+
+
+def test_remote_pipeline_answers_like_a_text2text_pipeline(server):
+    pipeline = RemotePipeline(connect(server.address, AUTHKEY), "flan")
+    assert pipeline.task == "text2text-generation"
+    assert pipeline(["question one two three four"]) == [[{"generated_text": "two three four"}]]
+
+
+def test_connect_returns_none_without_a_server():
+    assert connect(("127.0.0.1", 1), AUTHKEY) is None
+
+
+def test_server_key_is_generated_into_a_private_file(tmp_path, monkeypatch):
+    monkeypatch.delenv("MODEL_SERVER_AUTHKEY", raising=False)
+    path = str(tmp_path / "model_server.key")
+    assert load_authkey(path) is None
+
+    authkey = create_authkey(path)
+
+    assert len(authkey) == 64 and authkey != create_authkey(str(tmp_path / "other.key"))
+    assert stat.S_IMODE(os.stat(path).st_mode) == 0o600
+    assert create_authkey(path) == load_authkey(path) == authkey
+    monkeypatch.setenv("MODEL_SERVER_AUTHKEY", "from-env")
+    assert load_authkey(path) == b"from-env"
+
+
+def test_connect_needs_the_server_key(server, monkeypatch, tmp_path):
+    monkeypatch.delenv("MODEL_SERVER_AUTHKEY", raising=False)
+    monkeypatch.chdir(tmp_path)
+    assert connect(server.address) is None
+    assert connect(server.address, b"wrong") is None
+    monkeypatch.setenv("MODEL_SERVER_AUTHKEY", AUTHKEY.decode())
+    assert RemoteEmbeddings(connect(server.address), "mini").embed_query("a") is not None
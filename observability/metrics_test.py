@@ -0,0 +1,102 @@
+# observability/metrics_test.py
+import threading
+import urllib.request
+import pytest
+
+from observability.metrics import MetricsRegistry, ThreadTimer, start_metrics_server
+
+
+def test_counter_and_gauge_render_in_prometheus_format():
+    registry = MetricsRegistry()
+    messages = registry.counter("messages_total", "Messages processed.", ["result"])
+    messages.labels(result="ok").inc()
+    messages.labels(result="ok").inc(2)
+    messages.labels(result="invalid").inc()
+    pending = registry.gauge("pending_messages", "Pending messages.")
+    pending.set(7)
+
+    text = registry.render()
+    assert "# TYPE messages_total counter" in text
+    assert 'messages_total{result="ok"} 3.0' in text
+    assert 'messages_total{result="invalid"} 1.0' in text
+    assert "pending_messages 7.0" in text
+
+
+def test_histogram_buckets_are_cumulative():
+    registry = MetricsRegistry()
+    latency = registry.histogram("stage_seconds", "Stage latency.", ["stage"], buckets=(0.1, 1.0))
+    for value in (0.05, 0.1, 0.5, 3.0):
+        latency.labels(stage="embed").observe(value)
+
+    text = registry.render()
+    assert 'stage_seconds_bucket{stage="embed",le="0.1"} 2' in text
+    assert 'stage_seconds_bucket{stage="embed",le="1.0"} 3' in text
+    assert 'stage_seconds_bucket{stage="embed",le="+Inf"} 4' in text
+    assert 'stage_seconds_count{stage="embed"} 4' in text
+    assert 'stage_seconds_sum{stage="embed"} 3.65' in text
+
+
+def test_label_mismatch_and_conflicting_registration_are_rejected():
+    registry = MetricsRegistry()
+    stages = registry.histogram("stage_seconds", "Stage latency.", ["stage"])
+    with pytest.raises(ValueError):
+        stages.labels(shard=0)
+    with pytest.raises(ValueError):
+        stages.observe(1.0)
+    assert registry.histogram("stage_seconds", "Stage latency.", ["stage"]) is stages
+    with pytest.raises(ValueError):
+        registry.counter("stage_seconds", "Stage latency.", ["stage"])
+
+
+def test_removed_series_are_no_longer_exported():
+    registry = MetricsRegistry()
+    lag = registry.gauge("stream_lag", "Lag.", ["shard"])
+    lag.labels(shard=0).set(1)
+    lag.labels(shard=1).set(2)
+    lag.remove(shard=0)
+    text = registry.render()
+    assert 'stream_lag{shard="0"}' not in text
+    assert 'stream_lag{shard="1"} 2.0' in text
+
+
+def test_concurrent_increments_are_not_lost():
+    registry = MetricsRegistry()
+    counter = registry.counter("hits_total", "Hits.")
+
+    def work():
+        for _ in range(10000):
+            counter.inc()
+
+    threads = [threading.Thread(target=work) for _ in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert "hits_total 40000.0" in registry.render()
+
+
+def test_thread_timer_is_per_thread():
+    timer = ThreadTimer()
+    timer.add(1.5)
+    other = []
+    t = threading.Thread(target=lambda: other.append(timer.take()))
+    t.start()
+    t.join()
+    assert other == [0.0]
+    assert timer.take() == 1.5
+    assert timer.take() == 0.0
+
+
+def test_http_endpoint_serves_metrics():
+    registry = MetricsRegistry()
+    registry.counter("requests_total", "Requests.").inc()
+    server = start_metrics_server(0, registry=registry)
+    try:
+        port = server.server_address[1]
+        with urllib.request.urlopen(f"http://127.0.0.1:{port}/metrics", timeout=5) as response:
+            assert response.headers["Content-Type"].startswith("text/plain")
+            assert "requests_total 1.0" in response.read().decode()
+        assert start_metrics_server(port, registry=registry) is None
+    finally:
+        server.shutdown()
+        server.server_close()
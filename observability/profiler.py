@@ -0,0 +1,111 @@
+"""
+Sampling profiler for one process. It writes folded stacks ("frame;frame;frame count" lines) that flamegraph.pl,
+inferno or speedscope turn into a flame graph.
+
+A daemon thread reads every other thread's Python stack with sys._current_frames() every interval_s. The profiled
+code is not instrumented, so nothing is paid while the profiler is off. Samples are wall-clock: threads blocked on
+Redis, the Chroma HTTP server or native code (torch) show up at the Python frame that is waiting.
+
+Start it from a flag (profile from launch, write on exit), or toggle it on a running worker with SIGUSR1:
+`kill -USR1 <pid>` starts sampling and a second signal writes <output_dir>/<service>-<pid>-<n>.folded.
+"""
+
+import os
+import sys
+import atexit
+import signal
+import logging
+import threading
+from collections import Counter
+
+DEFAULT_INTERVAL_S = 0.005
+
+
+def _frame_label(code) -> str:
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+class SamplingProfiler:
+    def __init__(self, output_path: str, interval_s: float = DEFAULT_INTERVAL_S):
+        self.output_path = output_path
+        self.interval_s = interval_s
+        self.samples = Counter()
+        self._stop = threading.Event()
+        self._thread = None
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None
+
+    def start(self):
+        if self.running:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="sampling-profiler", daemon=True)
+        self._thread.start()
+        logging.info(f"[Profiler] Sampling every {self.interval_s * 1000:.1f} ms, output {self.output_path}")
+
+    def stop(self) -> str:
+        """Stops sampling and writes the folded stacks. Returns the output path."""
+        if not self.running:
+            return self.output_path
+        self._stop.set()
+        self._thread.join()
+        self._thread = None
+        self.write()
+        return self.output_path
+
+    def write(self):
+        if os.path.dirname(self.output_path):
+            os.makedirs(os.path.dirname(self.output_path), exist_ok=True)
+        with open(self.output_path, "w", encoding="utf-8") as f:
+            for stack, count in self.samples.most_common():
+                f.write(f"{stack} {count}\n")
+        logging.info(f"[Profiler] Wrote {sum(self.samples.values())} samples to {self.output_path}")
+
+    def _run(self):
+        while not self._stop.wait(self.interval_s):
+            self.sample()
+
+    def sample(self):
+        """Adds one sample of every thread except the sampler itself."""
+        own_id = threading.get_ident()
+        names = {t.ident: t.name for t in threading.enumerate()}
+        for thread_id, frame in sys._current_frames().items():
+            if thread_id == own_id:
+                continue
+            stack = []
+            while frame is not None:
+                stack.append(_frame_label(frame.f_code))
+                frame = frame.f_back
+            stack.append(names.get(thread_id, f"thread-{thread_id}"))
+            self.samples[";".join(reversed(stack))] += 1
+
+
+def setup_process_profiling(output_dir: str, service: str, profile_from_start: bool = False,
+                            interval_s: float = DEFAULT_INTERVAL_S, signum=getattr(signal, "SIGUSR1", None)):
+    """Installs the SIGUSR1 toggle for this process and, with profile_from_start, profiles until exit.
+
+    Must be called from the main thread of the process (signal handlers can only be installed there).
+    """
+    pid = os.getpid()
+    state = {"profiler": None, "runs": 0}
+
+    def new_profiler():
+        state["runs"] += 1
+        return SamplingProfiler(os.path.join(output_dir, f"{service}-{pid}-{state['runs']}.folded"), interval_s)
+
+    def toggle(signum=None, frame=None):
+        profiler = state["profiler"]
+        if profiler is not None and profiler.running:
+            profiler.stop()
+        else:
+            state["profiler"] = new_profiler()
+            state["profiler"].start()
+
+    if signum is not None:
+        signal.signal(signum, toggle)
+    if profile_from_start:
+        toggle()
+        atexit.register(lambda: state["profiler"].stop() if state["profiler"] is not None else None)
+    return toggle
@@ -0,0 +1,40 @@
+# observability/profiler_test.py
+import time
+import threading
+
+from observability.profiler import SamplingProfiler, setup_process_profiling
+
+
+def busy_wait(stop):
+    while not stop.is_set():
+        sum(range(1000))
+
+
+def test_folded_stacks_name_the_sampled_functions(tmp_path):
+    stop = threading.Event()
+    worker = threading.Thread(target=busy_wait, args=(stop,), name="embed-worker")
+    worker.start()
+    profiler = SamplingProfiler(str(tmp_path / "out.folded"), interval_s=0.001)
+    try:
+        for _ in range(20):
+            profiler.sample()
+    finally:
+        stop.set()
+        worker.join()
+    profiler.write()
+
+    lines = (tmp_path / "out.folded").read_text().splitlines()
+    worker_lines = [line for line in lines if line.startswith("embed-worker;")]
+    assert worker_lines
+    stack, count = worker_lines[0].rsplit(" ", 1)
+    assert "busy_wait (profiler_test.py:" in stack
+    assert sum(int(line.rsplit(" ", 1)[1]) for line in worker_lines) == 20
+
+
+def test_toggle_starts_then_writes_a_profile(tmp_path):
+    toggle = setup_process_profiling(str(tmp_path), "consumer", signum=None, interval_s=0.001)
+    toggle()
+    time.sleep(0.05)
+    toggle()
+    [path] = tmp_path.glob("consumer-*-1.folded")
+    assert path.read_text().strip()
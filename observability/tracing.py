@@ -0,0 +1,225 @@
+"""
+Opt-in tracing: spans written as JSON lines to a local file, one file per process.
+
+A span records its name, trace id, parent span id, start time (epoch seconds), duration and attributes. Trace ids
+cross process boundaries in the `trace` field of stream messages ("<trace_id>-<span_id>", see span_context()), so
+the producer spans of a file and the consumer batch that made its chunks searchable end up in the same trace.
+scripts/export_traces.py merges the files of all processes into one Chrome / Perfetto trace.
+
+Spans are buffered and written every flush_every spans or flush_interval seconds, whichever comes first, so a
+worker that is killed loses at most the last few seconds of spans. Workers also call shutdown() on their way out:
+multiprocessing children skip atexit handlers.
+
+Until configure() is called span() returns a shared no-op object, so instrumented code pays one function call and
+one global check.
+"""
+
+import os
+import json
+import time
+import atexit
+import random
+import logging
+import threading
+import contextvars
+
+_current_span = contextvars.ContextVar("current_span", default=None)
+_exporter = None
+_service = None
+_sample_rate = 1.0
+
+
+class JsonlSpanExporter:
+    """Appends finished spans to a JSON-lines file, buffered so tracing does not add a write per span."""
+
+    def __init__(self, path: str, flush_every: int = 256, flush_interval: float = 5.0):
+        self.path = path
+        self.flush_every = flush_every
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._file = open(path, "a", encoding="utf-8")
+        self._buffer = []
+        self._lock = threading.Lock()
+        self._closed = threading.Event()
+        if flush_interval:
+            threading.Thread(target=self._flush_loop, args=(flush_interval,), name="trace-flush", daemon=True).start()
+
+    def _flush_loop(self, interval: float):
+        while not self._closed.wait(interval):
+            self.flush()
+
+    def export(self, record: dict):
+        line = json.dumps(record, default=str)
+        with self._lock:
+            self._buffer.append(line)
+            if len(self._buffer) >= self.flush_every:
+                self._flush_locked()
+
+    def flush(self):
+        with self._lock:
+            self._flush_locked()
+
+    def close(self):
+        self._closed.set()
+        with self._lock:
+            self._flush_locked()
+            self._file.close()
+
+    def _flush_locked(self):
+        if self._buffer and not self._file.closed:
+            self._file.write("\n".join(self._buffer) + "\n")
+            self._file.flush()
+            self._buffer = []
+
+
+def _new_id(bits: int) -> str:
+    return f"{random.getrandbits(bits):0{bits // 4}x}"
+
+
+def _parse_context(context: str):
+    trace_id, _, span_id = context.partition("-")
+    return trace_id, span_id or None
+
+
+class Span:
+    __slots__ = ("name", "trace_id", "span_id", "parent_id", "attributes", "start", "_start_perf", "_token")
+
+    def __init__(self, name, trace_id, parent_id, attributes):
+        self.name = name
+        self.trace_id = trace_id
+        self.span_id = _new_id(64)
+        self.parent_id = parent_id
+        self.attributes = attributes
+        self._token = None
+
+    @property
+    def context(self) -> str:
+        """Propagation string for another process: pass it as span(..., parent=context) there."""
+        return f"{self.trace_id}-{self.span_id}"
+
+    def set_attribute(self, key, value):
+        self.attributes[key] = value
+
+    def __enter__(self):
+        self.start = time.time()
+        self._start_perf = time.perf_counter()
+        self._token = _current_span.set(self)
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        duration = time.perf_counter() - self._start_perf
+        _current_span.reset(self._token)
+        if exc_type is not None:
+            self.attributes["error"] = f"{exc_type.__name__}: {exc}"
+        _export(self.name, self.trace_id, self.span_id, self.parent_id, self.start, duration, self.attributes)
+        return False
+
+
+class _NoopSpan:
+    context = None
+
+    def set_attribute(self, key, value):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+_NOOP_SPAN = _NoopSpan()
+# Marks a root span that lost the sampling draw, so its children are dropped too
+_UNSAMPLED = object()
+
+
+class _UnsampledSpan(_NoopSpan):
+    def __enter__(self):
+        self._token = _current_span.set(_UNSAMPLED)
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        _current_span.reset(self._token)
+        return False
+
+
+def configure(trace_dir: str, service: str, sample_rate: float = 1.0):
+    """Starts exporting spans of this process to <trace_dir>/<service>-<pid>.jsonl.
+
+    sample_rate is the fraction of root spans (new traces) kept; spans continuing a trace from a stream message
+    follow the sampling decision already taken by the producer.
+    """
+    global _exporter, _service, _sample_rate
+    shutdown()
+    _exporter = JsonlSpanExporter(os.path.join(trace_dir, f"{service}-{os.getpid()}.jsonl"))
+    _service = service
+    _sample_rate = sample_rate
+    atexit.unregister(shutdown)
+    atexit.register(shutdown)
+    logging.info(f"[Tracing] Writing spans to {_exporter.path} (sample rate {sample_rate}).")
+
+
+def shutdown():
+    """Flushes and closes the exporter; span() is a no-op again afterwards."""
+    global _exporter
+    exporter, _exporter = _exporter, None
+    if exporter is not None:
+        exporter.close()
+
+
+def enabled() -> bool:
+    return _exporter is not None
+
+
+def span(name: str, parent: str = None, **attributes):
+    """Context manager timing one operation.
+
+    The span is a child of the current span of this thread / task, or of parent, a context string carried over
+    from another process. Without a parent it starts a new trace.
+    """
+    if _exporter is None:
+        return _NOOP_SPAN
+    if parent is not None:
+        trace_id, parent_id = _parse_context(parent)
+        return Span(name, trace_id, parent_id, attributes)
+    current = _current_span.get()
+    if current is _UNSAMPLED:
+        return _NOOP_SPAN
+    if current is None:
+        if _sample_rate < 1.0 and random.random() >= _sample_rate:
+            return _UnsampledSpan()
+        return Span(name, _new_id(128), None, attributes)
+    return Span(name, current.trace_id, current.span_id, attributes)
+
+
+def span_context():
+    """Context string of the current span, for the stream message of a chunk (None when not traced)."""
+    current = _current_span.get()
+    return current.context if isinstance(current, Span) else None
+
+
+def record_span(name: str, parent: str, start: float, duration: float, **attributes):
+    """Exports an already finished span under a remote parent, e.g. the consumer work on chunks of one producer
+    trace, which is shared with other traces in the same batch."""
+    if _exporter is None or not parent:
+        return
+    trace_id, parent_id = _parse_context(parent)
+    _export(name, trace_id, _new_id(64), parent_id, start, duration, attributes)
+
+
+def _export(name, trace_id, span_id, parent_id, start, duration, attributes):
+    exporter = _exporter
+    if exporter is None:
+        return
+    exporter.export({
+        "name": name,
+        "trace_id": trace_id,
+        "span_id": span_id,
+        "parent_id": parent_id,
+        "service": _service,
+        "pid": os.getpid(),
+        "thread": threading.current_thread().name,
+        "start": start,
+        "duration_ms": duration * 1000,
+        "attributes": attributes,
+    })
@@ -0,0 +1,83 @@
+# observability/tracing_test.py
+import json
+import time
+import pytest
+
+from observability import tracing
+
+
+@pytest.fixture
+def trace_dir(tmp_path):
+    tracing.configure(str(tmp_path), "test")
+    yield tmp_path
+    tracing.shutdown()
+
+
+def read_spans(trace_dir):
+    tracing.shutdown()
+    [path] = trace_dir.glob("test-*.jsonl")
+    return {span["name"]: span for span in map(json.loads, path.read_text().splitlines())}
+
+
+def test_disabled_tracing_is_a_shared_no_op():
+    tracing.shutdown()
+    first, second = tracing.span("a"), tracing.span("b", parent="abc-def")
+    assert first is second
+    with first as span:
+        span.set_attribute("ignored", 1)
+        assert tracing.span_context() is None
+    tracing.record_span("c", "abc-def", 0.0, 1.0)
+
+
+def test_nested_spans_share_the_trace(trace_dir):
+    with tracing.span("producer.file", kind="text") as file_span:
+        with tracing.span("producer.publish", chunks=3):
+            assert tracing.span_context().startswith(file_span.trace_id)
+
+    spans = read_spans(trace_dir)
+    parent, child = spans["producer.file"], spans["producer.publish"]
+    assert parent["parent_id"] is None
+    assert child["trace_id"] == parent["trace_id"]
+    assert child["parent_id"] == parent["span_id"]
+    assert child["attributes"] == {"chunks": 3}
+    assert parent["service"] == "test"
+
+
+def test_context_continues_a_trace_from_another_process(trace_dir):
+    with tracing.span("producer.file") as file_span:
+        context = file_span.context
+    with tracing.span("consumer.batch") as batch_span:
+        tracing.record_span("consumer.chunks", context, 123.0, 0.5, chunks=2, batch=batch_span.context)
+
+    spans = read_spans(trace_dir)
+    chunks = spans["consumer.chunks"]
+    assert (chunks["trace_id"], chunks["parent_id"]) == (spans["producer.file"]["trace_id"], spans["producer.file"]["span_id"])
+    assert chunks["duration_ms"] == 500.0
+    assert spans["consumer.batch"]["trace_id"] != chunks["trace_id"]
+
+
+def test_errors_are_recorded(trace_dir):
+    with pytest.raises(RuntimeError):
+        with tracing.span("chroma.upsert"):
+            raise RuntimeError("server down")
+    assert read_spans(trace_dir)["chroma.upsert"]["attributes"]["error"] == "RuntimeError: server down"
+
+
+def test_unsampled_traces_drop_their_children(tmp_path):
+    tracing.configure(str(tmp_path), "test", sample_rate=0.0)
+    with tracing.span("root"):
+        assert tracing.span("child") is tracing.span("other child")
+        assert tracing.span_context() is None
+    assert read_spans(tmp_path) == {}
+
+
+def test_buffered_spans_are_flushed_on_a_timer(tmp_path):
+    exporter = tracing.JsonlSpanExporter(str(tmp_path / "spans.jsonl"), flush_every=256, flush_interval=0.05)
+    exporter.export({"name": "consumer.batch"})
+
+    deadline = time.time() + 2
+    while not (tmp_path / "spans.jsonl").read_text() and time.time() < deadline:
+        time.sleep(0.01)
+
+    assert json.loads((tmp_path / "spans.jsonl").read_text()) == {"name": "consumer.batch"}
+    exporter.close()
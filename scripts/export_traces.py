@@ -0,0 +1,71 @@
+# Merges the span files written with TRACE_DIR set (observability/tracing.py) into one Chrome trace-event file that
+# chrome://tracing or https://ui.perfetto.dev opens, and prints where the time went per span name.
+#
+# uv run python scripts/export_traces.py --trace-dir traces --output traces/trace.json
+# uv run python scripts/export_traces.py --trace-dir traces --trace-id <id>   # one file's journey only
+
+import os
+import sys
+import glob
+import json
+import argparse
+from collections import defaultdict
+
+
+def load_spans(trace_dir, trace_id=None):
+    spans = []
+    for path in sorted(glob.glob(os.path.join(trace_dir, "*.jsonl"))):
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                span = json.loads(line)
+                if trace_id is None or span["trace_id"] == trace_id:
+                    spans.append(span)
+    return spans
+
+
+def to_trace_events(spans):
+    """Chrome trace-event "complete" events: one row per process / thread, timestamps in microseconds."""
+    events = []
+    for span in spans:
+        events.append({
+            "name": span["name"],
+            "cat": span["service"] or "",
+            "ph": "X",
+            "ts": span["start"] * 1e6,
+            "dur": span["duration_ms"] * 1e3,
+            "pid": f"{span['service']}-{span['pid']}",
+            "tid": span["thread"],
+            "args": {"trace_id": span["trace_id"], "span_id": span["span_id"], "parent_id": span["parent_id"], **span["attributes"]},
+        })
+    return events
+
+
+def summarize(spans):
+    durations = defaultdict(list)
+    for span in spans:
+        durations[span["name"]].append(span["duration_ms"])
+    print(f"{'span':<32} {'count':>8} {'total_s':>10} {'p50_ms':>10} {'p95_ms':>10}")
+    for name, values in sorted(durations.items(), key=lambda item: -sum(item[1])):
+        values.sort()
+        p50 = values[len(values) // 2]
+        p95 = values[min(len(values) - 1, int(len(values) * 0.95))]
+        print(f"{name:<32} {len(values):>8} {sum(values) / 1000:>10.2f} {p50:>10.1f} {p95:>10.1f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Merge span files into a Chrome / Perfetto trace.")
+    parser.add_argument("--trace-dir", default="traces")
+    parser.add_argument("--output", default=None, help="Defaults to <trace-dir>/trace.json")
+    parser.add_argument("--trace-id", default=None, help="Only export the spans of this trace.")
+    args = parser.parse_args()
+
+    spans = load_spans(args.trace_dir, args.trace_id)
+    if not spans:
+        sys.exit(f"No spans found in {args.trace_dir}.")
+    output = args.output or os.path.join(args.trace_dir, "trace.json")
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump({"traceEvents": to_trace_events(spans), "displayTimeUnit": "ms"}, f)
+    print(f"Wrote {len(spans)} spans to {output}")
+    summarize(spans)
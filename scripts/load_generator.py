@@ -0,0 +1,414 @@
+# Load generator and soak test for a running deployment. It needs Redis, `make ingestion-producer`,
+# `make ingestion-consumer` and, for the http backend, `make start-chroma-server`. Files are uploaded into
+# data/<user>/<text|image>/ following an upload pattern, while query threads run against the same Lookup that
+# `make run` builds (main.py). Every --sample-interval a line is appended to samples.jsonl:
+#   - uploads, files published by the producer and files made searchable by the consumer in the window;
+#   - the stream backlog (undelivered + unacked entries of every shard);
+#   - query latency percentiles of the window;
+#   - RSS of this process and of every producer / consumer process (read from /proc).
+# At the end, summary.json holds:
+#   - ingest lag (upload -> published) and time-to-searchable (upload -> every chunk in the vector store) percentiles;
+#   - query latency percentiles and the share of queries whose sources contain the uploaded answer;
+#   - RSS growth per process in MB/hour;
+#   - searchable files per minute in the first and last third of the run, which shows throughput collapse.
+#
+# Patterns: trickle (Poisson arrivals at --uploads-per-min), burst (--burst-size files for one user every
+# --burst-interval s), heavy_user (80% of uploads from the first user), mixed (trickle with --image-fraction 0.3).
+# Text uploads are books from data/books (or synthetic text when there are none) with one appended fact,
+# "The code of <word> is <number>.", which the queries ask for once the file is searchable.
+#
+# uv run python scripts/load_generator.py --pattern mixed --duration 2h --uploads-per-min 30 --qps 2
+# uv run python scripts/load_generator.py --pattern burst --burst-size 50 --duration 30m --no-queries
+
+import os
+import sys
+import json
+import time
+import random
+import string
+import shutil
+import logging
+import argparse
+import threading
+from datetime import datetime
+
+import numpy as np
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Same users the producer watches (ingestion/producer.py)
+DEFAULT_USERS = ["user_a", "user_b", "user_c", "user_d", "user_e"]
+DATA_DIR = "data"
+STAGING_DIR = os.path.join(DATA_DIR, ".loadgen_staging")  # not a user directory, so producers never read it
+PROCESS_MARKERS = {"producer": "ingestion/producer.py", "consumer": "ingestion/consumer.py"}
+GENERIC_QUESTION = "What is this document about?"
+
+logger = logging.getLogger("load_generator")
+
+
+def parse_duration(value: str) -> float:
+    """'90', '90s', '15m', '2h' -> seconds."""
+    units = {"s": 1, "m": 60, "h": 3600}
+    if value[-1] in units:
+        return float(value[:-1]) * units[value[-1]]
+    return float(value)
+
+
+def percentiles(values, prefix):
+    if not values:
+        return {}
+    p50, p95, p99 = np.percentile(values, [50, 95, 99])
+    return {f"{prefix}_p50": float(p50), f"{prefix}_p95": float(p95), f"{prefix}_p99": float(p99), f"{prefix}_max": float(max(values))}
+
+
+# --- /proc sampling ---
+
+def process_rss_mb(pid):
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except (FileNotFoundError, ProcessLookupError, PermissionError):
+        return None
+    return None
+
+
+def _process_table():
+    """pid -> (ppid, cmdline) of every visible process."""
+    table = {}
+    for entry in os.listdir("/proc"):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entry}/cmdline", "rb") as f:
+                cmdline = f.read().replace(b"\0", b" ").decode("utf-8", "replace")
+            with open(f"/proc/{entry}/stat") as f:
+                ppid = int(f.read().rsplit(")", 1)[1].split()[1])
+        except (FileNotFoundError, ProcessLookupError, PermissionError, IndexError, ValueError):
+            continue
+        table[int(entry)] = (ppid, cmdline)
+    return table
+
+
+def find_service_processes():
+    """{"producer-<pid>": pid, "consumer-<pid>": pid, ...} for the launcher processes and their spawned workers."""
+    table = _process_table()
+    children = {}
+    for pid, (ppid, _) in table.items():
+        children.setdefault(ppid, []).append(pid)
+    found = {}
+    for pid, (_, cmdline) in table.items():
+        for service, marker in PROCESS_MARKERS.items():
+            if marker in cmdline and pid != os.getpid():
+                stack = [pid]
+                while stack:
+                    current = stack.pop()
+                    found[f"{service}-{current}"] = current
+                    stack.extend(children.get(current, []))
+    return found
+
+
+# --- uploads ---
+
+class UploadSource:
+    """Pool of file contents to upload: books from --text-source (synthetic text if empty) and images."""
+
+    def __init__(self, text_source, image_source, rng, need_images):
+        self.rng = rng
+        self.texts = sorted(os.path.join(text_source, f) for f in os.listdir(text_source)) if os.path.isdir(text_source) else []
+        if not self.texts:
+            from benchmarks.synthetic_corpus import generate_text_files
+            logger.info(f"No books in '{text_source}', uploading synthetic text.")
+            self.texts = generate_text_files(os.path.join(STAGING_DIR, "pool"), num_users=1, files_per_user=50).text_files
+        self.images = []
+        if need_images:
+            if os.path.isdir(image_source):
+                self.images = sorted(os.path.join(image_source, f) for f in os.listdir(image_source)
+                                     if f.endswith((".png", ".jpg")))  # the extensions the producer picks up
+            if not self.images:
+                from benchmarks.synthetic_corpus import generate_image_files
+                logger.info(f"No images in '{image_source}', uploading synthetic images.")
+                self.images = generate_image_files(os.path.join(STAGING_DIR, "pool"), num_users=1, images_per_user=40).image_files
+
+    def write(self, kind, user_id, name):
+        """Stages a file and moves it into the user's directory in one rename, so producers never see it half
+        written. Returns (path as the producer sees it, question, expected answer)."""
+        image = self.rng.choice(self.images) if kind == "image" else None
+        ext = os.path.splitext(image)[1] if image else ".txt"
+        path = os.path.join(DATA_DIR, user_id, kind, name + ext)
+        staged = os.path.join(STAGING_DIR, name + ext)
+        question = answer = None
+        if image:
+            shutil.copyfile(image, staged)
+        else:
+            word = "".join(self.rng.choice(string.ascii_lowercase) for _ in range(10))
+            answer = str(self.rng.randint(100000, 999999))
+            question = f"What is the code of {word}?"
+            with open(self.rng.choice(self.texts), encoding="utf-8", errors="ignore") as src, open(staged, "w") as dst:
+                shutil.copyfileobj(src, dst)
+                dst.write(f"\n\nThe code of {word} is {answer}.\n")
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        os.replace(staged, path)
+        return path, question, answer
+
+
+def upload_schedule(args, rng):
+    """Yields (seconds to wait, user_id, kind) for the chosen pattern, forever."""
+    users, rate = args.users, args.uploads_per_min / 60
+    image_fraction = args.image_fraction if args.image_fraction is not None else (0.3 if args.pattern == "mixed" else 0.0)
+
+    def kind():
+        return "image" if rng.random() < image_fraction else "text"
+
+    while True:
+        if args.pattern == "burst":
+            user_id = rng.choice(users)
+            for i in range(args.burst_size):
+                yield (args.burst_interval if i == 0 else 0.0), user_id, kind()
+        elif args.pattern == "heavy_user":
+            user_id = users[0] if len(users) == 1 or rng.random() < 0.8 else rng.choice(users[1:])
+            yield rng.expovariate(rate), user_id, kind()
+        else:  # trickle, mixed
+            yield rng.expovariate(rate), rng.choice(users), kind()
+
+
+class Upload:
+    __slots__ = ("path", "user_id", "kind", "question", "answer", "uploaded_at", "published_at", "searchable_at")
+
+    def __init__(self, path, user_id, kind, question, answer):
+        self.path, self.user_id, self.kind, self.question, self.answer = path, user_id, kind, question, answer
+        self.uploaded_at = time.time()
+        self.published_at = None
+        self.searchable_at = None
+
+
+class LoadGenerator:
+    def __init__(self, args):
+        import redis
+        import ingestion.consumer as consumer_config
+        from ingestion.stream_sharding import ShardRouter
+
+        self.args = args
+        self.rng = random.Random(args.seed)
+        self.run_id = datetime.now().strftime("%Y%m%d%H%M%S")
+        self.redis_client = redis.Redis(host=args.redis_host, port=args.redis_port, decode_responses=True)
+        self.router = ShardRouter(consumer_config.REDIS_SHARD_NODES, consumer_config.NUM_STREAM_SHARDS, consumer_config.STREAM_KEY)
+        self.consumer_group = consumer_config.CONSUMER_GROUP
+        os.makedirs(STAGING_DIR, exist_ok=True)
+        self.source = UploadSource(args.text_source, args.image_source, self.rng,
+                                   need_images=args.pattern == "mixed" or bool(args.image_fraction))
+        self.lock = threading.Lock()
+        self.uploads = []
+        self.pending = []  # uploads not searchable yet
+        self.searchable_facts = []  # text uploads that are searchable, the queries ask for their fact
+        self.query_samples = []  # (finished_at, seconds, ok, answer_found)
+        self.stop = threading.Event()
+        self.lookup = None
+
+    # --- threads ---
+    def upload_loop(self):
+        for n, (wait, user_id, kind) in enumerate(upload_schedule(self.args, self.rng)):
+            if self.stop.wait(wait):
+                return
+            try:
+                path, question, answer = self.source.write(kind, user_id, f"loadgen_{self.run_id}_{n}")
+            except OSError as e:
+                logger.error(f"Upload failed: {e}")
+                continue
+            upload = Upload(path, user_id, kind, question, answer)
+            with self.lock:
+                self.uploads.append(upload)
+                self.pending.append(upload)
+
+    def track_loop(self):
+        """Polls the producer's published_files:<user> and the consumer's processed_files:<user> sets."""
+        while not self.stop.wait(self.args.poll_interval):
+            with self.lock:
+                pending = list(self.pending)
+            if not pending:
+                continue
+            pipe = self.redis_client.pipeline(transaction=False)
+            for upload in pending:
+                pipe.sismember(f"published_files:{upload.user_id}", upload.path)
+                pipe.sismember(f"processed_files:{upload.user_id}", upload.path)
+            flags = pipe.execute()
+            now = time.time()
+            with self.lock:
+                for i, upload in enumerate(pending):
+                    published, searchable = flags[2 * i], flags[2 * i + 1]
+                    if (published or searchable) and upload.published_at is None:
+                        upload.published_at = now
+                    if searchable:
+                        upload.searchable_at = now
+                        self.pending.remove(upload)
+                        if upload.question:
+                            self.searchable_facts.append(upload)
+
+    def query_loop(self):
+        interval = self.args.query_concurrency / self.args.qps
+        next_at = time.monotonic()
+        while not self.stop.is_set():
+            next_at += interval
+            with self.lock:
+                target = self.rng.choice(self.searchable_facts) if self.searchable_facts else None
+            user_id = target.user_id if target else self.rng.choice(self.args.users)
+            question = target.question if target else GENERIC_QUESTION
+            start = time.perf_counter()
+            ok, found = True, None
+            try:
+                result = self.lookup.generate_reponse(user_id, question, top_k=5, verbose=False)
+                if target:
+                    found = any(target.answer in doc.page_content for doc in result.get("source_documents", []))
+            except Exception as e:
+                logger.warning(f"Query failed: {e}")
+                ok = False
+            with self.lock:
+                self.query_samples.append((time.time(), time.perf_counter() - start, ok, found))
+            self.stop.wait(max(0.0, next_at - time.monotonic()))
+
+    # --- sampling ---
+    def stream_backlog(self):
+        backlog = 0
+        try:
+            for shard in range(self.router.num_shards):
+                client, key = self.router.client_for_shard(shard), self.router.stream_key(shard)
+                for group in client.xinfo_groups(key):
+                    if group["name"] == self.consumer_group:
+                        backlog += (group.get("lag") or 0) + group["pending"]
+        except Exception as e:
+            logger.warning(f"Could not read the stream backlog: {e}")
+            return None
+        return backlog
+
+    def sample(self, window_start, now):
+        with self.lock:
+            uploads = sum(window_start <= u.uploaded_at < now for u in self.uploads)
+            published = sum(u.published_at is not None and window_start <= u.published_at < now for u in self.uploads)
+            searchable = [u for u in self.uploads if u.searchable_at is not None and window_start <= u.searchable_at < now]
+            queries = [s for s in self.query_samples if window_start <= s[0] < now]
+            pending = len(self.pending)
+        rss = {"load_generator": process_rss_mb(os.getpid())}
+        for name, pid in find_service_processes().items():
+            rss[name] = process_rss_mb(pid)
+        return {
+            "time": now,
+            "uploads": uploads,
+            "published": published,
+            "searchable": len(searchable),
+            "not_yet_searchable": pending,
+            "stream_backlog": self.stream_backlog(),
+            **percentiles([u.searchable_at - u.uploaded_at for u in searchable], "time_to_searchable_s"),
+            "queries": len(queries),
+            "query_errors": sum(not ok for _, _, ok, _ in queries),
+            **percentiles([seconds * 1000 for _, seconds, ok, _ in queries if ok], "query_ms"),
+            "rss_mb": {name: value for name, value in rss.items() if value is not None},
+        }
+
+    def summary(self, samples, started, finished):
+        uploads, queries = self.uploads, self.query_samples
+        rss_series = {}
+        for s in samples:
+            for name, value in s["rss_mb"].items():
+                rss_series.setdefault(name, []).append((s["time"], value))
+        rss = {}
+        for name, series in rss_series.items():
+            times, values = np.array([t for t, _ in series]), np.array([v for _, v in series])
+            growth = float(np.polyfit((times - times[0]) / 3600, values, 1)[0]) if len(series) > 2 else None
+            rss[name] = {"start_mb": float(values[0]), "end_mb": float(values[-1]), "max_mb": float(values.max()),
+                         "growth_mb_per_hour": growth}
+
+        third = (finished - started) / 3
+        def searchable_per_min(lo, hi):
+            return sum(u.searchable_at is not None and lo <= u.searchable_at < hi for u in uploads) / (third / 60) if third else 0.0
+
+        answered = [found for _, _, ok, found in queries if ok and found is not None]
+        return {
+            "args": {k: v for k, v in vars(self.args).items()},
+            "duration_s": finished - started,
+            "uploads": len(uploads),
+            "uploads_by_kind": {kind: sum(u.kind == kind for u in uploads) for kind in ("text", "image")},
+            "published": sum(u.published_at is not None for u in uploads),
+            "searchable": sum(u.searchable_at is not None for u in uploads),
+            **percentiles([u.published_at - u.uploaded_at for u in uploads if u.published_at], "ingest_lag_s"),
+            **percentiles([u.searchable_at - u.uploaded_at for u in uploads if u.searchable_at], "time_to_searchable_s"),
+            "queries": len(queries),
+            "query_error_rate": sum(not ok for _, _, ok, _ in queries) / len(queries) if queries else 0.0,
+            **percentiles([seconds * 1000 for _, seconds, ok, _ in queries if ok], "query_ms"),
+            "answer_in_sources_rate": sum(answered) / len(answered) if answered else None,
+            "searchable_per_min_first_third": searchable_per_min(started, started + third),
+            "searchable_per_min_last_third": searchable_per_min(finished - third, finished),
+            "rss": rss,
+        }
+
+    def run(self):
+        output_dir = os.path.join(self.args.output_dir, self.run_id)
+        os.makedirs(output_dir, exist_ok=True)
+        threads = [threading.Thread(target=self.upload_loop, name="uploader", daemon=True),
+                   threading.Thread(target=self.track_loop, name="tracker", daemon=True)]
+        if self.args.qps > 0:
+            import main  # builds the same Lookup as `make run` (vector backend, hybrid retrieval, model registry)
+            self.lookup = main.get_lookup()
+            threads += [threading.Thread(target=self.query_loop, name=f"query-{i}", daemon=True)
+                        for i in range(self.args.query_concurrency)]
+
+        started = time.time()
+        deadline = started + self.args.duration
+        samples, window_start = [], started
+        for thread in threads:
+            thread.start()
+        logger.info(f"Load run {self.run_id}: pattern '{self.args.pattern}' for {self.args.duration:.0f}s, writing {output_dir}/")
+        try:
+            with open(os.path.join(output_dir, "samples.jsonl"), "a") as out:
+                while time.time() < deadline:
+                    time.sleep(min(self.args.sample_interval, max(0.0, deadline - time.time())))
+                    now = time.time()
+                    sample = self.sample(window_start, now)
+                    window_start = now
+                    samples.append(sample)
+                    out.write(json.dumps(sample) + "\n")
+                    out.flush()
+                    services_rss = sum(v for k, v in sample["rss_mb"].items() if k != "load_generator")
+                    logger.info(f"uploads {sample['uploads']:>4} | searchable {sample['searchable']:>4} | "
+                                f"waiting {sample['not_yet_searchable']:>5} | backlog {sample['stream_backlog']} | "
+                                f"query p95 {sample.get('query_ms_p95', float('nan')):7.0f} ms | services RSS {services_rss:8.0f} MB")
+        except KeyboardInterrupt:
+            logger.info("Interrupted, writing the summary of the run so far.")
+        finally:
+            self.stop.set()
+            for thread in threads:
+                thread.join(timeout=30)
+            summary = self.summary(samples, started, time.time())
+            with open(os.path.join(output_dir, "summary.json"), "w") as f:
+                json.dump(summary, f, indent=2)
+            logger.info(f"Summary written to {output_dir}/summary.json")
+        return summary
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    parser = argparse.ArgumentParser(description="Replay upload and query traffic against a running deployment.")
+    parser.add_argument("--pattern", choices=["trickle", "burst", "heavy_user", "mixed"], default="trickle")
+    parser.add_argument("--duration", type=parse_duration, default=parse_duration("10m"), help="e.g. 600, 15m, 2h")
+    parser.add_argument("--users", nargs="+", default=DEFAULT_USERS)
+    parser.add_argument("--uploads-per-min", type=float, default=20.0)
+    parser.add_argument("--burst-size", type=int, default=25)
+    parser.add_argument("--burst-interval", type=float, default=120.0, help="Seconds between bursts")
+    parser.add_argument("--image-fraction", type=float, default=None, help="Share of image uploads (0.3 for mixed, else 0)")
+    parser.add_argument("--text-source", default=os.path.join(DATA_DIR, "books"))
+    parser.add_argument("--image-source", default=os.path.join(DATA_DIR, "images"))
+    parser.add_argument("--qps", type=float, default=1.0, help="Total query rate, 0 for ingestion only")
+    parser.add_argument("--no-queries", dest="qps", action="store_const", const=0.0)
+    parser.add_argument("--query-concurrency", type=int, default=2)
+    parser.add_argument("--sample-interval", type=float, default=30.0)
+    parser.add_argument("--poll-interval", type=float, default=0.5, help="How often upload state is read from Redis")
+    parser.add_argument("--redis-host", default="localhost")
+    parser.add_argument("--redis-port", type=int, default=6379)
+    parser.add_argument("--output-dir", default="load_results")
+    parser.add_argument("--seed", type=int, default=0)
+    summary = LoadGenerator(parser.parse_args()).run()
+    print(json.dumps({k: v for k, v in summary.items() if k not in ("args", "rss")}, indent=2))
+    for name, stats in summary["rss"].items():
+        growth = stats["growth_mb_per_hour"]
+        print(f"{name:<24} RSS {stats['start_mb']:8.0f} -> {stats['end_mb']:8.0f} MB (max {stats['max_mb']:.0f}, "
+              f"{'n/a' if growth is None else f'{growth:+.1f} MB/h'})")
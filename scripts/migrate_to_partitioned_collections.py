@@ -0,0 +1,100 @@
+# Copies every chunk of the shared collection into per-user (or hashed shard) collections.
+# Embeddings are copied as-is, so nothing is re-embedded.
+#
+# uv run python scripts/migrate_to_partitioned_collections.py --mode per_user
+# uv run python scripts/migrate_to_partitioned_collections.py --mode hashed --num-shards 16
+
+import os
+import sys
+import time
+import logging
+import argparse
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from chromadb import HttpClient
+from indexing_and_embedding.partitioning import CollectionPartitioner
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+
+def migrate(client, source_name: str, partitioner: CollectionPartitioner, batch_size: int = 2000):
+    """Pages through the source collection and upserts each page into the partitioned collections.
+
+    Upserting by the original chunk id makes the migration safe to re-run after an interruption.
+    Returns the number of chunks written to each destination collection.
+    """
+    source = client.get_collection(source_name)
+    total = source.count()
+    logger.info(f"Migrating {total} chunks from '{source_name}' using '{partitioner.mode}' partitioning.")
+
+    destinations = {}
+    written = {}
+    offset = 0
+    start = time.time()
+    while offset < total:
+        page = source.get(include=["documents", "metadatas", "embeddings"], limit=batch_size, offset=offset)
+        if not page["ids"]:
+            break
+
+        grouped = {}
+        for i, chunk_id in enumerate(page["ids"]):
+            metadata = page["metadatas"][i] or {}
+            collection_name = partitioner.collection_for_user(metadata.get("user_id", "unknown_user"))
+            group = grouped.setdefault(collection_name, {"ids": [], "embeddings": [], "documents": [], "metadatas": []})
+            group["ids"].append(chunk_id)
+            group["embeddings"].append(page["embeddings"][i])
+            group["documents"].append(page["documents"][i])
+            group["metadatas"].append(metadata)
+
+        for collection_name, group in grouped.items():
+            if collection_name == source_name:
+                continue
+            if collection_name not in destinations:
+                destinations[collection_name] = client.get_or_create_collection(collection_name)
+            destinations[collection_name].upsert(**group)
+            written[collection_name] = written.get(collection_name, 0) + len(group["ids"])
+
+        offset += len(page["ids"])
+        logger.info(f"Migrated {offset}/{total} chunks ({offset / max(time.time() - start, 1e-9):.0f} chunks/sec).")
+
+    return written
+
+
+def verify(client, written):
+    """Checks each destination holds at least as many chunks as were copied into it."""
+    ok = True
+    for collection_name, expected in written.items():
+        actual = client.get_collection(collection_name).count()
+        if actual < expected:
+            logger.error(f"'{collection_name}' has {actual} chunks, expected at least {expected}.")
+            ok = False
+    return ok
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Migrate the shared collection to partitioned collections.")
+    parser.add_argument("--source", default="all_users_docs")
+    parser.add_argument("--mode", choices=["per_user", "hashed"], default="per_user")
+    parser.add_argument("--num-shards", type=int, default=16)
+    parser.add_argument("--batch-size", type=int, default=2000)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--delete-source", action="store_true", help="Drop the shared collection after a verified migration.")
+    args = parser.parse_args()
+
+    client = HttpClient(host=args.host, port=args.port)
+    partitioner = CollectionPartitioner(args.source, mode=args.mode, num_shards=args.num_shards)
+
+    written = migrate(client, args.source, partitioner, batch_size=args.batch_size)
+    logger.info(f"Wrote {sum(written.values())} chunks into {len(written)} collections.")
+
+    if not verify(client, written):
+        logger.error("Verification failed, leaving the source collection in place.")
+        sys.exit(1)
+
+    if args.delete_source:
+        client.delete_collection(args.source)
+        logger.info(f"Deleted source collection '{args.source}'.")
+    logger.info("Done. Set PARTITION_MODE in ingestion/consumer.py and main.py to match before restarting.")
@@ -0,0 +1,83 @@
+# Zero-downtime switch of the embedding model (see indexing_and_embedding/model_registry.py).
+#
+#   start    registers the shadow collection (consumers start double-writing), then re-embeds all stored chunk text
+#            into it at up to --max-chunks-per-sec, from the embedding archive
+#   status   prints migration progress and throughput
+#   cutover  atomically makes the shadow the active model; consumers and Lookup switch on their next poll
+#   abort    drops the shadow (consumers stop double-writing)
+#
+# uv run python scripts/reembed_to_shadow.py start --model BAAI/bge-small-en-v1.5 --max-chunks-per-sec 200 --cutover
+# uv run python scripts/reembed_to_shadow.py status
+
+import os
+import sys
+import json
+import logging
+import argparse
+
+import redis
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import ingestion.consumer as live
+from indexing_and_embedding.model_registry import ModelRegistry, model_tag
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+
+def start(registry, args):
+    from indexing_and_embedding.embedding_archive import EmbeddingArchive, open_archives
+    from indexing_and_embedding.reembedding import ShadowReembedder
+
+    active = registry.active()
+    if not open_archives(live.EMBEDDING_ARCHIVE_PATH, active["model"]):
+        # The catch-up pass needs append-only sources, stored collections can't tell which rows are new
+        raise SystemExit(f"No '{active['model']}' embedding archive under {live.EMBEDDING_ARCHIVE_PATH} to re-embed from.")
+    shadow = registry.shadow() or registry.start_migration(args.model, args.base_collection)
+    if shadow["model"] != args.model:
+        raise SystemExit(f"A migration to '{shadow['model']}' is already in progress.")
+
+    open_sources = lambda: open_archives(live.EMBEDDING_ARCHIVE_PATH, active["model"])
+    logger.info(f"Re-embedding from the '{active['model']}' embedding archive.")
+
+    shadow_client = live.build_chroma_client(shadow["model"], shadow["collection"], batch_size=args.batch_size)
+    shadow_archive = EmbeddingArchive(
+        os.path.join(live.EMBEDDING_ARCHIVE_PATH, f"reembed__{model_tag(shadow['model'])}"), model_name=shadow["model"]
+    ) if live.ENABLE_EMBEDDING_ARCHIVE else None
+    reembedder = ShadowReembedder(
+        registry, open_sources, shadow_client, shadow_archive,
+        max_chunks_per_sec=args.max_chunks_per_sec, batch_size=args.batch_size,
+    )
+    reembedder.run(grace_s=args.grace_s)
+    if args.cutover:
+        registry.cutover()
+    else:
+        logger.info("Shadow collection is ready, run `scripts/reembed_to_shadow.py cutover` to switch.")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Re-embed stored chunks into a shadow collection and cut over.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    start_parser = subparsers.add_parser("start")
+    start_parser.add_argument("--model", required=True, help="New embedding model name.")
+    start_parser.add_argument("--base-collection", default="all_users_docs")
+    start_parser.add_argument("--max-chunks-per-sec", type=float, default=200.0, help="Rate limit (0 for none).")
+    start_parser.add_argument("--batch-size", type=int, default=256)
+    start_parser.add_argument("--grace-s", type=float, default=4 * live.MODEL_REGISTRY_POLL_S + 60,
+                              help="Wait before the catch-up pass, so every consumer is double-writing.")
+    start_parser.add_argument("--cutover", action="store_true", help="Cut over as soon as the shadow is complete.")
+    subparsers.add_parser("status")
+    subparsers.add_parser("cutover")
+    subparsers.add_parser("abort")
+    args = parser.parse_args()
+
+    registry = ModelRegistry(redis.Redis(host=live.REDIS_HOST, port=live.REDIS_PORT, decode_responses=True), live.embedding_model, "all_users_docs")
+    if args.command == "start":
+        start(registry, args)
+    elif args.command == "status":
+        print(json.dumps({"active": registry.active(), "shadow": registry.shadow(), "progress": registry.progress()}, indent=2))
+    elif args.command == "cutover":
+        print(json.dumps(registry.cutover()))
+    else:
+        registry.abort()
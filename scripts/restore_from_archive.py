@@ -0,0 +1,105 @@
+# Rebuilds a collection (any backend / partition layout) from the embedding archive written by the consumers and
+# the bulk loader. Vectors are bulk inserted as-is, so nothing is re-embedded or re-captioned. Chunk ids are kept,
+# which makes re-running the restore after an interruption safe on the HTTP backend. Without --collection the
+# archived model's collection from the model registry is restored (the active one, or the shadow during a migration).
+#
+# uv run python scripts/restore_from_archive.py --backend http
+# uv run python scripts/restore_from_archive.py --backend local --partition-mode per_user --bm25-path bm25_index
+
+import os
+import sys
+import time
+import logging
+import argparse
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from langchain_core.documents import Document
+from indexing_and_embedding.embedding_archive import open_archives
+from indexing_and_embedding.model_registry import collection_for_model
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+
+def restore(archives, chroma_client, bm25_store=None, batch_size: int = 4096):
+    """Replays every archive into chroma_client (and bm25_store). Returns the number of chunks restored."""
+    restored = 0
+    start = time.time()
+    for archive in archives:
+        for ids, texts, metadatas, embeddings in archive.iter_batches(batch_size):
+            docs = [Document(page_content=text, metadata=metadata) for text, metadata in zip(texts, metadatas)]
+            chroma_client.add_embedded_documents(docs, embeddings, ids)
+            if bm25_store is not None:
+                bm25_store.add_documents(docs)
+            restored += len(docs)
+        logger.info(f"Restored {restored} chunks so far ({archive.path}), {restored / max(time.time() - start, 1e-9):.0f} chunks/s.")
+    chroma_client.flush()
+    if bm25_store is not None:
+        bm25_store.flush()
+    return restored
+
+
+def registry_collection(registry, model_name: str) -> str:
+    """The collection the registry serves (or migrates to) model_name from."""
+    for entry in (registry.active(), registry.shadow()):
+        if entry is not None and entry["model"] == model_name:
+            return entry["collection"]
+    if model_name == registry.default["model"]:
+        return registry.default["collection"]
+    return collection_for_model(registry.default["collection"], model_name)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Rebuild a vector collection from the embedding archive.")
+    parser.add_argument("--archive-root", default="embedding_archive")
+    parser.add_argument("--model", help="Only restore archives of this embedding model (required if several are archived).")
+    parser.add_argument("--collection", help="Defaults to the archived model's collection in the model registry.")
+    parser.add_argument("--backend", default="http", choices=["http", "local"])
+    parser.add_argument("--local-store-path", default="local_vector_store")
+    parser.add_argument("--partition-mode", default="shared")
+    parser.add_argument("--num-shards", type=int, default=16)
+    parser.add_argument("--quantization", default="none")
+    parser.add_argument("--rescore-factor", type=int, default=0, help="Keep float32 copies of quantized segments for rescoring")
+    parser.add_argument("--bm25-path", help="Also rebuild the per-user BM25 index under this directory.")
+    parser.add_argument("--batch-size", type=int, default=4096)
+    args = parser.parse_args()
+
+    archives = open_archives(args.archive_root, args.model)
+    if not archives:
+        raise SystemExit(f"No embedding archive under {args.archive_root}.")
+    models = {a.model_name for a in archives}
+    if len(models) != 1:
+        raise SystemExit(f"Archives hold embeddings of several models {sorted(models)}, pick one with --model.")
+
+    model_name = models.pop()
+
+    from indexing_and_embedding.chroma_db_client import ChromaClient
+    from indexing_and_embedding.embeddings import PrecomputedEmbeddings
+    from indexing_and_embedding.bm25_index import BM25Store
+
+    if args.collection is None:
+        import redis
+        import ingestion.consumer as live
+        from indexing_and_embedding.model_registry import ModelRegistry
+
+        registry = ModelRegistry(redis.Redis(host=live.REDIS_HOST, port=live.REDIS_PORT, decode_responses=True),
+                                 live.embedding_model, "all_users_docs")
+        args.collection = registry_collection(registry, model_name)
+        logger.info(f"Restoring '{model_name}' into registry collection '{args.collection}'.")
+
+    chroma_client = ChromaClient(
+        collection_name=args.collection,
+        embedding_model_name=model_name,
+        embedding_model=PrecomputedEmbeddings(model_name),  # archived vectors are inserted as-is, nothing is embedded
+        batch_size=args.batch_size,
+        partition_mode=args.partition_mode,
+        num_shards=args.num_shards,
+        backend=args.backend,
+        local_store_path=args.local_store_path,
+        quantization=args.quantization,
+        rescore_factor=args.rescore_factor,
+    )
+    bm25_store = BM25Store(args.bm25_path) if args.bm25_path else None
+    total = restore(archives, chroma_client, bm25_store, args.batch_size)
+    logger.info(f"Restore complete: {total} chunks into '{args.collection}' ({args.backend}, {args.partition_mode}).")